@@ -7,6 +7,9 @@ DEFAULT_CHUNK_SIZE = 1024  # tokens
 DEFAULT_CHUNK_OVERLAP = 20  # tokens
 DEFAULT_SIMILARITY_TOP_K = 2
 DEFAULT_IMAGE_SIMILARITY_TOP_K = 2
+DEFAULT_MMR_THRESHOLD = 0.5
+DEFAULT_MMR_PREFETCH_FACTOR = 4
+DEFAULT_PAGE_SIZE = 100
 
 DEFAULT_TEXT_KEY = "text"
 DEFAULT_EMBEDDING_KEY = "embedding"
@@ -1,2 +1,5 @@
+from .wal import LogRecord, WriteAheadLog, LogStructuredStorage
+from .metadata_index import MetadataIndex, HashIndex, PrefixIndex, SortedIndex
+from .filtering import MetadataColumn, MetadataColumns, compile_filters
 from .vector import *
 from .graph import *
\ No newline at end of file
@@ -0,0 +1,426 @@
+from collections.abc import Hashable
+import operator
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from flowstack.stores.metadata_index import MetadataIndex, create_metadata_index
+from flowstack.typing import FilterCondition, FilterOperator, MetadataFilter, MetadataFilters
+
+# Returns either a boolean mask over all rows or sorted row numbers.
+FilterSelection = Callable[['MetadataColumns'], np.ndarray]
+
+_COMPARISONS: dict[FilterOperator, Callable[[Any, Any], Any]] = {
+    FilterOperator.GT: operator.gt,
+    FilterOperator.GTE: operator.ge,
+    FilterOperator.LT: operator.lt,
+    FilterOperator.LTE: operator.le
+}
+
+class MetadataColumn:
+    """
+    The values of one metadata key, stored column-wise. Strings are dictionary-encoded into codes,
+    numbers and bools are kept as float64, and anything else, such as a list, goes to an object array.
+    A row without the key has present[row] set to False.
+    """
+
+    def __init__(self, size: int = 0):
+        self.present = np.zeros(size, dtype=bool)
+        self.numbers = np.full(size, np.nan)
+        self.codes = np.full(size, -1, dtype=np.int32)
+        self.objects = np.full(size, None, dtype=object)
+        self.has_object = np.zeros(size, dtype=bool)
+        self.terms: list[str] = []
+        self.vocabulary: dict[str, int] = {}
+        self._postings: Optional[tuple[np.ndarray, np.ndarray, dict[Any, int]]] = None
+
+    def __len__(self) -> int:
+        return len(self.present)
+
+    def resize(self, size: int) -> None:
+        extra = size - len(self)
+        self.present = np.concatenate([self.present, np.zeros(extra, dtype=bool)])
+        self.numbers = np.concatenate([self.numbers, np.full(extra, np.nan)])
+        self.codes = np.concatenate([self.codes, np.full(extra, -1, dtype=np.int32)])
+        self.objects = np.concatenate([self.objects, np.full(extra, None, dtype=object)])
+        self.has_object = np.concatenate([self.has_object, np.zeros(extra, dtype=bool)])
+
+    def set(self, rows: list[int], values: list[Any]) -> None:
+        string_rows, string_codes = [], []
+        number_rows, numbers = [], []
+        object_rows, objects = [], []
+        for row, value in zip(rows, values):
+            if isinstance(value, str):
+                string_rows.append(row)
+                string_codes.append(self._encode(value))
+            elif isinstance(value, (int, float)):
+                number_rows.append(row)
+                numbers.append(value)
+            else:
+                object_rows.append(row)
+                objects.append(value)
+        self.present[rows] = True
+        self.codes[string_rows] = string_codes
+        self.numbers[number_rows] = numbers
+        if len(object_rows) > 0:
+            self.objects[object_rows] = _object_array(objects)
+            self.has_object[object_rows] = True
+            self._postings = None
+
+    def clear(self, rows: np.ndarray) -> None:
+        self.present[rows] = False
+        self.numbers[rows] = np.nan
+        self.codes[rows] = -1
+        if self.has_object[rows].any():
+            self.objects[rows] = None
+            self.has_object[rows] = False
+            self._postings = None
+
+    def compact(self, kept_rows: np.ndarray) -> None:
+        self.present = self.present[kept_rows]
+        self.numbers = self.numbers[kept_rows]
+        self.codes = self.codes[kept_rows]
+        self.objects = self.objects[kept_rows]
+        self.has_object = self.has_object[kept_rows]
+        self._postings = None
+
+    def items(self) -> tuple[list[int], list[Any]]:
+        """
+        Returns the rows holding a value and their values.
+        """
+        rows = np.flatnonzero(self.present)
+        values = [
+            self.objects[row] if self.has_object[row]
+            else self.terms[self.codes[row]] if self.codes[row] >= 0
+            else self.numbers[row].item()
+            for row in rows
+        ]
+        return rows.tolist(), values
+
+    def term_mask(self, predicate: Callable[[str], bool]) -> np.ndarray:
+        """
+        Evaluates predicate once per distinct string, then maps the result onto rows through their codes.
+        """
+        table = np.fromiter((predicate(term) for term in self.terms), dtype=bool, count=len(self.terms))
+        mask = np.zeros(len(self), dtype=bool)
+        rows = np.flatnonzero(self.codes >= 0)
+        mask[rows] = table[self.codes[rows]]
+        return mask
+
+    def postings(self) -> tuple[np.ndarray, np.ndarray, dict[Any, int]]:
+        """
+        Flattens list values into parallel (row, element code) arrays, built on first use after a change.
+        """
+        if self._postings is None:
+            rows: list[int] = []
+            codes: list[int] = []
+            elements: dict[Any, int] = {}
+            for row in np.flatnonzero(self.has_object):
+                value = self.objects[row]
+                if not isinstance(value, list):
+                    continue
+                for element in value:
+                    if isinstance(element, Hashable):
+                        rows.append(row)
+                        codes.append(elements.setdefault(element, len(elements)))
+            self._postings = (np.array(rows, dtype=np.int64), np.array(codes, dtype=np.int64), elements)
+        return self._postings
+
+    def _encode(self, term: str) -> int:
+        code = self.vocabulary.get(term)
+        if code is None:
+            code = len(self.terms)
+            self.vocabulary[term] = code
+            self.terms.append(term)
+        return code
+
+class MetadataColumns:
+    """
+    Flat metadata of a store's rows, one MetadataColumn per key, all of the same length.
+    Filters are evaluated over whole columns with compile_filters instead of row by row,
+    except on keys with a secondary index, which answer supported operators without a scan.
+    """
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __init__(self, indexes: dict[str, str] = {}):
+        self._columns: dict[str, MetadataColumn] = {}
+        self._size: int = 0
+        self._indexes: dict[str, MetadataIndex] = {}
+        for key, index_type in indexes.items():
+            self.create_index(key, index_type)
+
+    def get(self, key: str) -> Optional[MetadataColumn]:
+        return self._columns.get(key)
+
+    def get_index(self, key: str) -> Optional[MetadataIndex]:
+        return self._indexes.get(key)
+
+    def create_index(self, key: str, index_type: str) -> None:
+        """
+        Declares a HASH, SORTED or PREFIX index on key, built from the rows already stored.
+        """
+        index = create_metadata_index(index_type)
+        column = self._columns.get(key)
+        if column is not None:
+            index.add(*column.items())
+        self._indexes[key] = index
+
+    def set(self, rows: np.ndarray, metadata: list[dict[str, Any]]) -> None:
+        """
+        Replaces the metadata of rows, growing every column when rows go past the end.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        # A row repeated within one batch keeps its last metadata.
+        last = {row: i for i, row in enumerate(rows.tolist())}
+        if len(last) < len(rows):
+            rows = np.array(list(last.keys()), dtype=np.int64)
+            metadata = [metadata[i] for i in last.values()]
+        # Only rows that already existed can have stale values in the indexes.
+        overwritten = rows[rows < self._size]
+        size = max(self._size, int(rows.max()) + 1) if len(rows) > 0 else self._size
+        if size > self._size:
+            for column in self._columns.values():
+                column.resize(size)
+            self._size = size
+        for column in self._columns.values():
+            column.clear(rows)
+        for index in self._indexes.values():
+            index.remove(overwritten)
+
+        grouped: dict[str, tuple[list[int], list[Any]]] = {}
+        for row, entry in zip(rows.tolist(), metadata):
+            for key, value in entry.items():
+                key_rows, values = grouped.setdefault(key, ([], []))
+                key_rows.append(row)
+                values.append(value)
+        for key, (key_rows, values) in grouped.items():
+            if key not in self._columns:
+                self._columns[key] = MetadataColumn(self._size)
+            self._columns[key].set(key_rows, values)
+            if key in self._indexes:
+                self._indexes[key].add(key_rows, values)
+
+    def compact(self, kept_rows: np.ndarray) -> None:
+        for column in self._columns.values():
+            column.compact(kept_rows)
+        for index in self._indexes.values():
+            index.compact(kept_rows, self._size)
+        self._size = len(kept_rows)
+
+    def reset(self) -> None:
+        self._columns = {}
+        self._size = 0
+        for index in self._indexes.values():
+            index.reset()
+
+    def mask(self, filters: MetadataFilters) -> np.ndarray:
+        return _to_mask(compile_filters(filters)(self), self._size)
+
+    def select(self, filters: MetadataFilters) -> np.ndarray:
+        """
+        Returns the sorted rows matching filters. When an index answers the filter no mask over all rows is built,
+        so a selective lookup such as doc_id == X on a HASH index costs O(1) and a range on a SORTED index O(log n).
+        """
+        return _to_rows(compile_filters(filters)(self))
+
+    def match(self, values: dict[str, Any]) -> np.ndarray:
+        """
+        Rows where every key equals its value in values, a value of None also matches rows without the key.
+        """
+        mask = np.ones(self._size, dtype=bool)
+        for key, value in values.items():
+            column = self._columns.get(key)
+            if column is None:
+                if value is not None:
+                    return np.zeros(self._size, dtype=bool)
+                continue
+            index = self._indexes.get(key)
+            if value is not None and index is not None and index.supports(FilterOperator.EQ, value):
+                mask &= _to_mask(index.lookup(FilterOperator.EQ, value), self._size)
+                continue
+            mask &= _equal(column, value) | (~column.present if value is None else False)
+        return mask
+
+    def select_match(self, values: dict[str, Any]) -> np.ndarray:
+        """
+        Returns the sorted rows of match. Keys with an index are looked up first, without a mask over all rows,
+        and when every key has one, such as a source id on a HASH index, no column is scanned at all.
+        """
+        rows: Optional[np.ndarray] = None
+        rest: dict[str, Any] = {}
+        for key, value in values.items():
+            index = self._indexes.get(key)
+            if value is not None and index is not None and index.supports(FilterOperator.EQ, value):
+                found = index.lookup(FilterOperator.EQ, value)
+                rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+            else:
+                rest[key] = value
+        if rows is None:
+            return np.flatnonzero(self.match(rest))
+        if len(rest) > 0 and len(rows) > 0:
+            rows = rows[self.match(rest)[rows]]
+        return rows
+
+def compile_filters(filters: MetadataFilters) -> FilterSelection:
+    """
+    Compiles a MetadataFilters tree into a function returning the matching rows, either as a boolean mask
+    over all rows or as a sorted array of row numbers when every step could be answered by an index.
+    Operators and conditions are validated up front, so a bad filter fails before any row is touched.
+    A row without the filtered key only matches NE and NIN.
+    """
+    compiled = [
+        compile_filters(f) if isinstance(f, MetadataFilters) else _compile_filter(f)
+        for f in filters.filters
+    ]
+
+    if filters.condition == FilterCondition.AND:
+        def _select(columns: MetadataColumns) -> np.ndarray:
+            # Indexed filters go first, they are cheap and usually narrow the selection the most.
+            selection: Optional[np.ndarray] = None
+            for f in sorted(compiled, key=lambda f: not _is_indexed(f, columns)):
+                if selection is not None and _is_empty(selection):
+                    break
+                result = f(columns)
+                selection = result if selection is None else _intersect(selection, result)
+            return selection if selection is not None else np.ones(columns.size, dtype=bool)
+    elif filters.condition == FilterCondition.OR:
+        def _select(columns: MetadataColumns) -> np.ndarray:
+            selection = np.empty(0, dtype=np.int64)
+            for f in compiled:
+                selection = _union(selection, f(columns), columns.size)
+            return selection
+    else:
+        raise ValueError(f'Unsupported filter condition: {filters.condition}.')
+
+    return _select
+
+def _compile_filter(filter: MetadataFilter) -> FilterSelection:
+    value = filter.value
+    match filter.operator:
+        case FilterOperator.EQ | FilterOperator.NE:
+            predicate = lambda column: _equal(column, value)
+        case FilterOperator.GT | FilterOperator.GTE | FilterOperator.LT | FilterOperator.LTE:
+            comparison = _COMPARISONS[filter.operator]
+            predicate = lambda column: _compare(column, value, comparison)
+        case FilterOperator.IN | FilterOperator.NIN:
+            values = value if isinstance(value, list) else [value]
+            predicate = lambda column: _isin(column, values)
+        case FilterOperator.ANY | FilterOperator.CONTAINS:
+            values = value if filter.operator == FilterOperator.ANY else [value]
+            predicate = lambda column: _contains(column, values, match_all=False)
+        case FilterOperator.ALL:
+            predicate = lambda column: _contains(column, value, match_all=True)
+        case FilterOperator.TEXT_MATCH:
+            predicate = lambda column: (
+                column.term_mask(lambda term: term.startswith(value))
+                if isinstance(value, str)
+                else np.zeros(len(column), dtype=bool)
+            )
+        case _:
+            raise ValueError(f'Unsupported filter operator: {filter.operator}.')
+
+    negate = filter.operator in [FilterOperator.NE, FilterOperator.NIN]
+
+    def _select(columns: MetadataColumns) -> np.ndarray:
+        index = columns.get_index(filter.key)
+        if index is not None and index.supports(filter.operator, value):
+            # NE and NIN are answered as the complement of EQ and IN.
+            selection = index.lookup(filter.operator, value)
+        else:
+            column = columns.get(filter.key)
+            selection = predicate(column) if column is not None else np.empty(0, dtype=np.int64)
+        return ~_to_mask(selection, columns.size) if negate else selection
+
+    _select.filter = filter
+    return _select
+
+def _is_indexed(f: FilterSelection, columns: MetadataColumns) -> bool:
+    filter: Optional[MetadataFilter] = getattr(f, 'filter', None)
+    if filter is None:
+        return False
+    index = columns.get_index(filter.key)
+    return index is not None and index.supports(filter.operator, filter.value)
+
+def _is_empty(selection: np.ndarray) -> bool:
+    return not selection.any() if selection.dtype == bool else len(selection) == 0
+
+def _to_mask(selection: np.ndarray, size: int) -> np.ndarray:
+    if selection.dtype == bool:
+        return selection
+    mask = np.zeros(size, dtype=bool)
+    mask[selection] = True
+    return mask
+
+def _to_rows(selection: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(selection) if selection.dtype == bool else selection
+
+def _intersect(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    if a.dtype == bool and b.dtype == bool:
+        return a & b
+    if a.dtype == bool:
+        return b[a[b]]
+    if b.dtype == bool:
+        return a[b[a]]
+    return np.intersect1d(a, b, assume_unique=True)
+
+def _union(a: np.ndarray, b: np.ndarray, size: int) -> np.ndarray:
+    if a.dtype != bool and b.dtype != bool:
+        return np.union1d(a, b)
+    return _to_mask(a, size) | _to_mask(b, size)
+
+def _equal(column: MetadataColumn, value: Any) -> np.ndarray:
+    if isinstance(value, str):
+        code = column.vocabulary.get(value)
+        return column.codes == code if code is not None else np.zeros(len(column), dtype=bool)
+    if isinstance(value, (int, float)):
+        return column.numbers == value
+    mask = np.zeros(len(column), dtype=bool)
+    rows = np.flatnonzero(column.has_object)
+    mask[rows] = [column.objects[row] == value for row in rows]
+    return mask
+
+def _compare(column: MetadataColumn, value: Any, comparison: Callable[[Any, Any], Any]) -> np.ndarray:
+    if isinstance(value, str):
+        return column.term_mask(lambda term: comparison(term, value))
+    if isinstance(value, (int, float)):
+        # NaN marks rows without a number, and every comparison with NaN is False.
+        return comparison(column.numbers, value)
+    return np.zeros(len(column), dtype=bool)
+
+def _isin(column: MetadataColumn, values: list[Any]) -> np.ndarray:
+    codes = [column.vocabulary[v] for v in values if isinstance(v, str) and v in column.vocabulary]
+    numbers = [v for v in values if isinstance(v, (int, float))]
+    mask = np.isin(column.codes, codes)
+    if len(numbers) > 0:
+        mask |= np.isin(column.numbers, numbers)
+    return mask
+
+def _contains(column: MetadataColumn, values: list[Any], match_all: bool) -> np.ndarray:
+    """
+    Rows whose list value holds any (or all) of values, other rows never match.
+    """
+    rows, codes, elements = column.postings()
+    wanted = np.unique(np.array([elements.get(v, -1) for v in values if isinstance(v, Hashable)], dtype=np.int64))
+    if match_all and len(wanted) == 0:
+        return column.has_object & np.array([isinstance(v, list) for v in column.objects], dtype=bool)
+    if match_all and wanted[0] < 0:
+        return np.zeros(len(column), dtype=bool)
+
+    hits = np.isin(codes, wanted)
+    mask = np.zeros(len(column), dtype=bool)
+    if not match_all or not hits.any():
+        mask[rows[hits]] = True
+        return mask
+    # A row matches when the number of distinct wanted elements it holds equals len(wanted).
+    pairs = np.unique(np.stack([rows[hits], codes[hits]]), axis=1)
+    return np.bincount(pairs[0], minlength=len(column)) == len(wanted)
+
+def _object_array(values: list[Any]) -> np.ndarray:
+    # np.array would turn a list of lists into a 2-D array, so fill an object array element by element.
+    array = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        array[i] = value
+    return array
\ No newline at end of file
@@ -7,6 +7,7 @@ from .types import (
     GraphTriplet,
     Graph
 )
+from .compact import CompactGraph
 from .filtering import GraphNodeQuery, GraphTripletQuery
 from .base import GraphStore
 from .simple import SimpleGraphStore
\ No newline at end of file
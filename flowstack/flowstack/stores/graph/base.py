@@ -1,11 +1,15 @@
 from abc import ABC, abstractmethod
 from typing import Any, Optional, Unpack
 
-from flowstack.artifacts import Artifact, ArtifactRelationship
+from flowstack.artifacts import Artifact
+from flowstack.core.utils.constants import DEFAULT_DOC_ID_KEY, GRAPH_TRIPLET_SOURCE_KEY
+from flowstack.core.utils.func import iter_batch
+from flowstack.core.utils.threading import gather_with_concurrency, run_async
 from flowstack.stores import ChunkNode, GraphNode, GraphNodeQuery, GraphRelation, GraphTriplet, GraphTripletQuery, VectorStoreQuery
-from flowstack.typing import Embedding
-from flowstack.utils.constants import GRAPH_TRIPLET_SOURCE_KEY
-from flowstack.utils.threading import run_async
+from flowstack.typing import Embedding, FilterOperator, MetadataFilter, MetadataFilters
+
+DEFAULT_DELETE_BATCH_SIZE = 1000
+DEFAULT_MAX_CONCURRENCY = 8
 
 class GraphStore(ABC):
     @property
@@ -152,51 +156,50 @@ class GraphStore(ABC):
     def delete_artifacts(
         self,
         artifact_ids: Optional[list[str]] = None,
-        ref_artifact_ids: Optional[list[str]] = None
+        ref_artifact_ids: Optional[list[str]] = None,
+        batch_size: int = DEFAULT_DELETE_BATCH_SIZE
     ) -> None:
-        nodes: list[GraphNode] = []
-
-        artifact_ids = artifact_ids or []
-        for artifact_id in artifact_ids:
-            nodes.extend(self.get(properties={GRAPH_TRIPLET_SOURCE_KEY: artifact_id}))
-
-        if len(artifact_ids) > 0:
-            nodes.extend(self.get(ids=artifact_ids))
-
-        ref_artifact_ids = ref_artifact_ids or []
-        for ref_artifact_id in artifact_ids:
-            nodes.extend(self.get(properties={
-                'relationships': {ArtifactRelationship.REF: ref_artifact_id}
-            }))
-
-        if len(ref_artifact_ids) > 0:
-            nodes.extend(self.get(ids=ref_artifact_ids))
-
-        if len(nodes) > 0:
-            self.delete(ids=[node.id for node in nodes])
+        """
+        Deletes the nodes of artifact_ids and ref_artifact_ids, along with every node extracted from them.
+        The ids are looked up batch_size at a time, so a local store answers each batch from its indexes
+        and a remote one gets a few large queries rather than one per id.
+        """
+        node_ids: dict[str, None] = {}
+        for query in _artifact_queries(artifact_ids, ref_artifact_ids, batch_size):
+            node_ids.update((node.id, None) for node in self.get(**query))
+        if len(node_ids) > 0:
+            self.delete(ids=list(node_ids))
 
     async def adelete_artifacts(
         self,
         artifact_ids: Optional[list[str]] = None,
-        ref_artifact_ids: Optional[list[str]] = None
+        ref_artifact_ids: Optional[list[str]] = None,
+        batch_size: int = DEFAULT_DELETE_BATCH_SIZE,
+        max_concurrency: Optional[int] = DEFAULT_MAX_CONCURRENCY
     ) -> None:
-        nodes: list[GraphNode] = []
-
-        artifact_ids = artifact_ids or []
-        for artifact_id in artifact_ids:
-            nodes.extend(await self.aget(properties={GRAPH_TRIPLET_SOURCE_KEY: artifact_id}))
-
-        if len(artifact_ids) > 0:
-            nodes.extend(await self.aget(ids=artifact_ids))
-
-        ref_artifact_ids = ref_artifact_ids or []
-        for ref_artifact_id in artifact_ids:
-            nodes.extend(await self.aget(properties={
-                'relationships': {ArtifactRelationship.REF: ref_artifact_id}
-            }))
-
-        if len(ref_artifact_ids) > 0:
-            nodes.extend(await self.aget(ids=ref_artifact_ids))
-
-        if len(nodes) > 0:
-            await self.adelete(ids=[node.id for node in nodes])
\ No newline at end of file
+        """
+        Same as delete_artifacts, with up to max_concurrency of the lookups in flight at once.
+        """
+        results = await gather_with_concurrency(
+            max_concurrency,
+            *[self.aget(**query) for query in _artifact_queries(artifact_ids, ref_artifact_ids, batch_size)]
+        )
+        node_ids = dict.fromkeys(node.id for nodes in results for node in nodes)
+        if len(node_ids) > 0:
+            await self.adelete(ids=list(node_ids))
+
+def _artifact_queries(
+    artifact_ids: Optional[list[str]],
+    ref_artifact_ids: Optional[list[str]],
+    batch_size: int
+) -> list[GraphNodeQuery]:
+    """
+    Per batch of ids: the nodes extracted from the artifacts, which carry their id under GRAPH_TRIPLET_SOURCE_KEY,
+    or reference them under DEFAULT_DOC_ID_KEY for ref artifacts, and the nodes that are the artifacts themselves.
+    """
+    queries: list[GraphNodeQuery] = []
+    for ids, key in ((artifact_ids or [], GRAPH_TRIPLET_SOURCE_KEY), (ref_artifact_ids or [], DEFAULT_DOC_ID_KEY)):
+        for batch in iter_batch(dict.fromkeys(ids), batch_size):
+            queries.append({'filters': MetadataFilters([MetadataFilter(key, batch, operator=FilterOperator.IN)])})
+            queries.append({'ids': batch})
+    return queries
\ No newline at end of file
@@ -0,0 +1,431 @@
+from collections.abc import Iterator, Mapping
+from typing import Any, Optional, Type, Union
+
+import numpy as np
+
+from flowstack.stores.graph.types import EntityNode, GraphNode, GraphRelation, GraphTriplet, _relation_id
+from flowstack.typing import Embedding
+
+DEFAULT_DELTA_RATIO = 0.1
+MIN_DELTA_SIZE = 1024
+NO_LABEL = -1
+
+class CompactGraph:
+    """
+    Drop-in replacement for Graph laid out for millions of nodes, see SimpleGraphStore(compact=True).
+    Node ids and relation labels are interned to integers. Nodes are kept as their non-default fields,
+    nothing at all for a bare EntityNode, and only hydrated into GraphNode and GraphRelation objects when read.
+    Edges live in numpy arrays indexed twice, by source (CSR) and by target (CSC). New edges go to a delta buffer
+    and deleted ones are tombstoned, both are folded into the CSR and CSC arrays once they pass delta_ratio
+    of the indexed edges. traverse expands a whole BFS frontier per hop with array operations.
+    As in Graph, there is at most one relation per (source, target) pair.
+    """
+
+    @property
+    def nodes(self) -> Mapping[str, GraphNode]:
+        return _NodeView(self)
+
+    @property
+    def relations(self) -> Mapping[str, GraphRelation]:
+        return _RelationView(self)
+
+    @property
+    def triplets(self) -> set[tuple[str, str, str]]:
+        return {self._triplet_key(edge) for edge in np.flatnonzero(self._alive[:self._num_edges]).tolist()}
+
+    def __init__(self, delta_ratio: float = DEFAULT_DELTA_RATIO):
+        self.delta_ratio = delta_ratio
+
+        self._ids: list[str] = []
+        self._rows: dict[str, int] = {}
+        # A node type of None marks a row whose node was deleted, or only ever seen as an id.
+        self._node_types: list[Optional[Type[GraphNode]]] = []
+        self._node_data: list[Optional[dict[str, Any]]] = []
+        self._node_embeddings: list[Optional[Embedding]] = []
+        self._num_nodes = 0
+
+        self._labels: list[str] = []
+        self._label_codes: dict[str, int] = {}
+
+        # Edge slots, in insertion order. Slots below _num_indexed are in the CSR and CSC arrays, later ones in the delta.
+        self._sources = np.empty(0, dtype=np.int64)
+        self._targets = np.empty(0, dtype=np.int64)
+        self._edge_labels = np.empty(0, dtype=np.int32)
+        self._alive = np.empty(0, dtype=bool)
+        self._edge_data: dict[int, dict[str, Any]] = {}
+        self._num_edges = 0
+        self._num_live = 0
+        # Dead slots below _num_indexed, dead delta slots are already counted by the delta size.
+        self._num_dead = 0
+        self._num_indexed = 0
+        self._out_indptr = np.zeros(1, dtype=np.int64)
+        self._out_edges = np.empty(0, dtype=np.int64)
+        self._in_indptr = np.zeros(1, dtype=np.int64)
+        self._in_edges = np.empty(0, dtype=np.int64)
+        self._delta_out: dict[int, list[int]] = {}
+        self._delta_in: dict[int, list[int]] = {}
+
+    def ger_nodes(self) -> list[GraphNode]:
+        return list(self.nodes.values())
+
+    def get_relations(self) -> list[GraphRelation]:
+        return [self._hydrate_relation(edge) for edge in np.flatnonzero(self._alive[:self._num_edges]).tolist()]
+
+    def get_triplets(self) -> list[GraphTriplet]:
+        return [self._to_triplet(edge) for edge in np.flatnonzero(self._alive[:self._num_edges]).tolist()]
+
+    def to_triplet(self, triplet: tuple[str, str, str]) -> GraphTriplet:
+        edge = self._find_triplet(triplet)
+        if edge is None:
+            raise KeyError(triplet)
+        return self._to_triplet(edge)
+
+    def get_outgoing(self, node_id: str) -> list[tuple[str, str, str]]:
+        row = self._rows.get(node_id)
+        if row is None:
+            return []
+        return [self._triplet_key(edge) for edge in self._edges_of(np.array([row]), outgoing=True).tolist()]
+
+    def get_incoming(self, node_id: str) -> list[tuple[str, str, str]]:
+        row = self._rows.get(node_id)
+        if row is None:
+            return []
+        return [self._triplet_key(edge) for edge in self._edges_of(np.array([row]), outgoing=False).tolist()]
+
+    def traverse(
+        self,
+        node_ids: list[str],
+        depth: int = 2,
+        limit: Optional[int] = None,
+        ignore_rels: Optional[list[str]] = None
+    ) -> list[tuple[str, str, str]]:
+        """
+        Same contract as Graph.traverse. Each hop gathers the edges of the whole frontier at once,
+        outgoing then incoming, so triplets come out nearest first but in a different order within a hop.
+        """
+        if limit is not None and limit <= 0:
+            return []
+        ignored_labels = np.array(
+            [self._label_codes[name] for name in ignore_rels or [] if name in self._label_codes],
+            dtype=np.int32
+        )
+        # An unlabelled relation is named by its id, so ignore_rels can also name those.
+        ignored_ids = set(ignore_rels or []) - set(self._label_codes)
+
+        visited = np.zeros(len(self._ids), dtype=bool)
+        seen = np.zeros(self._num_edges, dtype=bool)
+        frontier = np.array(
+            [self._rows[node_id] for node_id in dict.fromkeys(node_ids) if node_id in self.nodes],
+            dtype=np.int64
+        )
+        visited[frontier] = True
+        found: list[np.ndarray] = []
+        num_found = 0
+        for _ in range(depth):
+            if len(frontier) == 0:
+                break
+            edges = np.concatenate([
+                self._edges_of(frontier, outgoing=True),
+                self._edges_of(frontier, outgoing=False)
+            ])
+            edges = _unique_in_order(edges[~seen[edges]])
+            if len(ignored_labels) > 0:
+                edges = edges[~np.isin(self._edge_labels[edges], ignored_labels)]
+            if len(ignored_ids) > 0:
+                edges = np.array([
+                    edge for edge in edges.tolist()
+                    if self._edge_labels[edge] != NO_LABEL or self._relation_key(edge) not in ignored_ids
+                ], dtype=np.int64)
+            seen[edges] = True
+            found.append(edges)
+            num_found += len(edges)
+            if limit is not None and num_found >= limit:
+                break
+            in_frontier = np.zeros(len(self._ids), dtype=bool)
+            in_frontier[frontier] = True
+            sources = self._sources[edges]
+            ends = np.where(in_frontier[sources], self._targets[edges], sources)
+            frontier = _unique_in_order(ends[~visited[ends]])
+            visited[frontier] = True
+        edges = np.concatenate(found) if len(found) > 0 else np.empty(0, dtype=np.int64)
+        return [self._triplet_key(edge) for edge in edges[:limit].tolist()]
+
+    def add_node(self, node: GraphNode) -> None:
+        row = self._intern(node.id)
+        if self._node_types[row] is None:
+            self._num_nodes += 1
+        data = node.model_dump(exclude={'embedding'}, exclude_defaults=True)
+        # Most nodes of a large graph are entities known by name only, those are kept as their type alone.
+        if type(node) is EntityNode and data == {'name': node.id}:
+            data = None
+        self._node_types[row] = type(node)
+        self._node_data[row] = data
+        self._node_embeddings[row] = node.embedding
+
+    def add_relation(self, relation: GraphRelation) -> None:
+        # Unknown endpoints become bare entity rows directly, no node is hydrated or dumped on this path.
+        source, target = self._add_entity(relation.source), self._add_entity(relation.target)
+        edge = self._find_edge(source, target)
+        if edge is None:
+            edge = self._append_edge(source, target)
+        self._set_relation(edge, relation)
+        self._maybe_rebuild()
+
+    def add_triplet(self, triplet: GraphTriplet) -> None:
+        subject, relation, obj = triplet
+        source, target = self._rows.get(subject.id), self._rows.get(obj.id)
+        edge = self._find_edge(source, target) if source is not None and target is not None else None
+        if edge is None:
+            self.add_node(subject)
+            self.add_node(obj)
+            edge = self._append_edge(self._rows[subject.id], self._rows[obj.id])
+        self._set_relation(edge, relation)
+        self._maybe_rebuild()
+
+    def delete_node(self, node_id: str) -> None:
+        row = self._rows.get(node_id)
+        if row is None or self._node_types[row] is None:
+            return
+        rows = np.array([row])
+        for edge in np.concatenate([self._edges_of(rows, outgoing=True), self._edges_of(rows, outgoing=False)]).tolist():
+            self._kill_edge(edge)
+        self._node_types[row] = None
+        self._node_data[row] = None
+        self._node_embeddings[row] = None
+        self._num_nodes -= 1
+        self._maybe_rebuild()
+
+    def delete_relation(self, relation_id: Union[str, tuple[str, str]]) -> None:
+        edge = self._find_relation(relation_id if isinstance(relation_id, str) else _relation_id(*relation_id))
+        if edge is not None:
+            self._kill_edge(edge)
+            self._maybe_rebuild()
+
+    def delete_triplet(self, triplet: tuple[str, str, str]) -> None:
+        edge = self._find_triplet(triplet)
+        if edge is not None:
+            self._kill_edge(edge)
+            self._maybe_rebuild()
+
+    def _intern(self, node_id: str) -> int:
+        row = self._rows.get(node_id)
+        if row is None:
+            row = self._rows[node_id] = len(self._ids)
+            self._ids.append(node_id)
+            self._node_types.append(None)
+            self._node_data.append(None)
+            self._node_embeddings.append(None)
+        return row
+
+    def _add_entity(self, node_id: str) -> int:
+        row = self._intern(node_id)
+        if self._node_types[row] is None:
+            self._node_types[row] = EntityNode
+            self._num_nodes += 1
+        return row
+
+    def _hydrate_node(self, row: int) -> GraphNode:
+        data = self._node_data[row]
+        data = dict(data) if data is not None else {'name': self._ids[row]}
+        if self._node_embeddings[row] is not None:
+            data['embedding'] = self._node_embeddings[row]
+        return self._node_types[row].model_validate(data)
+
+    def _set_relation(self, edge: int, relation: GraphRelation) -> None:
+        label = relation.label
+        if label is None:
+            self._edge_labels[edge] = NO_LABEL
+        else:
+            code = self._label_codes.get(label)
+            if code is None:
+                code = self._label_codes[label] = len(self._labels)
+                self._labels.append(label)
+            self._edge_labels[edge] = code
+        data = relation.model_dump(exclude={'label'}, exclude_defaults=True)
+        # source and target are only kept when they differ from the ids of the nodes they connect.
+        if data.get('source') == self._ids[self._sources[edge]]:
+            del data['source']
+        if data.get('target') == self._ids[self._targets[edge]]:
+            del data['target']
+        if len(data) > 0:
+            self._edge_data[edge] = data
+        else:
+            self._edge_data.pop(edge, None)
+
+    def _hydrate_relation(self, edge: int) -> GraphRelation:
+        label = int(self._edge_labels[edge])
+        return GraphRelation.model_validate({
+            'source': self._ids[self._sources[edge]],
+            'target': self._ids[self._targets[edge]],
+            'label': self._labels[label] if label != NO_LABEL else None,
+            **self._edge_data.get(edge, {})
+        })
+
+    def _to_triplet(self, edge: int) -> GraphTriplet:
+        return GraphTriplet(
+            self._hydrate_node(int(self._sources[edge])),
+            self._hydrate_relation(edge),
+            self._hydrate_node(int(self._targets[edge]))
+        )
+
+    def _relation_key(self, edge: int) -> str:
+        data = self._edge_data.get(edge, {})
+        return _relation_id(
+            data.get('source', self._ids[self._sources[edge]]),
+            data.get('target', self._ids[self._targets[edge]])
+        )
+
+    def _triplet_key(self, edge: int) -> tuple[str, str, str]:
+        return self._ids[self._sources[edge]], self._relation_key(edge), self._ids[self._targets[edge]]
+
+    def _find_edge(self, source: int, target: int) -> Optional[int]:
+        for edge in self._delta_out.get(source, ()):
+            if self._targets[edge] == target:
+                return edge
+        if source < len(self._out_indptr) - 1:
+            edges = self._out_edges[self._out_indptr[source]:self._out_indptr[source + 1]]
+            edges = edges[(self._targets[edges] == target) & self._alive[edges]]
+            if len(edges) > 0:
+                return int(edges[0])
+        return None
+
+    def _find_triplet(self, triplet: tuple[str, str, str]) -> Optional[int]:
+        source, target = self._rows.get(triplet[0]), self._rows.get(triplet[2])
+        if source is None or target is None:
+            return None
+        edge = self._find_edge(source, target)
+        return edge if edge is not None and self._relation_key(edge) == triplet[1] else None
+
+    def _find_relation(self, relation_id: str) -> Optional[int]:
+        # Node ids may themselves contain the separator, so every split is tried.
+        start = relation_id.find('->')
+        while start != -1:
+            edge = self._find_triplet((relation_id[:start], relation_id, relation_id[start + 2:]))
+            if edge is not None:
+                return edge
+            start = relation_id.find('->', start + 1)
+        # Relations whose source or target differ from their node ids are rare, and found by a scan.
+        for edge, data in self._edge_data.items():
+            if ('source' in data or 'target' in data) and self._alive[edge] and self._relation_key(edge) == relation_id:
+                return edge
+        return None
+
+    def _edges_of(self, rows: np.ndarray, outgoing: bool) -> np.ndarray:
+        """
+        Live edges leaving, or entering, any of rows: CSR or CSC ranges gathered without a Python loop,
+        then the delta buffer.
+        """
+        indptr, indexed = (self._out_indptr, self._out_edges) if outgoing else (self._in_indptr, self._in_edges)
+        delta = self._delta_out if outgoing else self._delta_in
+        csr_rows = rows[rows < len(indptr) - 1]
+        starts = indptr[csr_rows]
+        counts = indptr[csr_rows + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        edges = indexed[offsets]
+        if len(delta) > 0:
+            if len(delta) < len(rows):
+                row_mask = np.zeros(len(self._ids), dtype=bool)
+                row_mask[rows] = True
+                delta_edges = [edge for row, row_edges in delta.items() if row_mask[row] for edge in row_edges]
+            else:
+                delta_edges = [edge for row in rows.tolist() for edge in delta.get(row, ())]
+            edges = np.concatenate([edges, np.array(delta_edges, dtype=np.int64)])
+        return edges[self._alive[edges]]
+
+    def _append_edge(self, source: int, target: int) -> int:
+        edge = self._num_edges
+        if edge == len(self._sources):
+            capacity = max(2 * len(self._sources), 16)
+            self._sources = np.resize(self._sources, capacity)
+            self._targets = np.resize(self._targets, capacity)
+            self._edge_labels = np.resize(self._edge_labels, capacity)
+            self._alive = np.resize(self._alive, capacity)
+        self._sources[edge] = source
+        self._targets[edge] = target
+        self._alive[edge] = True
+        self._num_edges += 1
+        self._num_live += 1
+        self._delta_out.setdefault(source, []).append(edge)
+        self._delta_in.setdefault(target, []).append(edge)
+        return edge
+
+    def _kill_edge(self, edge: int) -> None:
+        self._alive[edge] = False
+        self._edge_data.pop(edge, None)
+        self._num_live -= 1
+        if edge < self._num_indexed:
+            self._num_dead += 1
+        else:
+            for delta, row in ((self._delta_out, int(self._sources[edge])), (self._delta_in, int(self._targets[edge]))):
+                delta[row].remove(edge)
+                if len(delta[row]) == 0:
+                    del delta[row]
+
+    def _maybe_rebuild(self) -> None:
+        pending = self._num_edges - self._num_indexed + self._num_dead
+        if pending > max(MIN_DELTA_SIZE, self.delta_ratio * self._num_indexed):
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        """
+        Drops dead edges, renumbering the live ones, and rebuilds the CSR and CSC arrays over all of them.
+        """
+        live = np.flatnonzero(self._alive[:self._num_edges])
+        renumbered = {int(edge): i for i, edge in enumerate(live.tolist()) if int(edge) in self._edge_data}
+        self._edge_data = {renumbered[edge]: data for edge, data in self._edge_data.items()}
+        self._sources = self._sources[live]
+        self._targets = self._targets[live]
+        self._edge_labels = self._edge_labels[live]
+        self._alive = np.ones(len(live), dtype=bool)
+        self._num_edges = self._num_indexed = self._num_live = len(live)
+        self._num_dead = 0
+        self._out_indptr, self._out_edges = _index_by(self._sources, len(self._ids))
+        self._in_indptr, self._in_edges = _index_by(self._targets, len(self._ids))
+        self._delta_out, self._delta_in = {}, {}
+
+class _NodeView(Mapping[str, GraphNode]):
+    def __init__(self, graph: CompactGraph):
+        self._graph = graph
+
+    def __getitem__(self, node_id: str) -> GraphNode:
+        row = self._graph._rows.get(node_id)
+        if row is None or self._graph._node_types[row] is None:
+            raise KeyError(node_id)
+        return self._graph._hydrate_node(row)
+
+    def __contains__(self, node_id: object) -> bool:
+        row = self._graph._rows.get(node_id)
+        return row is not None and self._graph._node_types[row] is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return (node_id for node_id, node_type in zip(self._graph._ids, self._graph._node_types) if node_type is not None)
+
+    def __len__(self) -> int:
+        return self._graph._num_nodes
+
+class _RelationView(Mapping[str, GraphRelation]):
+    def __init__(self, graph: CompactGraph):
+        self._graph = graph
+
+    def __getitem__(self, relation_id: str) -> GraphRelation:
+        edge = self._graph._find_relation(relation_id)
+        if edge is None:
+            raise KeyError(relation_id)
+        return self._graph._hydrate_relation(edge)
+
+    def __iter__(self) -> Iterator[str]:
+        graph = self._graph
+        return (graph._relation_key(edge) for edge in np.flatnonzero(graph._alive[:graph._num_edges]).tolist())
+
+    def __len__(self) -> int:
+        return self._graph._num_live
+
+def _index_by(rows: np.ndarray, num_rows: int) -> tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(num_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_rows), out=indptr[1:])
+    return indptr, order.astype(np.int64)
+
+def _unique_in_order(values: np.ndarray) -> np.ndarray:
+    _, first = np.unique(values, return_index=True)
+    return values[np.sort(first)]
\ No newline at end of file
@@ -1,8 +1,11 @@
 from typing import Any, Optional, TypedDict
 
+from flowstack.typing import MetadataFilters
+
 class GraphNodeQuery(TypedDict, total=False):
     ids: Optional[list[str]]
     properties: Optional[dict[str, Any]]
+    filters: Optional[MetadataFilters]
 
 class GraphTripletQuery(TypedDict, total=False):
     ids: Optional[list[str]]
@@ -1,19 +1,82 @@
+from collections.abc import Iterable
+import json
 import os.path
-from typing import Any, Optional, Unpack
+import threading
+from typing import Any, Optional, Self, Type, Union, Unpack
 
 import fsspec
+import numpy as np
 
-from flowstack.stores import Graph, GraphNode, GraphNodeQuery, GraphRelation, GraphStore, GraphTriplet, GraphTripletQuery, VectorStoreQuery
-from flowstack.typing import Embedding
+from flowstack.core.utils.constants import DEFAULT_DOC_ID_KEY, DEFAULT_SIMILARITY_TOP_K, GRAPH_TRIPLET_SOURCE_KEY
+from flowstack.stores import (
+    CompactGraph,
+    Graph,
+    GraphNode,
+    GraphNodeQuery,
+    GraphRelation,
+    GraphStore,
+    GraphTriplet,
+    GraphTripletQuery,
+    SimilarityMetric,
+    VectorStoreQuery,
+    VectorStoreQueryMode
+)
+from flowstack.stores.filtering import MetadataColumns
+from flowstack.stores.vector.utils import as_matrix, compute_similarities, row_norms, top_k_indices
+from flowstack.stores.wal import DEFAULT_COMPACTION_THRESHOLD, LogRecord, LogStructuredStorage
+from flowstack.typing import Embedding, FilterOperator, MetadataFilter, MetadataFilters
+
+GRAPH_FILE = 'graph.json'
 
 class SimpleGraphStore(GraphStore):
+    """
+    With compact, the graph is held in a CompactGraph, interned and array-backed, rather than a Graph of pydantic objects,
+    for graphs of millions of nodes.
+
+    Lookups by get and get_triplets go through inverted indexes: node ids, entity names and relation names
+    are kept in dicts, node properties in MetadataColumns, where the keys of property_indexes
+    and the source and ref artifact ids of extracted nodes are indexed as well, see GraphStore.delete_artifacts.
+
+    Node embeddings are copied into one matrix, row for row with the property columns, which vector_query
+    scores with similarity_metric in a single pass.
+    """
+
     def __init__(
         self,
-        graph: Optional[Graph] = None,
-        fs: Optional[fsspec.AbstractFileSystem] = None
+        graph: Optional[Union[Graph, CompactGraph]] = None,
+        fs: Optional[fsspec.AbstractFileSystem] = None,
+        property_indexes: dict[str, str] = {},
+        compact: bool = False,
+        similarity_metric: str = SimilarityMetric.IP
     ):
-        self._graph: Graph = graph or Graph()
+        self._graph: Union[Graph, CompactGraph] = graph or (CompactGraph() if compact else Graph())
         self._fs: fsspec.AbstractFileSystem = fs or fsspec.filesystem('file')
+        self.property_indexes = property_indexes
+        self.similarity_metric = SimilarityMetric(similarity_metric.upper())
+        self._lock = threading.RLock()
+        self._storage: Optional[LogStructuredStorage[dict[str, Any]]] = None
+
+        # Node properties are kept column-wise, in node insertion order, so get can filter with masks.
+        # Keys in property_indexes, such as {'doc_id': 'HASH'}, are also indexed for selective lookups.
+        self._node_ids: list[str] = []
+        self._node_rows: dict[str, int] = {}
+        self._columns = MetadataColumns(indexes={
+            GRAPH_TRIPLET_SOURCE_KEY: 'HASH',
+            DEFAULT_DOC_ID_KEY: 'HASH',
+            **property_indexes
+        })
+        # Node ids by name and triplets by relation name, with the reverse maps to unindex them.
+        self._names: dict[str, dict[str, None]] = {}
+        self._node_names: dict[str, str] = {}
+        self._relation_names: dict[str, dict[tuple[str, str, str], None]] = {}
+        self._triplet_names: dict[tuple[str, str, str], str] = {}
+        # Rows past len(self._node_ids) are spare capacity, rows of nodes without an embedding are left as zeros.
+        self._embeddings: Optional[np.ndarray] = None
+        self._norms = np.empty(0, dtype=np.float32)
+        self._has_embedding = np.empty(0, dtype=bool)
+        self._index_nodes(self._graph.ger_nodes())
+        for triplet in self._graph.triplets:
+            self._index_triplet(triplet, self._graph.relations[triplet[1]].name)
 
     def persist(
         self,
@@ -21,12 +84,61 @@ class SimpleGraphStore(GraphStore):
         fs: Optional[fsspec.AbstractFileSystem] = None,
         **kwargs
     ) -> None:
-        fs = fs or self._fs
-        dirname = os.path.dirname(path)
-        if not fs.exists(dirname):
-            fs.makedirs(dirname)
-        with fs.open(path, 'w') as f:
-            f.write(self._graph.model_dump_json())
+        """
+        Writes the graph to the directory at path.
+        If the store was loaded with use_wal and path is its own directory, the log is compacted instead.
+        """
+        if self._storage is not None and path == self._storage.path:
+            self.compact()
+            return
+        _write_graph(self._snapshot(), path, fs or self._fs)
+
+    @classmethod
+    def from_persist_path(
+        cls,
+        path: str,
+        fs: Optional[fsspec.AbstractFileSystem] = None,
+        use_wal: bool = False,
+        compaction_threshold: int = DEFAULT_COMPACTION_THRESHOLD,
+        **kwargs
+    ) -> Self:
+        """
+        Loads a store written by persist. With use_wal, path holds a base snapshot plus a write-ahead log,
+        see SimpleVectorStore.from_persist_path.
+        """
+        fs = fs or fsspec.filesystem('file')
+        new_graph = CompactGraph if kwargs.get('compact') else Graph
+        if not use_wal:
+            return cls(graph=_read_graph(path, fs, new_graph()), fs=fs, **kwargs)
+
+        storage = LogStructuredStorage(
+            path,
+            write_snapshot=_write_graph,
+            fs=fs,
+            compaction_threshold=compaction_threshold
+        )
+        snapshot_path = storage.snapshot_path
+        store = cls(graph=_read_graph(snapshot_path, fs, new_graph()) if snapshot_path else None, fs=fs, **kwargs)
+        for record in storage.replay():
+            store._apply(record)
+        store._storage = storage
+        return store
+
+    def compact(self) -> None:
+        """
+        Folds the write-ahead log into a new base snapshot.
+        """
+        if self._storage is None:
+            raise ValueError('SimpleGraphStore has no write-ahead log, load it with from_persist_path(use_wal=True).')
+        self._storage.compact(self._snapshot)
+
+    def close(self) -> None:
+        if self._storage is not None:
+            self._storage.close()
+
+    @property
+    def supports_vector_query(self) -> bool:
+        return True
 
     def get_schema(self, refresh: bool = False, **kwargs) -> Any:
         pass
@@ -39,14 +151,137 @@ class SimpleGraphStore(GraphStore):
     ) -> Any:
         raise NotImplementedError()
 
-    def vector_query(self, **query: Unpack[VectorStoreQuery]) -> tuple[list[GraphNode], Embedding]:
-        raise NotImplementedError()
+    def vector_query(
+        self,
+        query_embedding: Optional[Embedding] = None,
+        ref_artifact_ids: Optional[list[str]] = None,
+        artifact_ids: Optional[list[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        mode: str = VectorStoreQueryMode.DEFAULT,
+        similarity_top_k: Optional[int] = None,
+        **query: Unpack[VectorStoreQuery]
+    ) -> tuple[list[GraphNode], Embedding]:
+        """
+        Returns the similarity_top_k nodes most similar to query_embedding, best first, and their similarities.
+        artifact_ids restricts the search to those nodes, ref_artifact_ids to the nodes referencing those artifacts
+        and filters apply to node properties. Candidates are narrowed through the property indexes,
+        then scored with one matrix product.
+        """
+        if mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f'Query mode {mode} is not supported in SimpleGraphStore.')
+        if query_embedding is None:
+            raise ValueError('Query embedding is not set.')
+        with self._lock:
+            if self._embeddings is None:
+                return [], np.empty(0, dtype=np.float32)
+            size = len(self._node_ids)
+            rows: Optional[np.ndarray] = None
+            if filters is not None:
+                rows = self._columns.select(filters)
+            if ref_artifact_ids is not None:
+                ref_rows = self._columns.select(MetadataFilters([
+                    MetadataFilter(DEFAULT_DOC_ID_KEY, ref_artifact_ids, operator=FilterOperator.IN)
+                ]))
+                rows = ref_rows if rows is None else np.intersect1d(rows, ref_rows, assume_unique=True)
+            if artifact_ids is not None:
+                id_rows = np.unique(np.array(
+                    [self._node_rows[node_id] for node_id in artifact_ids if node_id in self._node_rows],
+                    dtype=np.int64
+                ))
+                rows = id_rows if rows is None else np.intersect1d(rows, id_rows, assume_unique=True)
 
-    def get(self, **query: Unpack[GraphNodeQuery]) -> list[GraphNode]:
-        pass
+            if rows is None and self._has_embedding[:size].all():
+                # Nothing to narrow down, the matrix is scored in place.
+                matrix, norms, rows = self._embeddings[:size], self._norms[:size], np.arange(size)
+            else:
+                rows = np.flatnonzero(self._has_embedding[:size]) if rows is None else rows[self._has_embedding[rows]]
+                matrix, norms = self._embeddings[rows], self._norms[rows]
+            if len(rows) == 0:
+                return [], np.empty(0, dtype=np.float32)
+            scores = compute_similarities(matrix, query_embedding, metric=self.similarity_metric, norms=norms)
+            top = top_k_indices(scores, similarity_top_k or DEFAULT_SIMILARITY_TOP_K)
+            return [self._graph.nodes[self._node_ids[row]] for row in rows[top].tolist()], scores[top]
 
-    def get_triplets(self, **query: Unpack[GraphTripletQuery]) -> list[GraphTriplet]:
-        pass
+    def get(
+        self,
+        ids: Optional[list[str]] = None,
+        properties: Optional[dict[str, Any]] = None,
+        filters: Optional[MetadataFilters] = None,
+        **query: Unpack[GraphNodeQuery]
+    ) -> list[GraphNode]:
+        """
+        Nodes matching every given field. Properties with a value of None also match nodes without the key.
+        Indexed properties and filters are answered as row sets, without a mask over all nodes.
+        """
+        with self._lock:
+            rows: Optional[np.ndarray] = None
+            if properties:
+                rows = self._columns.select_match(properties)
+            if filters is not None:
+                filter_rows = self._columns.select(filters)
+                rows = filter_rows if rows is None else np.intersect1d(rows, filter_rows, assume_unique=True)
+
+            if ids is not None:
+                allowed = set(rows.tolist()) if rows is not None else None
+                return [
+                    self._graph.nodes[node_id] for node_id in ids
+                    if node_id in self._node_rows and (allowed is None or self._node_rows[node_id] in allowed)
+                ]
+            if rows is None:
+                return self._graph.ger_nodes()
+            return [self._graph.nodes[self._node_ids[row]] for row in rows.tolist()]
+
+    def get_triplets(
+        self,
+        ids: Optional[list[str]] = None,
+        entity_names: Optional[list[str]] = None,
+        relation_names: Optional[list[str]] = None,
+        sources: Optional[list[str]] = None,
+        targets: Optional[list[str]] = None,
+        properties: Optional[dict[str, Any]] = None,
+        **query: Unpack[GraphTripletQuery]
+    ) -> list[GraphTriplet]:
+        """
+        Triplets matching every given field: ids and entity_names name the node at either end, sources the subject,
+        targets the object and relation_names the relation. properties match the relation or either node.
+        Each field is resolved through an index and the results intersected, only relation properties
+        are checked triplet by triplet, on what is left.
+        """
+        with self._lock:
+            selections: list[Iterable[tuple[str, str, str]]] = []
+            if ids is not None:
+                selections.append(self._incident(ids))
+            if entity_names is not None:
+                selections.append(self._incident([
+                    node_id for name in entity_names for node_id in self._names.get(name, ())
+                ]))
+            if sources is not None:
+                selections.append(triplet for node_id in sources for triplet in self._graph.get_outgoing(node_id))
+            if targets is not None:
+                selections.append(triplet for node_id in targets for triplet in self._graph.get_incoming(node_id))
+            if relation_names is not None:
+                selections.append(
+                    triplet for name in relation_names for triplet in self._relation_names.get(name, ())
+                )
+
+            triplets: Optional[dict[tuple[str, str, str], None]] = None
+            for selection in selections:
+                triplets = (
+                    dict.fromkeys(selection)
+                    if triplets is None
+                    else dict.fromkeys(triplet for triplet in selection if triplet in triplets)
+                )
+            if triplets is None:
+                triplets = dict.fromkeys(self._graph.triplets)
+            if properties:
+                node_triplets = set(self._incident([
+                    self._node_ids[row] for row in self._columns.select_match(properties).tolist()
+                ]))
+                triplets = dict.fromkeys(
+                    triplet for triplet in triplets
+                    if triplet in node_triplets or _has_properties(self._graph.relations[triplet[1]], properties)
+                )
+            return [self._graph.to_triplet(triplet) for triplet in triplets]
 
     def get_rel_map(
         self,
@@ -56,13 +291,225 @@ class SimpleGraphStore(GraphStore):
         limit: int = 30,
         **kwargs
     ) -> list[GraphTriplet]:
-        pass
+        """
+        Triplets within depth hops of nodes, in either direction, nearest first, see Graph.traverse.
+        """
+        with self._lock:
+            triplets = self._graph.traverse(
+                [node.id for node in nodes],
+                depth=depth,
+                limit=limit,
+                ignore_rels=ignore_rels
+            )
+            return [self._graph.to_triplet(triplet) for triplet in triplets]
 
     def upsert_nodes(self, nodes: list[GraphNode], **kwargs) -> None:
-        pass
+        with self._lock:
+            self._upsert_nodes(nodes)
+            self._log('upsert_nodes', {'nodes': [_encode_node(node) for node in nodes]})
 
     def upsert_relations(self, relations: list[GraphRelation], **kwargs) -> None:
-        pass
+        with self._lock:
+            self._upsert_relations(relations)
+            self._log('upsert_relations', {'relations': [relation.model_dump(mode='json') for relation in relations]})
 
     def delete(self, **query: Unpack[GraphNodeQuery]) -> None:
-        pass
\ No newline at end of file
+        """
+        Deletes the nodes matched by get. A query without ids, properties or filters matches nothing here,
+        rather than every node.
+        """
+        if query.get('ids') is None and not query.get('properties') and query.get('filters') is None:
+            return
+        with self._lock:
+            node_ids = [node.id for node in self.get(**query)]
+            if len(node_ids) > 0:
+                self._delete_nodes(node_ids)
+                self._log('delete', {'ids': node_ids})
+
+    def _upsert_nodes(self, nodes: list[GraphNode]) -> None:
+        for node in nodes:
+            self._graph.add_node(node)
+        self._index_nodes(nodes)
+
+    def _upsert_relations(self, relations: list[GraphRelation]) -> None:
+        for relation in relations:
+            self._graph.add_relation(relation)
+            self._index_triplet((relation.source, relation.id, relation.target), relation.name)
+        # add_relation creates entity nodes for unknown endpoints, which need rows as well.
+        self._index_nodes([
+            self._graph.nodes[node_id]
+            for node_id in dict.fromkeys(
+                node_id
+                for relation in relations
+                for node_id in (relation.source, relation.target)
+            )
+            if node_id not in self._node_rows
+        ])
+
+    def _index_nodes(self, nodes: list[GraphNode]) -> None:
+        rows = np.empty(len(nodes), dtype=np.int64)
+        for i, node in enumerate(nodes):
+            row = self._node_rows.get(node.id)
+            if row is None:
+                row = len(self._node_ids)
+                self._node_rows[node.id] = row
+                self._node_ids.append(node.id)
+            rows[i] = row
+            self._unindex_name(node.id)
+            self._node_names[node.id] = node.name
+            self._names.setdefault(node.name, {})[node.id] = None
+        self._columns.set(rows, [node.properties for node in nodes])
+        self._set_embeddings(rows, [node.embedding for node in nodes])
+
+    def _set_embeddings(self, rows: np.ndarray, embeddings: list[Optional[Embedding]]) -> None:
+        size = len(self._node_ids)
+        if size > len(self._has_embedding):
+            capacity = max(size, 2 * len(self._has_embedding))
+            self._has_embedding = np.resize(self._has_embedding, capacity)
+            self._has_embedding[size:] = False
+            self._norms = np.resize(self._norms, capacity)
+            if self._embeddings is not None:
+                self._embeddings = np.resize(self._embeddings, (capacity, self._embeddings.shape[1]))
+        self._has_embedding[rows] = False
+        present = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+        if len(present) == 0:
+            return
+        vectors = as_matrix([embeddings[i] for i in present])
+        if self._embeddings is None:
+            self._embeddings = np.zeros((len(self._has_embedding), vectors.shape[1]), dtype=np.float32)
+        elif vectors.shape[1] != self._embeddings.shape[1]:
+            raise ValueError(
+                f'Expected node embeddings of dimension {self._embeddings.shape[1]}, got {vectors.shape[1]}.'
+            )
+        present_rows = rows[present]
+        self._embeddings[present_rows] = vectors
+        self._norms[present_rows] = row_norms(vectors)
+        self._has_embedding[present_rows] = True
+
+    def _unindex_name(self, node_id: str) -> None:
+        name = self._node_names.pop(node_id, None)
+        if name is not None:
+            _discard(self._names, name, node_id)
+
+    def _index_triplet(self, triplet: tuple[str, str, str], name: str) -> None:
+        self._unindex_triplet(triplet)
+        self._triplet_names[triplet] = name
+        self._relation_names.setdefault(name, {})[triplet] = None
+
+    def _unindex_triplet(self, triplet: tuple[str, str, str]) -> None:
+        name = self._triplet_names.pop(triplet, None)
+        if name is not None:
+            _discard(self._relation_names, name, triplet)
+
+    def _incident(self, node_ids: list[str]) -> dict[tuple[str, str, str], None]:
+        return dict.fromkeys(
+            triplet
+            for node_id in node_ids
+            for triplet in (*self._graph.get_outgoing(node_id), *self._graph.get_incoming(node_id))
+        )
+
+    def _delete_nodes(self, node_ids: list[str]) -> None:
+        node_ids = set(node_ids)
+        for triplet in self._incident(list(node_ids)):
+            self._unindex_triplet(triplet)
+        for node_id in node_ids:
+            self._graph.delete_node(node_id)
+            self._unindex_name(node_id)
+
+        kept_rows = np.fromiter(
+            (row for row, node_id in enumerate(self._node_ids) if node_id not in node_ids),
+            dtype=np.int64
+        )
+        self._node_ids = [self._node_ids[row] for row in kept_rows]
+        self._node_rows = {node_id: row for row, node_id in enumerate(self._node_ids)}
+        self._columns.compact(kept_rows)
+        self._has_embedding = self._has_embedding[kept_rows]
+        self._norms = self._norms[kept_rows]
+        if self._embeddings is not None:
+            self._embeddings = self._embeddings[kept_rows]
+
+    def _apply(self, record: LogRecord) -> None:
+        match record.operation:
+            case 'upsert_nodes':
+                self._upsert_nodes([_decode_node(node) for node in record.args['nodes']])
+            case 'upsert_relations':
+                self._upsert_relations([GraphRelation.model_validate(relation) for relation in record.args['relations']])
+            case 'delete':
+                self._delete_nodes(record.args['ids'])
+            case _:
+                raise ValueError(f'Unknown log operation: {record.operation}.')
+
+    def _log(self, operation: str, args: dict[str, Any]) -> None:
+        if self._storage is None:
+            return
+        self._storage.append(operation, args)
+        if self._storage.needs_compaction:
+            self._storage.compact_in_background(self._snapshot)
+
+    def _snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                'nodes': [_encode_node(node) for node in self._graph.nodes.values()],
+                'relations': [relation.model_dump(mode='json') for relation in self._graph.relations.values()],
+                'triplets': [list(triplet) for triplet in self._graph.triplets]
+            }
+
+def _write_graph(snapshot: dict[str, Any], path: str, fs: fsspec.AbstractFileSystem) -> None:
+    if not fs.exists(path):
+        fs.makedirs(path)
+    with fs.open(os.path.join(path, GRAPH_FILE), 'w') as f:
+        json.dump(snapshot, f)
+
+def _read_graph(
+    path: str,
+    fs: fsspec.AbstractFileSystem,
+    graph: Union[Graph, CompactGraph]
+) -> Union[Graph, CompactGraph]:
+    with fs.open(os.path.join(path, GRAPH_FILE), 'r') as f:
+        snapshot = json.load(f)
+    nodes = {}
+    for node in snapshot['nodes']:
+        node = _decode_node(node)
+        graph.add_node(node)
+        nodes[node.id] = node
+    relations = {}
+    for relation in snapshot['relations']:
+        relation = GraphRelation.model_validate(relation)
+        relations[relation.id] = relation
+    for subject_id, relation_id, obj_id in snapshot['triplets']:
+        graph.add_triplet(GraphTriplet(nodes[subject_id], relations[relation_id], nodes[obj_id]))
+    return graph
+
+def _has_properties(relation: GraphRelation, properties: dict[str, Any]) -> bool:
+    return all(relation.properties.get(key) == value for key, value in properties.items())
+
+def _discard(index: dict[Any, dict[Any, None]], key: Any, value: Any) -> None:
+    values = index.get(key)
+    if values is not None:
+        values.pop(value, None)
+        if len(values) == 0:
+            del index[key]
+
+def _encode_node(node: GraphNode) -> dict[str, Any]:
+    return {
+        **node.model_dump(mode='json', exclude={'embedding'}),
+        'type': type(node).__name__,
+        'embedding': node.embedding.tolist() if node.embedding is not None else None
+    }
+
+def _decode_node(data: dict[str, Any]) -> GraphNode:
+    data = dict(data)
+    node_type = _node_types()[data.pop('type')]
+    embedding = data.pop('embedding')
+    if embedding is not None:
+        data['embedding'] = np.asarray(embedding, dtype=np.float32)
+    return node_type.model_validate(data)
+
+def _node_types() -> dict[str, Type[GraphNode]]:
+    types: dict[str, Type[GraphNode]] = {}
+    pending = [GraphNode]
+    while pending:
+        for subclass in pending.pop().__subclasses__():
+            types[subclass.__name__] = subclass
+            pending.append(subclass)
+    return types
\ No newline at end of file
@@ -1,9 +1,11 @@
 from abc import ABC, abstractmethod
+from collections import deque
 from typing import Any, NamedTuple, Optional, Self, Union, override
 
-from pydantic import Field
+from pydantic import Field, PrivateAttr
 
 from flowstack.artifacts import Artifact, ArtifactMetadata, Text
+from flowstack.core.utils.constants import DEFAULT_DOC_ID_KEY, GRAPH_TRIPLET_SOURCE_KEY
 from flowstack.typing import Embedding, Serializable
 
 class GraphElement(Serializable, ABC):
@@ -24,6 +26,16 @@ class GraphElement(Serializable, ABC):
     def __str__(self) -> str:
         pass
 
+    def set_source(self, artifact: Artifact) -> Self:
+        """
+        Records artifact as the one this element was extracted from, and its ref artifact if it has one,
+        so that GraphStore.delete_artifacts finds the element by either id.
+        """
+        self.properties[GRAPH_TRIPLET_SOURCE_KEY] = artifact.id
+        if artifact.ref_id is not None:
+            self.properties[DEFAULT_DOC_ID_KEY] = artifact.ref_id
+        return self
+
     def to_artifact(self) -> Artifact:
         return Text(
             str(self),
@@ -50,12 +62,14 @@ class GraphNode(GraphElement, ABC):
 class EntityNode(GraphNode):
     name: str
 
+    # The name field is shadowed by the name property of GraphElement, which itself defaults to id,
+    # so both read the field value directly.
     @property
     def id(self) -> str:
-        return self.name.replace('"', ' ')
+        return self.__dict__['name'].replace('"', ' ')
 
     def __str__(self) -> str:
-        return self.name
+        return self.__dict__['name']
 
 class ChunkNode(GraphNode):
     text: str
@@ -67,7 +81,7 @@ class ChunkNode(GraphNode):
 
     @classmethod
     def from_artifact(cls, artifact: Artifact) -> Self:
-        return cls(
+        node = cls(
             text=str(artifact),
             id_=artifact.id,
             label=artifact.name,
@@ -77,6 +91,9 @@ class ChunkNode(GraphNode):
             },
             metadata=artifact.metadata
         )
+        if artifact.ref_id is not None:
+            node.properties[DEFAULT_DOC_ID_KEY] = artifact.ref_id
+        return node
 
     def __str__(self) -> str:
         return self.text
@@ -122,10 +139,22 @@ class GraphTriplet(NamedTuple):
         )
 
 class Graph(Serializable):
+    """
+    Triplets are (subject id, relation id, object id) keys. Every node also has its outgoing and incoming triplets
+    indexed, kept in step by add_triplet and delete_triplet, so neighbourhood lookups never scan the whole graph.
+    """
     nodes: dict[str, GraphNode] = Field(default_factory=dict)
     relations: dict[str, GraphRelation] = Field(default_factory=dict)
     triplets: set[tuple[str, str, str]] = Field(default_factory=set)
 
+    # Dicts rather than sets, so that traversals visit triplets in insertion order.
+    _outgoing: dict[str, dict[tuple[str, str, str], None]] = PrivateAttr(default_factory=dict)
+    _incoming: dict[str, dict[tuple[str, str, str], None]] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, context: Any) -> None:
+        for triplet in self.triplets:
+            self._link(triplet)
+
     def ger_nodes(self) -> list[GraphNode]:
         return list(self.nodes.values())
 
@@ -133,10 +162,52 @@ class Graph(Serializable):
         return list(self.relations.values())
 
     def get_triplets(self) -> list[GraphTriplet]:
-        return [
-            GraphTriplet(self.nodes[subject], self.relations[relation], self.nodes[obj])
-            for subject, relation, obj in self.triplets
-        ]
+        return [self.to_triplet(triplet) for triplet in self.triplets]
+
+    def to_triplet(self, triplet: tuple[str, str, str]) -> GraphTriplet:
+        subject, relation, obj = triplet
+        return GraphTriplet(self.nodes[subject], self.relations[relation], self.nodes[obj])
+
+    def get_outgoing(self, node_id: str) -> list[tuple[str, str, str]]:
+        return list(self._outgoing.get(node_id, ()))
+
+    def get_incoming(self, node_id: str) -> list[tuple[str, str, str]]:
+        return list(self._incoming.get(node_id, ()))
+
+    def traverse(
+        self,
+        node_ids: list[str],
+        depth: int = 2,
+        limit: Optional[int] = None,
+        ignore_rels: Optional[list[str]] = None
+    ) -> list[tuple[str, str, str]]:
+        """
+        Breadth-first search from node_ids along triplets in either direction, up to depth hops.
+        Returns the triplets crossed, nearest first, stopping after limit of them.
+        Relations whose name is in ignore_rels are neither returned nor followed.
+        Only the visited neighbourhood is touched, whatever the size of the graph.
+        """
+        if limit is not None and limit <= 0:
+            return []
+        ignored = set(ignore_rels or [])
+        found: dict[tuple[str, str, str], None] = {}
+        visited = {node_id for node_id in node_ids if node_id in self.nodes}
+        frontier = deque((node_id, 0) for node_id in dict.fromkeys(node_ids) if node_id in self.nodes)
+        while frontier:
+            node_id, hops = frontier.popleft()
+            if hops >= depth:
+                continue
+            for adjacency, end in ((self._outgoing, 2), (self._incoming, 0)):
+                for triplet in adjacency.get(node_id, ()):
+                    if triplet in found or self.relations[triplet[1]].name in ignored:
+                        continue
+                    found[triplet] = None
+                    if limit is not None and len(found) >= limit:
+                        return list(found)
+                    if triplet[end] not in visited:
+                        visited.add(triplet[end])
+                        frontier.append((triplet[end], hops + 1))
+        return list(found)
 
     def add_node(self, node: GraphNode) -> None:
         self.nodes[node.id] = node
@@ -154,14 +225,20 @@ class Graph(Serializable):
 
     def add_triplet(self, triplet: GraphTriplet) -> None:
         subject, relation, obj = triplet
+        self.relations[relation.id] = relation
         if (subject.id, relation.id, obj.id) in self.triplets:
             return
         self.add_node(subject)
         self.add_node(obj)
-        self.relations[relation.id] = relation
         self.triplets.add((subject.id, relation.id, obj.id))
+        self._link((subject.id, relation.id, obj.id))
 
     def delete_node(self, node_id: str) -> None:
+        """
+        Deletes the node along with every triplet it is part of.
+        """
+        for triplet in [*self._outgoing.get(node_id, ()), *self._incoming.get(node_id, ())]:
+            self.delete_triplet(triplet)
         if node_id in self.nodes:
             del self.nodes[node_id]
 
@@ -171,17 +248,35 @@ class Graph(Serializable):
             if isinstance(relation_id, str)
             else _relation_id(relation_id[0], relation_id[1])
         )
-        if relation_id in self.relations:
-            del self.relations[relation_id]
+        relation = self.relations.get(relation_id)
+        if relation is None:
+            return
+        for triplet in self.get_outgoing(relation.source):
+            if triplet[1] == relation_id:
+                self.delete_triplet(triplet)
+        self.relations.pop(relation_id, None)
 
     def delete_triplet(self, triplet: tuple[str, str, str]) -> None:
+        """
+        Deletes the triplet and its relation, leaving both nodes in place.
+        """
         if triplet not in self.triplets:
             return
-        subject_id, relation_id, obj_id = triplet
-        self.delete_node(subject_id)
-        self.delete_node(relation_id)
-        self.delete_relation(relation_id)
         self.triplets.remove(triplet)
+        self._unlink(triplet)
+        self.relations.pop(triplet[1], None)
+
+    def _link(self, triplet: tuple[str, str, str]) -> None:
+        self._outgoing.setdefault(triplet[0], {})[triplet] = None
+        self._incoming.setdefault(triplet[2], {})[triplet] = None
+
+    def _unlink(self, triplet: tuple[str, str, str]) -> None:
+        for adjacency, node_id in ((self._outgoing, triplet[0]), (self._incoming, triplet[2])):
+            triplets = adjacency.get(node_id)
+            if triplets is not None:
+                triplets.pop(triplet, None)
+                if len(triplets) == 0:
+                    del adjacency[node_id]
 
 def _relation_id(source: str, target: str) -> str:
     return f'{source}->{target}'
\ No newline at end of file
@@ -0,0 +1,234 @@
+from abc import ABC, abstractmethod
+import bisect
+from collections.abc import Hashable
+from typing import Any, ClassVar, Type
+
+import numpy as np
+
+from flowstack.typing import FilterOperator
+
+class MetadataIndex(ABC):
+    """
+    Secondary index over one metadata key. Lookups return the sorted rows holding a matching value,
+    without scanning the column. Indexes are kept in sync by MetadataColumns on every set and compaction.
+    """
+
+    index_type: ClassVar[str]
+
+    @abstractmethod
+    def supports(self, operator: FilterOperator, value: Any) -> bool:
+        pass
+
+    @abstractmethod
+    def lookup(self, operator: FilterOperator, value: Any) -> np.ndarray:
+        pass
+
+    @abstractmethod
+    def add(self, rows: list[int], values: list[Any]) -> None:
+        pass
+
+    @abstractmethod
+    def remove(self, rows: np.ndarray) -> None:
+        pass
+
+    @abstractmethod
+    def compact(self, kept_rows: np.ndarray, size: int) -> None:
+        """
+        kept_rows[i] is the old row number of new row i, size is the number of rows before compaction.
+        """
+
+    @abstractmethod
+    def reset(self) -> None:
+        pass
+
+class HashIndex(MetadataIndex):
+    """
+    Maps each scalar value to the set of rows holding it, for EQ, NE, IN and NIN.
+    """
+
+    index_type = 'HASH'
+
+    def __init__(self):
+        self.reset()
+
+    def supports(self, operator: FilterOperator, value: Any) -> bool:
+        if operator in [FilterOperator.EQ, FilterOperator.NE]:
+            return _is_scalar(value)
+        if operator in [FilterOperator.IN, FilterOperator.NIN]:
+            return all(_is_scalar(v) for v in value) if isinstance(value, list) else _is_scalar(value)
+        return False
+
+    def lookup(self, operator: FilterOperator, value: Any) -> np.ndarray:
+        values = value if isinstance(value, list) else [value]
+        return _sorted_rows(self._postings.get(v, ()) for v in values)
+
+    def add(self, rows: list[int], values: list[Any]) -> None:
+        for row, value in zip(rows, values):
+            if not _is_scalar(value):
+                continue
+            self._row_values[row] = value
+            posting = self._postings.get(value)
+            if posting is None:
+                posting = self._postings[value] = set()
+                self._on_new_value(value)
+            posting.add(row)
+
+    def remove(self, rows: np.ndarray) -> None:
+        for row in np.asarray(rows).tolist():
+            value = self._row_values.pop(row, None)
+            if value is None:
+                continue
+            posting = self._postings[value]
+            posting.discard(row)
+            if len(posting) == 0:
+                del self._postings[value]
+                self._on_removed_value(value)
+
+    def compact(self, kept_rows: np.ndarray, size: int) -> None:
+        mapping = np.full(size, -1, dtype=np.int64)
+        mapping[kept_rows] = np.arange(len(kept_rows))
+        row_values = self._row_values
+        self.reset()
+        rows = list(row_values.keys())
+        new_rows = mapping[rows].tolist() if len(rows) > 0 else []
+        self.add(
+            [row for row in new_rows if row >= 0],
+            [value for row, value in zip(new_rows, row_values.values()) if row >= 0]
+        )
+
+    def reset(self) -> None:
+        self._postings: dict[Any, set[int]] = {}
+        self._row_values: dict[int, Any] = {}
+
+    def _on_new_value(self, value: Any) -> None:
+        pass
+
+    def _on_removed_value(self, value: Any) -> None:
+        pass
+
+class PrefixIndex(HashIndex):
+    """
+    Hash index that also keeps its distinct strings sorted, which answers TEXT_MATCH prefix queries
+    like a flattened trie: every string starting with a prefix sits in one contiguous range.
+    """
+
+    index_type = 'PREFIX'
+
+    def supports(self, operator: FilterOperator, value: Any) -> bool:
+        if operator == FilterOperator.TEXT_MATCH:
+            return isinstance(value, str)
+        return super().supports(operator, value)
+
+    def lookup(self, operator: FilterOperator, value: Any) -> np.ndarray:
+        if operator != FilterOperator.TEXT_MATCH:
+            return super().lookup(operator, value)
+        start = bisect.bisect_left(self._terms, value)
+        end = start
+        while end < len(self._terms) and self._terms[end].startswith(value):
+            end += 1
+        return _sorted_rows(self._postings[term] for term in self._terms[start:end])
+
+    def reset(self) -> None:
+        super().reset()
+        self._terms: list[str] = []
+
+    def _on_new_value(self, value: Any) -> None:
+        if isinstance(value, str):
+            bisect.insort(self._terms, value)
+
+    def _on_removed_value(self, value: Any) -> None:
+        if isinstance(value, str):
+            del self._terms[bisect.bisect_left(self._terms, value)]
+
+class SortedIndex(MetadataIndex):
+    """
+    Numeric values kept sorted alongside their rows, for GT, GTE, LT and LTE range filters
+    and numeric EQ and IN. Lookups are binary searches.
+    """
+
+    index_type = 'SORTED'
+
+    def __init__(self):
+        self.reset()
+
+    def supports(self, operator: FilterOperator, value: Any) -> bool:
+        if operator in [FilterOperator.GT, FilterOperator.GTE, FilterOperator.LT, FilterOperator.LTE]:
+            return _is_number(value)
+        if operator in [FilterOperator.EQ, FilterOperator.NE]:
+            return _is_number(value)
+        if operator in [FilterOperator.IN, FilterOperator.NIN]:
+            return isinstance(value, list) and all(_is_number(v) for v in value)
+        return False
+
+    def lookup(self, operator: FilterOperator, value: Any) -> np.ndarray:
+        match operator:
+            case FilterOperator.GT:
+                rows = self._rows[np.searchsorted(self._values, value, side='right'):]
+            case FilterOperator.GTE:
+                rows = self._rows[np.searchsorted(self._values, value, side='left'):]
+            case FilterOperator.LT:
+                rows = self._rows[:np.searchsorted(self._values, value, side='left')]
+            case FilterOperator.LTE:
+                rows = self._rows[:np.searchsorted(self._values, value, side='right')]
+            case _:
+                values = np.unique(np.asarray(value if isinstance(value, list) else [value], dtype=np.float64))
+                starts = np.searchsorted(self._values, values, side='left')
+                ends = np.searchsorted(self._values, values, side='right')
+                rows = np.concatenate([self._rows[start:end] for start, end in zip(starts, ends)] or [self._rows[:0]])
+        # Every row holds a single value, so the rows of distinct values never overlap.
+        return np.sort(rows)
+
+    def add(self, rows: list[int], values: list[Any]) -> None:
+        # NaN never satisfies a comparison, so it is left out rather than sorted to the end.
+        numbers = [(row, value) for row, value in zip(rows, values) if _is_number(value) and value == value]
+        if len(numbers) == 0:
+            return
+        new_rows = np.array([row for row, _ in numbers], dtype=np.int64)
+        new_values = np.array([value for _, value in numbers], dtype=np.float64)
+        order = np.argsort(new_values, kind='stable')
+        new_rows, new_values = new_rows[order], new_values[order]
+        positions = np.searchsorted(self._values, new_values, side='right')
+        self._values = np.insert(self._values, positions, new_values)
+        self._rows = np.insert(self._rows, positions, new_rows)
+
+    def remove(self, rows: np.ndarray) -> None:
+        if len(rows) == 0 or len(self._rows) == 0:
+            return
+        keep = ~np.isin(self._rows, rows)
+        self._values = self._values[keep]
+        self._rows = self._rows[keep]
+
+    def compact(self, kept_rows: np.ndarray, size: int) -> None:
+        mapping = np.full(size, -1, dtype=np.int64)
+        mapping[kept_rows] = np.arange(len(kept_rows))
+        rows = mapping[self._rows]
+        keep = rows >= 0
+        self._values = self._values[keep]
+        self._rows = rows[keep]
+
+    def reset(self) -> None:
+        self._values: np.ndarray = np.empty(0, dtype=np.float64)
+        self._rows: np.ndarray = np.empty(0, dtype=np.int64)
+
+METADATA_INDEX_TYPES: dict[str, Type[MetadataIndex]] = {
+    index_type.index_type: index_type
+    for index_type in [HashIndex, PrefixIndex, SortedIndex]
+}
+
+def create_metadata_index(index_type: str) -> MetadataIndex:
+    if index_type not in METADATA_INDEX_TYPES:
+        raise ValueError(f'Unsupported metadata index type: {index_type}.')
+    return METADATA_INDEX_TYPES[index_type]()
+
+def _is_scalar(value: Any) -> bool:
+    # NaN is never equal to itself, so it cannot be looked up by value.
+    return isinstance(value, (str, int, float)) and isinstance(value, Hashable) and value == value
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float))
+
+def _sorted_rows(postings) -> np.ndarray:
+    rows: set[int] = set()
+    for posting in postings:
+        rows.update(posting)
+    return np.array(sorted(rows), dtype=np.int64)
\ No newline at end of file
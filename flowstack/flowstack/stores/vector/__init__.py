@@ -3,7 +3,26 @@ from .typing import (
     VectorStoreQueryMode,
     VectorStoreQuerySpec,
     VectorStoreQuery,
-    VectorStoreQueryResult
+    VectorStoreQueryResult,
+    LazyArtifacts
 )
+from .utils import SimilarityMetric, maximal_marginal_relevance
+from .quantization import (
+    Quantizer,
+    Float16Quantizer,
+    ScalarQuantizer,
+    ProductQuantizer,
+    TruncationQuantizer,
+    PCAQuantizer
+)
+from .index import VectorIndex, FlatIndex, IVFFlatIndex, HNSWIndex
+from .planner import QueryStrategy, QueryPlan, plan_query
+from .sparse import BM25Index
+from .late_interaction import LateInteractionIndex
+from .fusion import fuse_results, reciprocal_rank_fusion, weighted_fusion
+from .learners import LearnerType, fit_linear_scorer
 from .base import VectorStore
-from .simple import SimpleVectorStoreData, SimpleVectorStore
\ No newline at end of file
+from .simple import SimpleVectorStoreData, SimpleVectorStore
+from .cached import CacheInfo, CachedVectorStore
+from .sharded import ShardedVectorStore
+from .segmented import StoreSegment, SegmentedVectorStore
\ No newline at end of file
@@ -1,10 +1,12 @@
 from abc import ABC, abstractmethod
-from typing import Optional, Unpack
+from dataclasses import fields, replace
+from typing import AsyncIterator, Iterator, Optional, Unpack
 
 from flowstack.artifacts import Artifact
 from flowstack.stores import VectorStoreQuery, VectorStoreQueryResult
-from flowstack.typing import MetadataFilters
-from flowstack.utils.threading import run_async
+from flowstack.typing import Embedding, MetadataFilters
+from flowstack.utils.constants import DEFAULT_PAGE_SIZE
+from flowstack.utils.threading import run_async, run_async_iter
 
 class VectorStore(ABC):
     @abstractmethod
@@ -14,6 +16,54 @@ class VectorStore(ABC):
     async def aretrieve(self, **query: Unpack[VectorStoreQuery]) -> VectorStoreQueryResult:
         return await run_async(self.retrieve, **query)
 
+    def iter_retrieve(
+        self,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        **query: Unpack[VectorStoreQuery]
+    ) -> Iterator[VectorStoreQueryResult]:
+        """
+        Yields the results of a query in pages of at most page_size hits, best first.
+        This runs the query once and slices its result, stores that can page through hits on the server should override it.
+        """
+        if page_size <= 0:
+            raise ValueError(f'page_size must be positive, got {page_size}.')
+        result = self.retrieve(**query)
+        for start in range(0, len(result.ids or []), page_size):
+            yield replace(result, **{
+                field.name: getattr(result, field.name)[start:start + page_size]
+                for field in fields(result)
+                if getattr(result, field.name) is not None
+            })
+
+    async def aiter_retrieve(
+        self,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        **query: Unpack[VectorStoreQuery]
+    ) -> AsyncIterator[VectorStoreQueryResult]:
+        async for page in run_async_iter(self.iter_retrieve, page_size, **query):
+            yield page
+
+    def retrieve_many(
+        self,
+        query_embeddings: list[Embedding],
+        **query: Unpack[VectorStoreQuery]
+    ) -> list[VectorStoreQueryResult]:
+        """
+        Runs one query per embedding, sharing every other query parameter, and returns the results in order.
+        Stores that can search a batch of vectors in a single pass should override this.
+        """
+        return [
+            self.retrieve(**{**query, 'query_embedding': query_embedding})
+            for query_embedding in query_embeddings
+        ]
+
+    async def aretrieve_many(
+        self,
+        query_embeddings: list[Embedding],
+        **query: Unpack[VectorStoreQuery]
+    ) -> list[VectorStoreQueryResult]:
+        return await run_async(self.retrieve_many, query_embeddings, **query)
+
     @abstractmethod
     def insert(self, artifacts: list[Artifact], **kwargs) -> list[str]:
         pass
@@ -0,0 +1,380 @@
+"""
+Benchmarks vector stores on synthetic corpora, against ground truth from exact search.
+
+    python -m flowstack.stores.vector.benchmark --store simple --index FLAT --index HNSW --output report.json
+
+The milvus store runs against Milvus Lite, a local database file, unless --uri points at a server.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import datetime as dt
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Optional
+
+from dataclasses_json import DataClassJsonMixin
+import numpy as np
+
+from flowstack.artifacts import ArtifactMetadata, Text
+from flowstack.stores import VectorStore, VectorStoreQueryMode
+from flowstack.stores.vector.utils import SimilarityMetric, compute_similarities, top_k_indices
+from flowstack.typing import FilterOperator, MetadataFilter, MetadataFilters
+
+BUCKET_KEY = 'bucket'
+NUM_BUCKETS = 1000
+DEFAULT_NUM_ROWS = 10_000
+DEFAULT_DIM = 128
+DEFAULT_NUM_QUERIES = 200
+DEFAULT_TOP_K = 10
+DEFAULT_BATCH_SIZE = 1000
+MEMORY_SAMPLE_SIZE = 10
+
+@dataclass
+class BenchmarkCorpus:
+    """
+    Rows drawn around num_clusters random centers, so that partitioned indexes see realistic structure.
+    Row i carries a uniform bucket in [0, NUM_BUCKETS) as metadata, so a filter bucket < selectivity * NUM_BUCKETS
+    keeps that fraction of the rows.
+    """
+    embeddings: np.ndarray
+    queries: np.ndarray
+    buckets: np.ndarray
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.embeddings)
+
+    @property
+    def dim(self) -> int:
+        return self.embeddings.shape[1]
+
+@dataclass
+class BenchmarkCase:
+    name: str
+    mode: str = VectorStoreQueryMode.DEFAULT
+    selectivity: Optional[float] = None
+    additional_kwargs: dict[str, Any] = field(default_factory=dict)
+
+@dataclass
+class CaseResult(DataClassJsonMixin):
+    """
+    Measurements of one case. A case the store does not support has error set and no measurements.
+    """
+    name: str
+    mode: str
+    selectivity: Optional[float]
+    k: int
+    concurrency: int
+    recall: Optional[float] = None
+    latency_mean_ms: Optional[float] = None
+    latency_p50_ms: Optional[float] = None
+    latency_p95_ms: Optional[float] = None
+    latency_p99_ms: Optional[float] = None
+    qps: Optional[float] = None
+    query_memory_bytes: Optional[int] = None
+    error: Optional[str] = None
+
+@dataclass
+class BenchmarkReport(DataClassJsonMixin):
+    store: str
+    config: dict[str, Any]
+    num_rows: int
+    dim: int
+    metric: str
+    insert_seconds: float
+    insert_rows_per_second: float
+    memory_bytes: Optional[int]
+    cases: list[CaseResult]
+    environment: dict[str, Any]
+
+DEFAULT_CASES = [
+    BenchmarkCase('unfiltered'),
+    BenchmarkCase('filter-50%', selectivity=0.5),
+    BenchmarkCase('filter-10%', selectivity=0.1),
+    BenchmarkCase('filter-1%', selectivity=0.01),
+    BenchmarkCase('mmr', mode=VectorStoreQueryMode.MMR)
+]
+
+def make_corpus(
+    num_rows: int = DEFAULT_NUM_ROWS,
+    dim: int = DEFAULT_DIM,
+    num_queries: int = DEFAULT_NUM_QUERIES,
+    num_clusters: Optional[int] = None,
+    noise: float = 0.5,
+    seed: int = 0
+) -> BenchmarkCorpus:
+    rng = np.random.default_rng(seed)
+    num_clusters = num_clusters or max(int(np.sqrt(num_rows)), 1)
+    centers = rng.standard_normal((num_clusters, dim)).astype(np.float32)
+
+    def sample(size: int) -> np.ndarray:
+        vectors = centers[rng.integers(num_clusters, size=size)]
+        return (vectors + noise * rng.standard_normal((size, dim))).astype(np.float32)
+
+    return BenchmarkCorpus(
+        embeddings=sample(num_rows),
+        queries=sample(num_queries),
+        buckets=rng.integers(NUM_BUCKETS, size=num_rows)
+    )
+
+def ground_truth(
+    corpus: BenchmarkCorpus,
+    k: int,
+    metric: str = SimilarityMetric.IP,
+    selectivity: Optional[float] = None
+) -> list[set[int]]:
+    """
+    Exact top k rows of every query, among the rows a filter of the given selectivity keeps.
+    """
+    rows = np.flatnonzero(corpus.buckets < _bucket_bound(selectivity)) if selectivity is not None else None
+    matrix = corpus.embeddings if rows is None else corpus.embeddings[rows]
+    scores = compute_similarities(matrix, corpus.queries, metric=SimilarityMetric(metric.upper()))
+    tops = [top_k_indices(query_scores, k) for query_scores in scores]
+    return [set((top if rows is None else rows[top]).tolist()) for top in tops]
+
+def run_benchmark(
+    store_factory: Callable[[], VectorStore],
+    corpus: BenchmarkCorpus,
+    cases: list[BenchmarkCase] = DEFAULT_CASES,
+    k: int = DEFAULT_TOP_K,
+    metric: str = SimilarityMetric.IP,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    concurrency: Optional[int] = None,
+    measure_memory: bool = True,
+    store_name: str = '',
+    config: dict[str, Any] = {}
+) -> BenchmarkReport:
+    """
+    Inserts the corpus into a store from store_factory in batches of batch_size, then runs every case:
+    each query once in turn for latency, then all of them from concurrency threads for QPS.
+    Recall@k is against exact search and reported for the DEFAULT mode only.
+    A case whose first query the store rejects with ValueError, MMR on a SegmentedVectorStore for instance,
+    is reported with that error instead of aborting the report.
+    With measure_memory, memory is measured in separate passes under tracemalloc, which would skew the timings:
+    the memory held by a first store after the same inserts, and the peak memory of a few queries of each case.
+    Memory held outside the Python process, by a Milvus server for instance, is not seen.
+    """
+    concurrency = concurrency or os.cpu_count() or 1
+    artifacts = [
+        Text(
+            str(row),
+            id=str(row),
+            embedding=corpus.embeddings[row],
+            metadata=ArtifactMetadata(**{BUCKET_KEY: int(corpus.buckets[row])})
+        )
+        for row in range(corpus.num_rows)
+    ]
+
+    # The memory pass comes first, so that a store_factory that replaces a shared collection leaves the timed store.
+    memory_bytes: Optional[int] = None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            store = store_factory()
+            _insert(store, artifacts, batch_size)
+            memory_bytes = tracemalloc.get_traced_memory()[0] - baseline
+            del store
+        finally:
+            tracemalloc.stop()
+
+    store = store_factory()
+    start = time.perf_counter()
+    _insert(store, artifacts, batch_size)
+    insert_seconds = time.perf_counter() - start
+
+    results = [
+        _run_case(store, corpus, case, k, metric, concurrency, measure_memory)
+        for case in cases
+    ]
+    return BenchmarkReport(
+        store=store_name or type(store).__name__,
+        config=config,
+        num_rows=corpus.num_rows,
+        dim=corpus.dim,
+        metric=str(metric),
+        insert_seconds=insert_seconds,
+        insert_rows_per_second=corpus.num_rows / insert_seconds if insert_seconds > 0 else float('inf'),
+        memory_bytes=memory_bytes,
+        cases=results,
+        environment=_environment()
+    )
+
+def save_reports(reports: list[BenchmarkReport], path: str) -> None:
+    with open(path, 'w') as f:
+        json.dump([report.to_dict() for report in reports], f, indent=2)
+
+def _run_case(
+    store: VectorStore,
+    corpus: BenchmarkCorpus,
+    case: BenchmarkCase,
+    k: int,
+    metric: str,
+    concurrency: int,
+    measure_memory: bool
+) -> CaseResult:
+    query = {
+        'mode': case.mode,
+        'similarity_top_k': k,
+        'additional_kwargs': case.additional_kwargs or None
+    }
+    if case.selectivity is not None:
+        query['filters'] = MetadataFilters(filters=[
+            MetadataFilter(BUCKET_KEY, _bucket_bound(case.selectivity), operator=FilterOperator.LT)
+        ])
+
+    def retrieve(query_embedding: np.ndarray) -> list[str]:
+        return store.retrieve(query_embedding=query_embedding.tolist(), **query).ids or []
+
+    try:
+        retrieve(corpus.queries[0])
+    except ValueError as e:
+        return CaseResult(
+            name=case.name,
+            mode=str(case.mode),
+            selectivity=case.selectivity,
+            k=k,
+            concurrency=concurrency,
+            error=str(e)
+        )
+
+    latencies = np.empty(len(corpus.queries))
+    hits: list[list[str]] = []
+    for i, query_embedding in enumerate(corpus.queries):
+        start = time.perf_counter()
+        hits.append(retrieve(query_embedding))
+        latencies[i] = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        list(executor.map(retrieve, corpus.queries))
+        qps = len(corpus.queries) / (time.perf_counter() - start)
+
+    recall: Optional[float] = None
+    if case.mode == VectorStoreQueryMode.DEFAULT:
+        truth = ground_truth(corpus, k, metric=metric, selectivity=case.selectivity)
+        found = sum(len(expected & {int(row) for row in ids}) for expected, ids in zip(truth, hits))
+        expected_total = sum(len(expected) for expected in truth)
+        recall = found / expected_total if expected_total > 0 else 1.0
+
+    query_memory_bytes: Optional[int] = None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            for query_embedding in corpus.queries[:MEMORY_SAMPLE_SIZE]:
+                retrieve(query_embedding)
+            query_memory_bytes = tracemalloc.get_traced_memory()[1] - baseline
+        finally:
+            tracemalloc.stop()
+
+    latencies_ms = latencies * 1000
+    return CaseResult(
+        name=case.name,
+        mode=str(case.mode),
+        selectivity=case.selectivity,
+        k=k,
+        concurrency=concurrency,
+        recall=recall,
+        latency_mean_ms=float(latencies_ms.mean()),
+        latency_p50_ms=float(np.percentile(latencies_ms, 50)),
+        latency_p95_ms=float(np.percentile(latencies_ms, 95)),
+        latency_p99_ms=float(np.percentile(latencies_ms, 99)),
+        qps=qps,
+        query_memory_bytes=query_memory_bytes
+    )
+
+def _insert(store: VectorStore, artifacts: list[Text], batch_size: int) -> None:
+    for start in range(0, len(artifacts), batch_size):
+        store.insert(artifacts[start:start + batch_size])
+
+def _bucket_bound(selectivity: float) -> int:
+    return max(int(round(selectivity * NUM_BUCKETS)), 1)
+
+def _environment() -> dict[str, Any]:
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'timestamp': dt.datetime.now(dt.timezone.utc).isoformat()
+    }
+
+def _store_factory(
+    store: str,
+    dim: int,
+    metric: str,
+    index_config: dict[str, Any],
+    store_config: dict[str, Any],
+    uri: Optional[str]
+) -> Callable[[], VectorStore]:
+    match store:
+        case 'simple':
+            from flowstack.stores.vector.simple import SimpleVectorStore
+            return lambda: SimpleVectorStore(similarity_metric=metric, index_config=index_config, **store_config)
+        case 'segmented':
+            from flowstack.stores.vector.segmented import SegmentedVectorStore
+            return lambda: SegmentedVectorStore(similarity_metric=metric, index_config=index_config, **store_config)
+        case 'milvus':
+            from flowstack.milvus import MilvusVectorStore
+            milvus_uri = uri or os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+            return lambda: MilvusVectorStore(
+                uri=milvus_uri,
+                collection_name='flowstack_benchmark',
+                dim=dim,
+                similarity_metric=metric,
+                index_config=index_config,
+                overwrite=True,
+                **store_config
+            )
+        case _:
+            raise ValueError(f'Unknown store: {store}.')
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Benchmark vector stores on a synthetic corpus.')
+    parser.add_argument('--store', choices=['simple', 'segmented', 'milvus'], default='simple')
+    parser.add_argument('--index', action='append', help='Index type, repeat to compare several.')
+    parser.add_argument('--index-config', type=json.loads, default={}, help='JSON index parameters.')
+    parser.add_argument('--store-config', type=json.loads, default={}, help='JSON store keyword arguments.')
+    parser.add_argument('--uri', help='Milvus URI, a Milvus Lite database file by default.')
+    parser.add_argument('--rows', type=int, default=DEFAULT_NUM_ROWS)
+    parser.add_argument('--dim', type=int, default=DEFAULT_DIM)
+    parser.add_argument('--queries', type=int, default=DEFAULT_NUM_QUERIES)
+    parser.add_argument('--metric', choices=list(SimilarityMetric), default=SimilarityMetric.IP)
+    parser.add_argument('-k', type=int, default=DEFAULT_TOP_K)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--concurrency', type=int)
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc passes.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Path of the JSON report, printed to stdout by default.')
+    args = parser.parse_args(argv)
+
+    corpus = make_corpus(args.rows, args.dim, args.queries, seed=args.seed)
+    reports: list[BenchmarkReport] = []
+    for index_type in args.index or [None]:
+        index_config = {**args.index_config, **({'index_type': index_type} if index_type else {})}
+        config = {'index_config': index_config, 'store_config': args.store_config}
+        reports.append(run_benchmark(
+            _store_factory(args.store, args.dim, args.metric, index_config, args.store_config, args.uri),
+            corpus,
+            k=args.k,
+            metric=args.metric,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            measure_memory=not args.no_memory,
+            store_name=args.store,
+            config=config
+        ))
+    if args.output:
+        save_reports(reports, args.output)
+    else:
+        print(json.dumps([report.to_dict() for report in reports], indent=2))
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
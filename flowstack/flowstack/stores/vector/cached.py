@@ -0,0 +1,179 @@
+from collections import OrderedDict
+from dataclasses import dataclass, fields, replace
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Optional, Unpack
+
+import numpy as np
+
+from flowstack.artifacts import Artifact
+from flowstack.stores import VectorStore, VectorStoreQuery, VectorStoreQueryResult
+from flowstack.typing import Embedding, MetadataFilters, Serializable
+
+DEFAULT_CACHE_SIZE = 1024
+
+@dataclass
+class CacheInfo:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    max_size: int
+    generation: int
+
+class CachedVectorStore(VectorStore):
+    """
+    Wraps a store with an LRU cache of query results, optionally expiring entries ttl seconds after they were stored.
+    Entries are keyed on a hash of every query parameter, the query embedding included, and tagged with
+    the generation they were computed in. Writes through the wrapper bump the generation,
+    so entries from before the write are never served again. Writes made directly to the wrapped store are not seen.
+    """
+
+    def __init__(
+        self,
+        store: VectorStore,
+        max_size: int = DEFAULT_CACHE_SIZE,
+        ttl: Optional[float] = None
+    ):
+        self.store = store
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[int, float, VectorStoreQueryResult]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                size=len(self._entries),
+                max_size=self.max_size,
+                generation=self._generation
+            )
+
+    def cache_clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def retrieve(self, **query: Unpack[VectorStoreQuery]) -> VectorStoreQueryResult:
+        key = _cache_key(query)
+        generation = self._generation
+        result = self._get(key)
+        if result is None:
+            result = self.store.retrieve(**query)
+            self._put(key, generation, result)
+        return _copy_result(result)
+
+    def retrieve_many(
+        self,
+        query_embeddings: list[Embedding],
+        **query: Unpack[VectorStoreQuery]
+    ) -> list[VectorStoreQueryResult]:
+        """
+        Only the embeddings that miss the cache are sent to the wrapped store, in one retrieve_many call.
+        """
+        keys = [_cache_key({**query, 'query_embedding': query_embedding}) for query_embedding in query_embeddings]
+        generation = self._generation
+        results = [self._get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if len(missing) > 0:
+            fetched = self.store.retrieve_many([query_embeddings[i] for i in missing], **query)
+            for i, result in zip(missing, fetched):
+                self._put(keys[i], generation, result)
+                results[i] = result
+        return [_copy_result(result) for result in results]
+
+    def insert(self, artifacts: list[Artifact], **kwargs) -> list[str]:
+        try:
+            return self.store.insert(artifacts, **kwargs)
+        finally:
+            self._invalidate()
+
+    def delete(
+        self,
+        artifact_ids: Optional[list[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        **kwargs
+    ) -> None:
+        try:
+            self.store.delete(artifact_ids=artifact_ids, filters=filters, **kwargs)
+        finally:
+            self._invalidate()
+
+    def delete_refs(self, ref_ids: list[str], **kwargs) -> None:
+        try:
+            self.store.delete_refs(ref_ids, **kwargs)
+        finally:
+            self._invalidate()
+
+    def clear(self, **kwargs) -> None:
+        try:
+            self.store.clear(**kwargs)
+        finally:
+            self._invalidate()
+
+    def _get(self, key: str) -> Optional[VectorStoreQueryResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                generation, expires_at, result = entry
+                if generation == self._generation and time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return result
+                del self._entries[key]
+            self._misses += 1
+            return None
+
+    def _put(self, key: str, generation: int, result: VectorStoreQueryResult) -> None:
+        # A result computed while a write was running belongs to an older generation and is dropped.
+        with self._lock:
+            if generation != self._generation or self.max_size <= 0:
+                return
+            expires_at = time.monotonic() + self.ttl if self.ttl is not None else float('inf')
+            self._entries[key] = (generation, expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def _invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+def _cache_key(query: dict[str, Any]) -> str:
+    parts = {key: value for key, value in query.items() if value is not None}
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=_encode).encode('utf-8')).hexdigest()
+
+def _encode(value: Any) -> Any:
+    """
+    JSON form of the query values json cannot encode itself. Arrays are hashed with their dtype and shape,
+    so that a matrix and its flattened bytes or arrays of another dtype never share a key.
+    """
+    if isinstance(value, np.ndarray) and not value.dtype.hasobject:
+        value = np.ascontiguousarray(value)
+        return {'dtype': value.dtype.str, 'shape': value.shape, 'sha256': hashlib.sha256(value.tobytes()).hexdigest()}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, Serializable):
+        return value.model_dump(mode='json')
+    raise ValueError(f'Cannot build a cache key from a query value of type {type(value).__name__}.')
+
+def _copy_result(result: VectorStoreQueryResult) -> VectorStoreQueryResult:
+    return replace(result, **{
+        field.name: list(getattr(result, field.name))
+        for field in fields(result)
+        if isinstance(getattr(result, field.name), list)
+    })
\ No newline at end of file
@@ -0,0 +1,78 @@
+from typing import Any, Optional
+
+import numpy as np
+
+from flowstack.stores.vector.utils import top_k_indices
+
+DEFAULT_RRF_K = 60
+
+def fuse_results(
+    results: list[tuple[np.ndarray, np.ndarray]],
+    k: int,
+    ranker: str = 'RRFRanker',
+    ranker_params: dict[str, Any] = {}
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Merges ranked (rows, scores) lists into one top k list, best first. Ranker names and parameters
+    follow the Milvus hybrid rankers, RRFRanker takes k and WeightedRanker takes one weight per list.
+    """
+    match ranker:
+        case 'RRFRanker':
+            return reciprocal_rank_fusion(results, k, rrf_k=ranker_params.get('k', DEFAULT_RRF_K))
+        case 'WeightedRanker':
+            return weighted_fusion(results, k, weights=ranker_params.get('weights'))
+        case _:
+            raise ValueError(f'Unsupported ranker: {ranker}.')
+
+def reciprocal_rank_fusion(
+    results: list[tuple[np.ndarray, np.ndarray]],
+    k: int,
+    rrf_k: int = DEFAULT_RRF_K
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Scores each row by the sum of 1 / (rrf_k + rank) over the lists it appears in, ranks starting at 1.
+    """
+    return _fuse(
+        results,
+        k,
+        [1 / (rrf_k + np.arange(1, len(rows) + 1, dtype=np.float32)) for rows, _ in results]
+    )
+
+def weighted_fusion(
+    results: list[tuple[np.ndarray, np.ndarray]],
+    k: int,
+    weights: Optional[list[float]] = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Scores each row by the weighted sum of its min-max normalized scores, so lists on different scales,
+    such as BM25 and cosine similarities, contribute comparably.
+    """
+    weights = weights or [1.0] * len(results)
+    if len(weights) != len(results):
+        raise ValueError(f'Got {len(weights)} weights for {len(results)} result lists.')
+    return _fuse(
+        results,
+        k,
+        [weight * _min_max(np.asarray(scores, dtype=np.float32)) for weight, (_, scores) in zip(weights, results)]
+    )
+
+def _fuse(
+    results: list[tuple[np.ndarray, np.ndarray]],
+    k: int,
+    contributions: list[np.ndarray]
+) -> tuple[np.ndarray, np.ndarray]:
+    all_rows = np.concatenate([np.asarray(rows, dtype=np.int64) for rows, _ in results] or [np.empty(0, dtype=np.int64)])
+    if len(all_rows) == 0:
+        return all_rows, np.empty(0, dtype=np.float32)
+    rows, inverse = np.unique(all_rows, return_inverse=True)
+    scores = np.bincount(inverse, weights=np.concatenate(contributions), minlength=len(rows)).astype(np.float32)
+    top = top_k_indices(scores, k)
+    return rows[top], scores[top]
+
+def _min_max(scores: np.ndarray) -> np.ndarray:
+    if len(scores) == 0:
+        return scores
+    low, high = scores.min(), scores.max()
+    if high == low:
+        return np.ones_like(scores)
+    return (scores - low) / (high - low)
\ No newline at end of file
@@ -0,0 +1,782 @@
+from abc import ABC, abstractmethod
+import copy
+import heapq
+import json
+import math
+import os.path
+from typing import Any, Callable, ClassVar, Optional, Self, Type
+
+import fsspec
+import numpy as np
+
+from flowstack.stores.vector.quantization import Quantizer
+from flowstack.stores.vector.utils import SimilarityMetric, centroid_scores, compute_similarities, kmeans, row_norms, top_k_indices
+
+INDEX_CONFIG_FILE = 'index.json'
+INDEX_ARRAYS_FILE = 'index.npz'
+
+SCORES_BUFFER_SIZE = 1 << 24  # similarities held at once by batched exact search
+
+class VectorIndex(ABC):
+    """
+    Search structure over the rows of a store's embedding matrix.
+    The store owns the matrix and passes it in on every call, the index only keeps row numbers.
+    """
+
+    index_type: ClassVar[str]
+
+    def __init__(self, metric: SimilarityMetric = SimilarityMetric.IP, **params):
+        self.metric = SimilarityMetric(metric)
+        self.params = params
+
+    @abstractmethod
+    def add(self, embeddings: np.ndarray, rows: np.ndarray) -> None:
+        """
+        Indexes rows that were appended to or overwritten in embeddings.
+        """
+
+    @abstractmethod
+    def compact(self, embeddings: np.ndarray, kept_rows: np.ndarray) -> None:
+        """
+        Called after the store dropped rows, kept_rows[i] is the old row number of new row i in embeddings.
+        """
+
+    @abstractmethod
+    def search(
+        self,
+        embeddings: np.ndarray,
+        query: np.ndarray,
+        k: int,
+        rows: Optional[np.ndarray] = None,
+        norms: Optional[np.ndarray] = None,
+        quantizer: Optional[Quantizer] = None,
+        rerank_factor: Optional[int] = None,
+        **params
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the rows and similarities of the top k matches, best first.
+        When rows is set, only those rows may be returned. When a trained quantizer is passed,
+        candidates are scored on its codes and only the best k * rerank_factor are read at full precision.
+        """
+
+    @abstractmethod
+    def reset(self) -> None:
+        pass
+
+    def search_many(
+        self,
+        embeddings: np.ndarray,
+        queries: np.ndarray,
+        k: int,
+        rows: Optional[np.ndarray] = None,
+        norms: Optional[np.ndarray] = None,
+        quantizer: Optional[Quantizer] = None,
+        rerank_factor: Optional[int] = None,
+        **params
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        """
+        Searches every row of a (num_queries, dim) matrix, returning one (rows, similarities) pair per query.
+        """
+        return [
+            self.search(
+                embeddings,
+                query,
+                k,
+                rows=rows,
+                norms=norms,
+                quantizer=quantizer,
+                rerank_factor=rerank_factor,
+                **params
+            )
+            for query in queries
+        ]
+
+    def search_cost(self, size: int, k: int, **params) -> tuple[float, dict[str, Any]]:
+        """
+        Estimates how many rows a search scores to return k results out of size rows,
+        along with the search parameters that make it return them.
+        """
+        return size, {}
+
+    def exact_search_many(
+        self,
+        embeddings: np.ndarray,
+        queries: np.ndarray,
+        k: int,
+        rows: Optional[np.ndarray] = None,
+        norms: Optional[np.ndarray] = None,
+        quantizer: Optional[Quantizer] = None,
+        rerank_factor: Optional[int] = None
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        """
+        Brute-force search over rows, or over every row when rows is None, bypassing the index structure.
+        """
+        if quantizer is not None and quantizer.is_trained:
+            return [
+                self._exact_search(embeddings, query, k, rows, norms, quantizer, rerank_factor)
+                for query in queries
+            ]
+        return self._exact_search_many(embeddings, queries, k, rows, norms)
+
+    def build(self, embeddings: np.ndarray) -> None:
+        self.reset()
+        if len(embeddings) > 0:
+            self.add(embeddings, np.arange(len(embeddings)))
+
+    def copy(self) -> Self:
+        return copy.deepcopy(self)
+
+    def save(self, path: str, fs: fsspec.AbstractFileSystem) -> None:
+        with fs.open(os.path.join(path, INDEX_CONFIG_FILE), 'w') as f:
+            json.dump({'index_type': self.index_type, 'metric': self.metric.value, **self.params}, f)
+        with fs.open(os.path.join(path, INDEX_ARRAYS_FILE), 'wb') as f:
+            np.savez(f, **self._to_arrays())
+
+    def _to_arrays(self) -> dict[str, np.ndarray]:
+        return {}
+
+    def _from_arrays(self, arrays: dict[str, np.ndarray]) -> None:
+        pass
+
+    def _exact_search(
+        self,
+        embeddings: np.ndarray,
+        query: np.ndarray,
+        k: int,
+        rows: Optional[np.ndarray],
+        norms: Optional[np.ndarray],
+        quantizer: Optional[Quantizer] = None,
+        rerank_factor: Optional[int] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if quantizer is not None:
+            result = quantizer.search(embeddings, query, k, self.metric, rows=rows, rerank_factor=rerank_factor)
+            if result is not None:
+                return result
+        if rows is None:
+            scores = compute_similarities(embeddings, query, metric=self.metric, norms=norms)
+            top = top_k_indices(scores, k)
+            return top, scores[top]
+        scores = compute_similarities(
+            embeddings[rows],
+            query,
+            metric=self.metric,
+            norms=norms[rows] if norms is not None else None
+        )
+        top = top_k_indices(scores, k)
+        return rows[top], scores[top]
+
+    def _exact_search_many(
+        self,
+        embeddings: np.ndarray,
+        queries: np.ndarray,
+        k: int,
+        rows: Optional[np.ndarray],
+        norms: Optional[np.ndarray]
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        matrix = embeddings if rows is None else embeddings[rows]
+        if norms is not None and rows is not None:
+            norms = norms[rows]
+        # Queries are scored in batches with one matrix product each, bounding the size of the score matrix.
+        batch_size = max(SCORES_BUFFER_SIZE // max(len(matrix), 1), 1)
+        results: list[tuple[np.ndarray, np.ndarray]] = []
+        for start in range(0, len(queries), batch_size):
+            scores = compute_similarities(matrix, queries[start:start + batch_size], metric=self.metric, norms=norms)
+            top = top_k_indices(scores, k)
+            top_scores = np.take_along_axis(scores, top, axis=-1)
+            if rows is not None:
+                top = rows[top]
+            results.extend(zip(top, top_scores))
+        return results
+
+class FlatIndex(VectorIndex):
+    """
+    Exact brute-force search, every row is scored on every query.
+    """
+
+    index_type = 'FLAT'
+
+    def add(self, embeddings: np.ndarray, rows: np.ndarray) -> None:
+        pass
+
+    def compact(self, embeddings: np.ndarray, kept_rows: np.ndarray) -> None:
+        pass
+
+    def search(
+        self,
+        embeddings: np.ndarray,
+        query: np.ndarray,
+        k: int,
+        rows: Optional[np.ndarray] = None,
+        norms: Optional[np.ndarray] = None,
+        quantizer: Optional[Quantizer] = None,
+        rerank_factor: Optional[int] = None,
+        **params
+    ) -> tuple[np.ndarray, np.ndarray]:
+        return self._exact_search(embeddings, query, k, rows, norms, quantizer, rerank_factor)
+
+    def search_many(
+        self,
+        embeddings: np.ndarray,
+        queries: np.ndarray,
+        k: int,
+        rows: Optional[np.ndarray] = None,
+        norms: Optional[np.ndarray] = None,
+        quantizer: Optional[Quantizer] = None,
+        rerank_factor: Optional[int] = None,
+        **params
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        return self.exact_search_many(embeddings, queries, k, rows, norms, quantizer, rerank_factor)
+
+    def reset(self) -> None:
+        pass
+
+class IVFFlatIndex(VectorIndex):
+    """
+    Inverted file index. A k-means coarse quantizer splits the rows into nlist lists,
+    queries only score the rows of the nprobe lists whose centroids are closest.
+    Until enough rows exist to train the quantizer, queries fall back to exact search.
+    """
+
+    index_type = 'IVF_FLAT'
+
+    MIN_POINTS_PER_LIST: ClassVar[int] = 39
+    MAX_POINTS_PER_LIST: ClassVar[int] = 256
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    def __init__(
+        self,
+        metric: SimilarityMetric = SimilarityMetric.IP,
+        nlist: int = 128,
+        nprobe: int = 8,
+        niter: int = 20,
+        seed: int = 0,
+        **params
+    ):
+        super().__init__(metric, nlist=nlist, nprobe=nprobe, niter=niter, seed=seed, **params)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.niter = niter
+        self.seed = seed
+        self.reset()
+
+    def reset(self) -> None:
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments: np.ndarray = np.empty(0, dtype=np.int32)
+        self._lists: list[np.ndarray] = []
+
+    def train(self, embeddings: np.ndarray) -> None:
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(embeddings), self.nlist * self.MAX_POINTS_PER_LIST)
+        sample = embeddings[np.sort(rng.choice(len(embeddings), sample_size, replace=False))]
+        self._centroids = kmeans(sample, self.nlist, metric=self.metric, niter=self.niter, seed=self.seed)
+
+    def build(self, embeddings: np.ndarray) -> None:
+        self.reset()
+        if len(embeddings) >= self.nlist * self.MIN_POINTS_PER_LIST:
+            self.train(embeddings)
+        self.add(embeddings, np.arange(len(embeddings)))
+
+    def add(self, embeddings: np.ndarray, rows: np.ndarray) -> None:
+        size = len(embeddings)
+        if len(self._assignments) < size:
+            self._assignments = np.concatenate([
+                self._assignments,
+                np.full(size - len(self._assignments), -1, dtype=np.int32)
+            ])
+
+        if not self.is_trained:
+            if size >= self.nlist * self.MIN_POINTS_PER_LIST:
+                self.train(embeddings)
+                self._assign(embeddings, np.arange(size))
+            return
+
+        rows = np.unique(rows)
+        overwritten = rows[self._assignments[rows] >= 0]
+        if len(overwritten) > 0:
+            for list_id in np.unique(self._assignments[overwritten]):
+                self._lists[list_id] = np.setdiff1d(self._lists[list_id], overwritten, assume_unique=True)
+        self._assign(embeddings, rows)
+
+    def compact(self, embeddings: np.ndarray, kept_rows: np.ndarray) -> None:
+        mapping = np.full(len(self._assignments), -1, dtype=np.int64)
+        mapping[kept_rows] = np.arange(len(kept_rows))
+        self._assignments = self._assignments[kept_rows]
+        for list_id, rows in enumerate(self._lists):
+            rows = mapping[rows]
+            self._lists[list_id] = rows[rows >= 0]
+
+    def search(
+        self,
+        embeddings: np.ndarray,
+        query: np.ndarray,
+        k: int,
+        rows: Optional[np.ndarray] = None,
+        norms: Optional[np.ndarray] = None,
+        quantizer: Optional[Quantizer] = None,
+        rerank_factor: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        **params
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if not self.is_trained:
+            return self._exact_search(embeddings, query, k, rows, norms, quantizer, rerank_factor)
+
+        nprobe = nprobe or self.nprobe
+        query_scores = centroid_scores(query.reshape(1, -1), self._centroids, self.metric)[0]
+        probes = top_k_indices(query_scores, nprobe)
+        candidates = np.concatenate([self._lists[list_id] for list_id in probes])
+        if rows is not None:
+            allowed = np.zeros(len(embeddings), dtype=bool)
+            allowed[rows] = True
+            candidates = candidates[allowed[candidates]]
+        candidates.sort()
+        return self._exact_search(embeddings, query, k, candidates, norms, quantizer, rerank_factor)
+
+    def search_cost(self, size: int, k: int, nprobe: Optional[int] = None, **params) -> tuple[float, dict[str, Any]]:
+        if not self.is_trained:
+            return size, {}
+        # Probe enough lists to hold k rows on average, then score their rows plus the centroids.
+        nlist = len(self._centroids)
+        list_size = size / nlist
+        nprobe = min(max(nprobe or self.nprobe, math.ceil(k / max(list_size, 1))), nlist)
+        return nlist + nprobe * list_size, {'nprobe': nprobe}
+
+    def _assign(self, embeddings: np.ndarray, rows: np.ndarray) -> None:
+        if len(self._lists) == 0:
+            self._lists = [np.empty(0, dtype=np.int64) for _ in range(len(self._centroids))]
+        vectors = np.asarray(embeddings[rows], dtype=np.float32)
+        labels = np.argmax(centroid_scores(vectors, self._centroids, self.metric), axis=1)
+        self._assignments[rows] = labels
+        for list_id in np.unique(labels):
+            self._lists[list_id] = np.concatenate([self._lists[list_id], rows[labels == list_id]])
+
+    def _to_arrays(self) -> dict[str, np.ndarray]:
+        if not self.is_trained:
+            return {}
+        return {'centroids': self._centroids, 'assignments': self._assignments}
+
+    def _from_arrays(self, arrays: dict[str, np.ndarray]) -> None:
+        if 'centroids' not in arrays:
+            return
+        self._centroids = arrays['centroids']
+        self._assignments = arrays['assignments']
+        order = np.argsort(self._assignments, kind='stable')
+        counts = np.bincount(self._assignments[self._assignments >= 0], minlength=len(self._centroids))
+        offsets = np.concatenate([[0], np.cumsum(counts)]) + np.count_nonzero(self._assignments < 0)
+        self._lists = [order[offsets[i]:offsets[i + 1]].astype(np.int64) for i in range(len(self._centroids))]
+
+class HNSWIndex(VectorIndex):
+    """
+    Hierarchical navigable small world graph. Rows are inserted incrementally,
+    ef trades recall for latency per query.
+
+    Graph nodes have ids of their own, mapped to rows, so that deleting or overwriting rows only touches their nodes:
+    a removed node leaves the graph, and its neighbors that linked back to it are relinked through its neighborhood.
+    Other links to a removed node are followed through to its own links, which are kept until removed nodes pass
+    MAX_REMOVED_FRACTION of the graph. The graph is then renumbered without them and the nodes still linking to one
+    are relinked the same way, so deletes cost amortized O(M^2) per row instead of a rebuild.
+
+    With a trained quantizer, queries traverse the graph on its codes with ef of at least k * rerank_factor
+    and only re-rank the best of those at full precision, as exact search does. Inserts still read full vectors.
+    """
+
+    index_type = 'HNSW'
+
+    MAX_REMOVED_FRACTION: ClassVar[float] = 0.25
+
+    def __init__(
+        self,
+        metric: SimilarityMetric = SimilarityMetric.IP,
+        M: int = 16,
+        efConstruction: int = 100,
+        ef: int = 64,
+        seed: int = 0,
+        **params
+    ):
+        super().__init__(metric, M=M, efConstruction=efConstruction, ef=ef, seed=seed, **params)
+        self.M = M
+        self.ef_construction = efConstruction
+        self.ef = ef
+        self.seed = seed
+        self._level_mult = 1 / math.log(M)
+        self.reset()
+
+    def reset(self) -> None:
+        self._rng = np.random.default_rng(self.seed)
+        # Per node, with spare capacity past _num_nodes. A removed node has row -1.
+        self._levels: np.ndarray = np.empty(0, dtype=np.int8)
+        self._node_rows: np.ndarray = np.empty(0, dtype=np.int64)
+        self._num_nodes = 0
+        # Per row, -1 for rows without a node.
+        self._row_nodes: np.ndarray = np.empty(0, dtype=np.int64)
+        # Links of removed nodes per level, until the next purge.
+        self._removed: dict[int, list[list[int]]] = {}
+        self._layers: list[dict[int, list[int]]] = []
+        self._entry_point: Optional[int] = None
+
+    def add(self, embeddings: np.ndarray, rows: np.ndarray) -> None:
+        size = len(embeddings)
+        if len(self._row_nodes) < size:
+            self._row_nodes = np.concatenate([
+                self._row_nodes,
+                np.full(size - len(self._row_nodes), -1, dtype=np.int64)
+            ])
+        rows = np.unique(rows)
+        overwritten = self._row_nodes[rows]
+        overwritten = overwritten[overwritten >= 0]
+        self._node_rows[overwritten] = -1
+        self._remove(embeddings, overwritten.tolist())
+        for row in rows.tolist():
+            self._insert(embeddings, row)
+        self._maybe_purge(embeddings)
+
+    def compact(self, embeddings: np.ndarray, kept_rows: np.ndarray) -> None:
+        nodes = self._node_rows[:self._num_nodes]
+        live = nodes >= 0
+        self._row_nodes = self._row_nodes[kept_rows]
+        nodes[live] = -1
+        kept = self._row_nodes >= 0
+        nodes[self._row_nodes[kept]] = np.flatnonzero(kept)
+        self._remove(embeddings, np.flatnonzero(live & (nodes < 0)).tolist())
+        self._maybe_purge(embeddings)
+
+    def search(
+        self,
+        embeddings: np.ndarray,
+        query: np.ndarray,
+        k: int,
+        rows: Optional[np.ndarray] = None,
+        norms: Optional[np.ndarray] = None,
+        quantizer: Optional[Quantizer] = None,
+        rerank_factor: Optional[int] = None,
+        ef: Optional[int] = None,
+        **params
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if self._entry_point is None:
+            return self._exact_search(embeddings, query, k, rows, norms, quantizer, rerank_factor)
+
+        ef = max(ef or self.ef, k)
+        query = query.reshape(-1)
+        quantized = quantizer is not None and quantizer.is_trained
+        if quantized:
+            num_candidates = k * (rerank_factor or quantizer.rerank_factor)
+            ef = max(ef, num_candidates)
+            score = self._quantized_scorer(quantizer, query)
+        else:
+            score = self._scorer(embeddings, query)
+        entry_points = [self._entry_point]
+        for level in range(len(self._layers) - 1, 0, -1):
+            entry_points = [node for _, node in self._search_layer(score, entry_points, 1, level)]
+        found = self._search_layer(score, entry_points, ef, 0)
+        found_rows = self._node_rows[np.array([node for _, node in found], dtype=np.int64)]
+        found_scores = np.array([score for score, _ in found], dtype=np.float32)
+
+        if rows is not None:
+            allowed = np.zeros(len(embeddings), dtype=bool)
+            allowed[rows] = True
+            keep = allowed[found_rows]
+            found_rows, found_scores = found_rows[keep], found_scores[keep]
+            # Post-filtering left too few results, so the filter is selective enough to search exactly.
+            if len(found_rows) < min(k, len(rows)):
+                return self._exact_search(embeddings, query, k, rows, norms, quantizer, rerank_factor)
+
+        if quantized:
+            return quantizer.rerank(embeddings, found_rows[:num_candidates], query, k, self.metric)
+        return found_rows[:k], found_scores[:k]
+
+    def search_cost(self, size: int, k: int, ef: Optional[int] = None, **params) -> tuple[float, dict[str, Any]]:
+        if self._entry_point is None:
+            return size, {}
+        # The bottom layer expands about ef nodes with up to 2 * M neighbors each, upper layers one node per level.
+        ef = max(ef or self.ef, k)
+        return min(ef * self._max_neighbors(0) + len(self._layers) * self.M, size), {'ef': ef}
+
+    def _insert(self, embeddings: np.ndarray, row: int) -> None:
+        node = self._new_node(row)
+        level = int(-math.log(1 - self._rng.random()) * self._level_mult)
+        self._levels[node] = level
+        while len(self._layers) <= level:
+            self._layers.append({})
+        if self._entry_point is None:
+            for layer in self._layers[:level + 1]:
+                layer[node] = []
+            self._entry_point = node
+            return
+
+        score = self._scorer(embeddings, np.asarray(embeddings[row], dtype=np.float32))
+        top_level = int(self._levels[self._entry_point])
+        entry_points = [self._entry_point]
+        for current in range(top_level, level, -1):
+            entry_points = [node for _, node in self._search_layer(score, entry_points, 1, current)]
+
+        for current in range(min(level, top_level), -1, -1):
+            found = self._search_layer(score, entry_points, self.ef_construction, current)
+            max_neighbors = self._max_neighbors(current)
+            neighbors = self._select_neighbors(embeddings, [neighbor for _, neighbor in found], node, max_neighbors)
+            layer = self._layers[current]
+            layer[node] = neighbors
+            for neighbor in neighbors:
+                links = layer[neighbor]
+                links.append(node)
+                if len(links) > max_neighbors:
+                    layer[neighbor] = self._select_neighbors(embeddings, links, neighbor, max_neighbors)
+            entry_points = [neighbor for _, neighbor in found]
+
+        for current in range(top_level + 1, level + 1):
+            self._layers[current][node] = []
+        if level > top_level:
+            self._entry_point = node
+
+    def _new_node(self, row: int) -> int:
+        node = self._num_nodes
+        if node == len(self._levels):
+            capacity = max(2 * node, 16)
+            self._levels = np.concatenate([self._levels, np.full(capacity - node, -1, dtype=np.int8)])
+            self._node_rows = np.concatenate([self._node_rows, np.full(capacity - node, -1, dtype=np.int64)])
+        self._node_rows[node] = row
+        self._row_nodes[row] = node
+        self._num_nodes += 1
+        return node
+
+    def _remove(self, embeddings: np.ndarray, nodes: list[int]) -> None:
+        """
+        Takes nodes, whose rows are already unmapped, out of the graph. Every neighbor that linked to a removed node
+        picks its new links among its remaining ones and the removed node's, with the usual diversity heuristic.
+        """
+        if len(nodes) == 0:
+            return
+        for node in nodes:
+            self._removed[node] = [layer.pop(node, []) for layer in self._layers[:int(self._levels[node]) + 1]]
+        for node in nodes:
+            for level, links in enumerate(self._removed[node]):
+                for neighbor in self._live_links(links, level):
+                    self._relink(embeddings, neighbor, level)
+
+        if self._entry_point in self._removed:
+            while len(self._layers) > 0 and len(self._layers[-1]) == 0:
+                self._layers.pop()
+            self._entry_point = next(iter(self._layers[-1])) if len(self._layers) > 0 else None
+
+    def _maybe_purge(self, embeddings: np.ndarray) -> None:
+        if len(self._removed) > self.MAX_REMOVED_FRACTION * max(self._num_nodes - len(self._removed), 1):
+            self._purge(embeddings)
+
+    def _purge(self, embeddings: Optional[np.ndarray] = None) -> None:
+        """
+        Relinks the nodes that still link to removed nodes, then renumbers the nodes to their rows.
+        Without embeddings, links are not reselected and the first ones are kept.
+        """
+        for level, layer in enumerate(self._layers):
+            for node, links in layer.items():
+                if any(neighbor in self._removed for neighbor in links):
+                    self._relink(embeddings, node, level)
+
+        mapping = self._node_rows[:self._num_nodes].tolist()
+        self._layers = [
+            {
+                mapping[node]: [mapping[neighbor] for neighbor in neighbors if mapping[neighbor] >= 0]
+                for node, neighbors in layer.items()
+            }
+            for layer in self._layers
+        ]
+        if self._entry_point is not None:
+            self._entry_point = mapping[self._entry_point]
+
+        live = np.flatnonzero(self._node_rows[:self._num_nodes] >= 0)
+        rows = self._node_rows[live]
+        levels = np.full(len(self._row_nodes), -1, dtype=np.int8)
+        levels[rows] = self._levels[live]
+        self._levels = levels
+        self._num_nodes = len(self._row_nodes)
+        self._node_rows = np.where(levels >= 0, np.arange(self._num_nodes), -1)
+        self._row_nodes = self._node_rows.copy()
+        self._removed = {}
+
+    def _live_links(self, links: list[int], level: int) -> list[int]:
+        """
+        Links with every removed node replaced by its own live links at level.
+        """
+        live: dict[int, None] = {}
+        for neighbor in links:
+            removed_links = self._removed.get(neighbor)
+            if removed_links is None:
+                live[neighbor] = None
+            elif level < len(removed_links):
+                live.update((link, None) for link in removed_links[level] if link not in self._removed)
+        return list(live)
+
+    def _relink(self, embeddings: Optional[np.ndarray], node: int, level: int) -> None:
+        """
+        Reselects the links of node among its live links and the links of its removed neighbors,
+        and links the selected neighbors back to it as an insert would, so that node stays reachable.
+        """
+        layer = self._layers[level]
+        candidates = [neighbor for neighbor in self._live_links(layer[node], level) if neighbor != node]
+        max_neighbors = self._max_neighbors(level)
+        if embeddings is None:
+            layer[node] = candidates[:max_neighbors]
+            return
+        layer[node] = self._select_neighbors(embeddings, candidates, node, max_neighbors)
+        for neighbor in layer[node]:
+            links = layer[neighbor]
+            if node in links:
+                continue
+            links.append(node)
+            if len(links) > max_neighbors:
+                layer[neighbor] = self._select_neighbors(embeddings, links, neighbor, max_neighbors)
+
+    def _select_neighbors(
+        self,
+        embeddings: np.ndarray,
+        candidates: list[int],
+        node: int,
+        max_neighbors: int
+    ) -> list[int]:
+        """
+        Diversity heuristic from the HNSW paper: a candidate is only linked if it is closer to node
+        than to every neighbor already selected, which keeps long-range links between clusters.
+        """
+        if len(candidates) <= max_neighbors:
+            return list(candidates)
+        vectors = np.asarray(embeddings[self._node_rows[np.asarray(candidates)]], dtype=np.float32)
+        query = np.asarray(embeddings[self._node_rows[node]], dtype=np.float32)
+        scores = compute_similarities(vectors, query, metric=self.metric)
+        order = np.argsort(-scores, kind='stable')
+        pairwise = _pairwise_scores(vectors, self.metric)
+
+        selected: list[int] = []
+        for i in order.tolist():
+            if len(selected) == max_neighbors:
+                break
+            if len(selected) == 0 or scores[i] > pairwise[i, selected].max():
+                selected.append(i)
+        return [candidates[i] for i in selected]
+
+    def _search_layer(
+        self,
+        score: Callable[[np.ndarray], np.ndarray],
+        entry_points: list[int],
+        ef: int,
+        level: int
+    ) -> list[tuple[float, int]]:
+        """
+        Best-first search of one layer, scoring nodes with score. Returns up to ef (score, node) pairs, best first.
+        """
+        layer = self._layers[level]
+        visited = set(entry_points)
+        scores = score(np.asarray(entry_points)).tolist()
+        candidates = [(-node_score, node) for node_score, node in zip(scores, entry_points)]
+        results = [(node_score, node) for node_score, node in zip(scores, entry_points)]
+        heapq.heapify(candidates)
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            negative_score, node = heapq.heappop(candidates)
+            if len(results) >= ef and -negative_score < results[0][0]:
+                break
+            links = layer.get(node, [])
+            if len(self._removed) > 0:
+                links = self._live_links(links, level)
+            neighbors = [neighbor for neighbor in links if neighbor not in visited]
+            if len(neighbors) == 0:
+                continue
+            visited.update(neighbors)
+            neighbor_scores = score(np.asarray(neighbors)).tolist()
+            for neighbor_score, neighbor in zip(neighbor_scores, neighbors):
+                if len(results) < ef or neighbor_score > results[0][0]:
+                    heapq.heappush(candidates, (-neighbor_score, neighbor))
+                    heapq.heappush(results, (neighbor_score, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+
+        return sorted(results, reverse=True)
+
+    def _scorer(self, embeddings: np.ndarray, query: np.ndarray) -> Callable[[np.ndarray], np.ndarray]:
+        def score(nodes: np.ndarray) -> np.ndarray:
+            vectors = np.asarray(embeddings[self._node_rows[nodes]], dtype=np.float32)
+            return compute_similarities(vectors, query, metric=self.metric)
+
+        return score
+
+    def _quantized_scorer(self, quantizer: Quantizer, query: np.ndarray) -> Callable[[np.ndarray], np.ndarray]:
+        def score(nodes: np.ndarray) -> np.ndarray:
+            return quantizer.scores(query, self.metric, rows=self._node_rows[nodes])
+
+        return score
+
+    def _max_neighbors(self, level: int) -> int:
+        return 2 * self.M if level == 0 else self.M
+
+    def _to_arrays(self) -> dict[str, np.ndarray]:
+        # Saved graphs are numbered by row.
+        self._purge()
+        arrays = {'levels': self._levels}
+        for level, layer in enumerate(self._layers):
+            nodes = np.fromiter(layer.keys(), dtype=np.int64, count=len(layer))
+            arrays[f'nodes_{level}'] = nodes
+            arrays[f'offsets_{level}'] = np.concatenate([[0], np.cumsum([len(layer[node]) for node in nodes.tolist()])])
+            arrays[f'neighbors_{level}'] = np.fromiter(
+                (neighbor for node in nodes.tolist() for neighbor in layer[node]),
+                dtype=np.int64
+            )
+        if self._entry_point is not None:
+            arrays['entry_point'] = np.array([self._entry_point])
+        return arrays
+
+    def _from_arrays(self, arrays: dict[str, np.ndarray]) -> None:
+        self._levels = arrays['levels']
+        self._num_nodes = len(self._levels)
+        self._node_rows = np.where(self._levels >= 0, np.arange(self._num_nodes), -1)
+        self._row_nodes = self._node_rows.copy()
+        self._removed = {}
+        self._layers = []
+        level = 0
+        while f'nodes_{level}' in arrays:
+            nodes = arrays[f'nodes_{level}'].tolist()
+            offsets = arrays[f'offsets_{level}'].tolist()
+            neighbors = arrays[f'neighbors_{level}'].tolist()
+            self._layers.append({
+                node: neighbors[offsets[i]:offsets[i + 1]]
+                for i, node in enumerate(nodes)
+            })
+            level += 1
+        self._entry_point = int(arrays['entry_point'][0]) if 'entry_point' in arrays else None
+
+INDEX_TYPES: dict[str, Type[VectorIndex]] = {
+    index_type.index_type: index_type
+    for index_type in [FlatIndex, IVFFlatIndex, HNSWIndex]
+}
+
+def create_index(index_config: dict[str, Any], metric: SimilarityMetric = SimilarityMetric.IP) -> VectorIndex:
+    params = dict(index_config)
+    index_type = params.pop('index_type', FlatIndex.index_type)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f'Unsupported index type: {index_type}.')
+    return INDEX_TYPES[index_type](metric=metric, **params)
+
+def load_index(path: str, fs: fsspec.AbstractFileSystem) -> Optional[VectorIndex]:
+    config_path = os.path.join(path, INDEX_CONFIG_FILE)
+    if not fs.exists(config_path):
+        return None
+    with fs.open(config_path, 'r') as f:
+        index_config = json.load(f)
+    metric = index_config.pop('metric')
+    index = create_index(index_config, metric=metric)
+    with fs.open(os.path.join(path, INDEX_ARRAYS_FILE), 'rb') as f:
+        with np.load(f, allow_pickle=False) as arrays:
+            index._from_arrays({key: arrays[key] for key in arrays.files})
+    return index
+
+def _pairwise_scores(vectors: np.ndarray, metric: SimilarityMetric) -> np.ndarray:
+    scores = vectors @ vectors.T
+    if metric == SimilarityMetric.IP:
+        return scores
+    norms = row_norms(vectors)
+    if metric == SimilarityMetric.COSINE:
+        return scores / np.maximum(np.outer(norms, norms), 1e-12)
+    squared = norms * norms
+    return -np.sqrt(np.maximum(squared[:, None] + squared[None, :] - 2 * scores, 0))
\ No newline at end of file
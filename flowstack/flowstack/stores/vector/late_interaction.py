@@ -0,0 +1,353 @@
+import copy
+import json
+import os.path
+from typing import Callable, ClassVar, Optional, Self
+
+import fsspec
+import numpy as np
+
+from flowstack.stores.vector.utils import SimilarityMetric, as_matrix, centroid_scores, kmeans, normalize, top_k_indices
+
+LATE_INTERACTION_CONFIG_FILE = 'late_interaction.json'
+LATE_INTERACTION_ARRAYS_FILE = 'late_interaction.npz'
+
+DEFAULT_RERANK_FACTOR = 8
+CHUNK_SIZE = 65_536  # token vectors scored at a time
+
+class LateInteractionIndex:
+    """
+    Token-level index for ColBERT-style late interaction. Each row of the store owns a matrix of token vectors,
+    and a query matrix scores a row by MaxSim, the sum over query tokens of their best inner product with the row's tokens.
+
+    Once num_centroids * MIN_POINTS_PER_CENTROID tokens exist, k-means centroids are trained and every token is kept
+    as the id of its nearest centroid plus an 8-bit residual, as in ColBERTv2. Queries then gather the rows
+    with a token in the nprobe centroids nearest to each query token, rank them by MaxSim over the centroids alone,
+    and re-rank the best k * rerank_factor rows by MaxSim over the decompressed tokens.
+    Before that, tokens are stored uncompressed and every row is scored exactly.
+    COSINE normalizes token vectors, so MaxSim sums cosine similarities.
+    """
+
+    MIN_POINTS_PER_CENTROID: ClassVar[int] = 39
+    MAX_POINTS_PER_CENTROID: ClassVar[int] = 256
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    @property
+    def num_tokens(self) -> int:
+        return len(self._token_rows)
+
+    @property
+    def nbytes(self) -> int:
+        if not self.is_trained:
+            return self._token_rows.nbytes + self._vectors.nbytes
+        return self._token_rows.nbytes + self._labels.nbytes + self._codes.nbytes + self._centroids.nbytes
+
+    def __init__(
+        self,
+        metric: SimilarityMetric = SimilarityMetric.COSINE,
+        num_centroids: int = 256,
+        nprobe: int = 2,
+        rerank_factor: int = DEFAULT_RERANK_FACTOR,
+        niter: int = 20,
+        seed: int = 0
+    ):
+        self.metric = SimilarityMetric(metric)
+        if self.metric == SimilarityMetric.L2:
+            raise ValueError('Late interaction supports the IP and COSINE metrics.')
+        self.num_centroids = num_centroids
+        self.nprobe = nprobe
+        self.rerank_factor = rerank_factor
+        self.niter = niter
+        self.seed = seed
+        self.reset()
+
+    def reset(self) -> None:
+        self._dim: Optional[int] = None
+        self._indexed: np.ndarray = np.empty(0, dtype=bool)
+        self._token_rows: np.ndarray = np.empty(0, dtype=np.int64)
+        self._vectors: np.ndarray = np.empty((0, 0), dtype=np.float32)
+        self._centroids: Optional[np.ndarray] = None
+        self._labels: np.ndarray = np.empty(0, dtype=np.int32)
+        self._codes: np.ndarray = np.empty((0, 0), dtype=np.uint8)
+        self._offset: Optional[np.ndarray] = None
+        self._scale: Optional[np.ndarray] = None
+        self._row_indptr: Optional[np.ndarray] = None
+        self._centroid_indptr: Optional[np.ndarray] = None
+        self._centroid_rows: Optional[np.ndarray] = None
+
+    def add(self, rows: np.ndarray, token_embeddings: list[Optional[np.ndarray]]) -> None:
+        """
+        Indexes the token vectors of rows, replacing what was indexed for them before.
+        A matrix of None leaves the row unindexed.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        self.remove(rows)
+        size = int(rows.max()) + 1 if len(rows) > 0 else 0
+        if size > len(self._indexed):
+            self._indexed = np.concatenate([self._indexed, np.zeros(size - len(self._indexed), dtype=bool)])
+
+        # A row given twice keeps its last matrix.
+        matrices = [
+            (row, as_matrix(tokens))
+            for row, tokens in dict(zip(rows.tolist(), token_embeddings)).items()
+            if tokens is not None and len(tokens) > 0
+        ]
+        if len(matrices) == 0:
+            return
+        self._append(
+            np.repeat([row for row, _ in matrices], [len(matrix) for _, matrix in matrices]),
+            np.concatenate([matrix for _, matrix in matrices])
+        )
+
+    def extend(self, other: 'LateInteractionIndex', offset: int) -> None:
+        """
+        Appends the tokens of other with its rows shifted by offset, which must be past every row indexed here.
+        Tokens that other compressed against its own centroids are decoded and re-encoded against these.
+        """
+        if offset < len(self._indexed):
+            raise ValueError(f'Cannot extend at row {offset}, rows up to {len(self._indexed)} are taken.')
+        size = offset + len(other._indexed)
+        self._indexed = np.concatenate([self._indexed, np.zeros(size - len(self._indexed), dtype=bool)])
+        if other.num_tokens > 0:
+            self._append(other._token_rows + offset, other._decode(np.arange(other.num_tokens)))
+
+    def remove(self, rows: np.ndarray) -> None:
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = rows[rows < len(self._indexed)]
+        if len(rows) == 0 or not self._indexed[rows].any():
+            return
+        removed = np.zeros(len(self._indexed), dtype=bool)
+        removed[rows] = True
+        self._take(~removed[self._token_rows])
+        self._indexed[rows] = False
+
+    def compact(self, kept_rows: np.ndarray) -> None:
+        """
+        Called after the store dropped rows, kept_rows[i] is the old row number of new row i.
+        """
+        mapping = np.full(len(self._indexed), -1, dtype=np.int64)
+        kept_rows = kept_rows[kept_rows < len(self._indexed)]
+        mapping[kept_rows] = np.arange(len(kept_rows))
+        token_rows = mapping[self._token_rows]
+        keep = token_rows >= 0
+        self._take(keep)
+        self._token_rows = token_rows[keep]
+        self._indexed = self._indexed[kept_rows]
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        rows: Optional[np.ndarray] = None,
+        nprobe: Optional[int] = None,
+        rerank_factor: Optional[int] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the rows and MaxSim scores of the top k indexed rows for a matrix of query token vectors, best first.
+        """
+        query = as_matrix(query)
+        if self._dim is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if query.shape[1] != self._dim:
+            raise ValueError(f'Query token embeddings have dimension {query.shape[1]}, expected {self._dim}.')
+        if self.metric == SimilarityMetric.COSINE:
+            query = normalize(query)
+
+        self._postings()
+        if not self.is_trained:
+            candidates = np.flatnonzero(self._indexed)
+            if rows is not None:
+                candidates = np.intersect1d(candidates, rows)
+            scores = self._maxsim(candidates, lambda tokens: self._vectors[tokens] @ query.T)
+            top = top_k_indices(scores, k)
+            return candidates[top], scores[top]
+
+        # Centroid scores of every query token, shared by candidate generation and both scoring passes.
+        query_centroid_scores = np.ascontiguousarray((self._centroids @ query.T).T)
+        probes = np.unique(top_k_indices(query_centroid_scores, nprobe or self.nprobe))
+        candidates = np.unique(np.concatenate([
+            self._centroid_rows[self._centroid_indptr[probe]:self._centroid_indptr[probe + 1]]
+            for probe in probes.tolist()
+        ]))
+        if rows is not None:
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+
+        num_reranked = k * (rerank_factor or self.rerank_factor)
+        if len(candidates) > num_reranked:
+            approximate = self._maxsim(candidates, lambda tokens: query_centroid_scores[:, self._labels[tokens]].T)
+            candidates = np.sort(candidates[top_k_indices(approximate, num_reranked)])
+
+        # With x ~ centroid + offset + scale * code, x . q ~ centroid . q + offset . q + code . (scale * q).
+        offset_scores = self._offset @ query.T
+        scaled_query = (query * self._scale).T
+        scores = self._maxsim(
+            candidates,
+            lambda tokens: (
+                query_centroid_scores[:, self._labels[tokens]].T
+                + offset_scores
+                + self._codes[tokens].astype(np.float32) @ scaled_query
+            )
+        )
+        top = top_k_indices(scores, k)
+        return candidates[top], scores[top]
+
+    def copy(self) -> Self:
+        return copy.deepcopy(self)
+
+    def save(self, path: str, fs: fsspec.AbstractFileSystem) -> None:
+        with fs.open(os.path.join(path, LATE_INTERACTION_CONFIG_FILE), 'w') as f:
+            json.dump(
+                {
+                    'metric': self.metric,
+                    'num_centroids': self.num_centroids,
+                    'nprobe': self.nprobe,
+                    'rerank_factor': self.rerank_factor,
+                    'niter': self.niter,
+                    'seed': self.seed
+                },
+                f
+            )
+        arrays: dict[str, np.ndarray] = {'indexed': self._indexed, 'token_rows': self._token_rows}
+        if self.is_trained:
+            arrays.update(
+                centroids=self._centroids,
+                labels=self._labels,
+                codes=self._codes,
+                offset=self._offset,
+                scale=self._scale
+            )
+        elif self._dim is not None:
+            arrays['vectors'] = self._vectors
+        with fs.open(os.path.join(path, LATE_INTERACTION_ARRAYS_FILE), 'wb') as f:
+            np.savez(f, **arrays)
+
+    def _append(self, token_rows: np.ndarray, vectors: np.ndarray) -> None:
+        if self._dim is None:
+            self._dim = vectors.shape[1]
+            self._vectors = np.empty((0, self._dim), dtype=np.float32)
+            self._codes = np.empty((0, self._dim), dtype=np.uint8)
+        if vectors.shape[1] != self._dim:
+            raise ValueError(f'Token embeddings have dimension {vectors.shape[1]}, expected {self._dim}.')
+        if self.metric == SimilarityMetric.COSINE:
+            vectors = normalize(vectors)
+        self._indexed[token_rows] = True
+        self._token_rows = np.concatenate([self._token_rows, token_rows])
+
+        if self.is_trained:
+            labels, codes = self._encode(vectors)
+            self._labels = np.concatenate([self._labels, labels])
+            self._codes = np.concatenate([self._codes, codes])
+        else:
+            self._vectors = np.concatenate([self._vectors, vectors])
+            if len(self._vectors) >= self.num_centroids * self.MIN_POINTS_PER_CENTROID:
+                self._train()
+        self._invalidate()
+
+    def _train(self) -> None:
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(self._vectors), self.num_centroids * self.MAX_POINTS_PER_CENTROID)
+        sample = self._vectors[np.sort(rng.choice(len(self._vectors), sample_size, replace=False))]
+        self._centroids = kmeans(sample, self.num_centroids, metric=self.metric, niter=self.niter, seed=self.seed)
+        labels = self._assign(sample)
+        residuals = sample - self._centroids[labels]
+        self._offset = residuals.min(axis=0)
+        self._scale = np.maximum(residuals.max(axis=0) - self._offset, 1e-12) / 255
+        self._labels, self._codes = self._encode(self._vectors)
+        self._vectors = np.empty((0, self._dim), dtype=np.float32)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(centroid_scores(vectors[start:start + CHUNK_SIZE], self._centroids, self.metric), axis=1)
+            for start in range(0, len(vectors), CHUNK_SIZE)
+        ]).astype(np.int32)
+
+    def _decode(self, tokens: np.ndarray) -> np.ndarray:
+        if not self.is_trained:
+            return self._vectors[tokens]
+        return self._centroids[self._labels[tokens]] + self._offset + self._scale * self._codes[tokens]
+
+    def _encode(self, vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        labels = self._assign(vectors)
+        codes = np.rint((vectors - self._centroids[labels] - self._offset) / self._scale)
+        return labels, np.clip(codes, 0, 255).astype(np.uint8)
+
+    def _take(self, tokens: np.ndarray) -> None:
+        self._token_rows = self._token_rows[tokens]
+        if self.is_trained:
+            self._labels, self._codes = self._labels[tokens], self._codes[tokens]
+        else:
+            self._vectors = self._vectors[tokens]
+        self._invalidate()
+
+    def _invalidate(self) -> None:
+        self._row_indptr = None
+        self._centroid_indptr = None
+        self._centroid_rows = None
+
+    def _postings(self) -> None:
+        """
+        Sorts the tokens by row on the first search after a write, so the tokens of a row are one slice,
+        and lists the distinct rows with a token in each centroid.
+        """
+        if self._row_indptr is not None:
+            return
+        order = np.argsort(self._token_rows, kind='stable')
+        if np.any(order != np.arange(len(order))):
+            self._take(order)
+        counts = np.bincount(self._token_rows, minlength=len(self._indexed))
+        self._row_indptr = np.concatenate([[0], np.cumsum(counts)])
+        if self.is_trained:
+            pairs = np.unique(self._labels.astype(np.int64) * len(self._indexed) + self._token_rows)
+            labels, self._centroid_rows = np.divmod(pairs, len(self._indexed))
+            self._centroid_indptr = np.concatenate([
+                [0],
+                np.cumsum(np.bincount(labels, minlength=len(self._centroids)))
+            ])
+
+    def _maxsim(self, rows: np.ndarray, score_tokens: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """
+        Sums, over query tokens, the best score of each row's tokens. score_tokens maps token positions
+        to a (tokens, query tokens) score matrix, and is called on chunks of whole rows.
+        """
+        starts = self._row_indptr[rows]
+        lengths = self._row_indptr[rows + 1] - starts
+        scores = np.zeros(len(rows), dtype=np.float32)
+        ends = np.cumsum(lengths)
+        first = 0
+        while first < len(rows):
+            last = max(int(np.searchsorted(ends, ends[first] - lengths[first] + CHUNK_SIZE, side='right')), first + 1)
+            chunk_lengths = lengths[first:last]
+            present = np.flatnonzero(chunk_lengths)
+            if len(present) > 0:
+                chunk_lengths = chunk_lengths[present]
+                offsets = np.cumsum(chunk_lengths) - chunk_lengths
+                tokens = np.arange(int(chunk_lengths.sum())) - np.repeat(offsets, chunk_lengths)
+                tokens += np.repeat(starts[first:last][present], chunk_lengths)
+                token_scores = score_tokens(tokens)
+                scores[first + present] = np.maximum.reduceat(token_scores, offsets, axis=0).sum(axis=1)
+            first = last
+        return scores
+
+def load_late_interaction_index(path: str, fs: fsspec.AbstractFileSystem) -> Optional[LateInteractionIndex]:
+    config_path = os.path.join(path, LATE_INTERACTION_CONFIG_FILE)
+    if not fs.exists(config_path):
+        return None
+    with fs.open(config_path, 'r') as f:
+        index = LateInteractionIndex(**json.load(f))
+    with fs.open(os.path.join(path, LATE_INTERACTION_ARRAYS_FILE), 'rb') as f:
+        with np.load(f, allow_pickle=False) as arrays:
+            index._indexed = arrays['indexed']
+            index._token_rows = arrays['token_rows']
+            if 'centroids' in arrays:
+                index._centroids = arrays['centroids']
+                index._labels = arrays['labels']
+                index._codes = arrays['codes']
+                index._offset = arrays['offset']
+                index._scale = arrays['scale']
+                index._dim = index._centroids.shape[1]
+            elif 'vectors' in arrays:
+                index._vectors = arrays['vectors']
+                index._dim = index._vectors.shape[1]
+    return index
\ No newline at end of file
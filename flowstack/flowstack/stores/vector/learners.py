@@ -0,0 +1,101 @@
+from enum import StrEnum
+from typing import Callable
+
+import numpy as np
+
+DEFAULT_NUM_NEGATIVES = 1024
+DEFAULT_REGULARIZATION = 0.1
+DEFAULT_MAX_ITER = 100
+POWER_ITERATIONS = 20
+
+class LearnerType(StrEnum):
+    LINEAR_REGRESSION = 'LINEAR_REGRESSION'
+    LOGISTIC_REGRESSION = 'LOGISTIC_REGRESSION'
+    SVM = 'SVM'
+
+def fit_linear_scorer(
+    positives: np.ndarray,
+    negatives: np.ndarray,
+    learner_type: str,
+    regularization: float = DEFAULT_REGULARIZATION,
+    max_iter: int = DEFAULT_MAX_ITER
+) -> tuple[np.ndarray, float]:
+    """
+    Fits a linear model separating positives from negatives and returns its weights and bias,
+    so that embeddings @ weights + bias scores a whole matrix in one pass.
+    Both classes get the same total sample weight, since there are usually far fewer positives.
+    LINEAR_REGRESSION is ridge regression solved in closed form, LOGISTIC_REGRESSION and SVM (squared hinge loss)
+    run max_iter steps of accelerated gradient descent. Training cost depends only on the number of samples.
+    """
+    samples = np.concatenate([positives, negatives]).astype(np.float32)
+    labels = np.concatenate([np.ones(len(positives)), -np.ones(len(negatives))]).astype(np.float32)
+    sample_weights = np.concatenate([
+        np.full(len(positives), 0.5 / max(len(positives), 1)),
+        np.full(len(negatives), 0.5 / max(len(negatives), 1))
+    ]).astype(np.float32)
+
+    match LearnerType(learner_type.upper()):
+        case LearnerType.LINEAR_REGRESSION:
+            return _fit_ridge(samples, (labels + 1) / 2, sample_weights, regularization)
+        case LearnerType.LOGISTIC_REGRESSION:
+            def loss_derivative(margins: np.ndarray) -> np.ndarray:
+                return -1 / (1 + np.exp(np.clip(margins, -50, 50)))
+            return _fit_gradient(samples, labels, sample_weights, loss_derivative, 0.25, regularization, max_iter)
+        case LearnerType.SVM:
+            def loss_derivative(margins: np.ndarray) -> np.ndarray:
+                return -2 * np.maximum(1 - margins, 0)
+            return _fit_gradient(samples, labels, sample_weights, loss_derivative, 2.0, regularization, max_iter)
+
+def _fit_ridge(
+    samples: np.ndarray,
+    targets: np.ndarray,
+    sample_weights: np.ndarray,
+    regularization: float
+) -> tuple[np.ndarray, float]:
+    # Centering by the weighted means leaves the bias out of the penalty.
+    mean = sample_weights @ samples / sample_weights.sum()
+    target_mean = float(sample_weights @ targets / sample_weights.sum())
+    centered = samples - mean
+    weighted = centered * sample_weights[:, None]
+    # Solve in whichever of the sample or feature space is smaller.
+    if len(samples) < samples.shape[1]:
+        gram = centered @ weighted.T + regularization * np.eye(len(samples), dtype=np.float32)
+        weights = weighted.T @ np.linalg.solve(gram, targets - target_mean)
+    else:
+        gram = weighted.T @ centered + regularization * np.eye(samples.shape[1], dtype=np.float32)
+        weights = np.linalg.solve(gram, weighted.T @ (targets - target_mean))
+    weights = weights.astype(np.float32)
+    return weights, target_mean - float(mean @ weights)
+
+def _fit_gradient(
+    samples: np.ndarray,
+    labels: np.ndarray,
+    sample_weights: np.ndarray,
+    loss_derivative: Callable[[np.ndarray], np.ndarray],
+    curvature: float,
+    regularization: float,
+    max_iter: int
+) -> tuple[np.ndarray, float]:
+    """
+    Minimizes sum(sample_weights * loss(margins)) + regularization / 2 * |weights|^2 with Nesterov's method.
+    curvature bounds the second derivative of the loss, the step size follows from it and the largest
+    eigenvalue of the weighted Gram matrix, estimated by power iteration.
+    """
+    augmented = np.hstack([samples, np.ones((len(samples), 1), dtype=np.float32)])
+    vector = np.ones(augmented.shape[1], dtype=np.float32)
+    for _ in range(POWER_ITERATIONS):
+        vector = augmented.T @ (sample_weights * (augmented @ vector))
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+    largest = float(vector @ (augmented.T @ (sample_weights * (augmented @ vector))))
+    step = 1 / (curvature * largest * 1.1 + regularization)
+
+    penalty = np.full(augmented.shape[1], regularization, dtype=np.float32)
+    penalty[-1] = 0
+    weights = np.zeros(augmented.shape[1], dtype=np.float32)
+    previous = weights
+    for i in range(max_iter):
+        momentum = weights + i / (i + 3) * (weights - previous)
+        margins = augmented @ momentum
+        gradient = augmented.T @ (sample_weights * loss_derivative(labels * margins) * labels) + penalty * momentum
+        previous, weights = weights, momentum - step * gradient
+    return weights[:-1], float(weights[-1])
\ No newline at end of file
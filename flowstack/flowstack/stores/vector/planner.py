@@ -0,0 +1,72 @@
+from dataclasses import dataclass, field
+from enum import StrEnum
+import math
+from typing import Any, Optional
+
+from flowstack.stores.vector.index import VectorIndex
+
+POST_FILTER_OVERFETCH = 2.0  # margin on the rows fetched by post-filtering, for filters correlated with the query
+
+class QueryStrategy(StrEnum):
+    INDEX = 'INDEX'
+    PRE_FILTER = 'PRE_FILTER'
+    POST_FILTER = 'POST_FILTER'
+
+@dataclass
+class QueryPlan:
+    """
+    How a query is run. INDEX searches the index without restrictions, PRE_FILTER scores every candidate row exactly,
+    POST_FILTER searches the index for fetch_k rows with search_params and keeps the candidates among them.
+    Costs are estimated numbers of rows scored per query.
+    """
+
+    strategy: QueryStrategy
+    num_rows: int
+    num_candidates: int
+    selectivity: float
+    fetch_k: int
+    pre_filter_cost: float
+    post_filter_cost: float
+    search_params: dict[str, Any] = field(default_factory=dict)
+
+def plan_query(
+    index: VectorIndex,
+    num_rows: int,
+    num_candidates: Optional[int],
+    k: int,
+    filter_strategy: Optional[str] = None,
+    **params
+) -> QueryPlan:
+    """
+    Picks the cheaper of brute force over the candidate rows and an index search over-fetching
+    k / selectivity rows, unless filter_strategy forces one. num_candidates is None for an unrestricted query.
+    """
+    if num_candidates is None:
+        cost, search_params = index.search_cost(num_rows, k, **params)
+        return QueryPlan(
+            strategy=QueryStrategy.INDEX,
+            num_rows=num_rows,
+            num_candidates=num_rows,
+            selectivity=1.0,
+            fetch_k=k,
+            pre_filter_cost=num_rows,
+            post_filter_cost=cost,
+            search_params=search_params
+        )
+
+    selectivity = num_candidates / num_rows if num_rows > 0 else 0.0
+    fetch_k = min(math.ceil(k * POST_FILTER_OVERFETCH / selectivity), num_rows) if selectivity > 0 else num_rows
+    post_filter_cost, search_params = index.search_cost(num_rows, fetch_k, **params)
+    pre_filter_cost = float(num_candidates)
+    if filter_strategy is None:
+        filter_strategy = QueryStrategy.PRE_FILTER if pre_filter_cost <= post_filter_cost else QueryStrategy.POST_FILTER
+    return QueryPlan(
+        strategy=QueryStrategy(filter_strategy.upper()),
+        num_rows=num_rows,
+        num_candidates=num_candidates,
+        selectivity=selectivity,
+        fetch_k=fetch_k,
+        pre_filter_cost=pre_filter_cost,
+        post_filter_cost=post_filter_cost,
+        search_params=search_params
+    )
\ No newline at end of file
@@ -0,0 +1,431 @@
+from abc import ABC, abstractmethod
+import copy
+import json
+import os.path
+from typing import Any, ClassVar, Optional, Self, Type
+
+import fsspec
+import numpy as np
+
+from flowstack.stores.vector.utils import SimilarityMetric, kmeans, row_norms, similarities_from_dot, top_k_indices
+
+QUANTIZER_CONFIG_FILE = 'quantizer.json'
+QUANTIZER_ARRAYS_FILE = 'quantizer.npz'
+
+DEFAULT_RERANK_FACTOR = 4
+DEFAULT_PQ_RERANK_FACTOR = 16
+CHUNK_SIZE = 65_536  # rows decoded to float32 at a time
+
+class Quantizer(ABC):
+    """
+    Compressed copy of a store's embedding matrix, maintained row by row like an index.
+    Searches score the codes, then re-rank the best k * rerank_factor rows exactly against
+    the full-precision matrix, which can stay memory-mapped on disk.
+    Exact row norms are kept next to the codes, so COSINE and L2 never scan the full matrix either.
+    """
+
+    quantizer_type: ClassVar[str]
+
+    @property
+    def is_trained(self) -> bool:
+        return self._codes is not None
+
+    @property
+    def norms(self) -> np.ndarray:
+        return self._norms
+
+    @property
+    def nbytes(self) -> int:
+        return self._norms.nbytes + (self._codes.nbytes if self._codes is not None else 0)
+
+    def __init__(self, rerank_factor: int = DEFAULT_RERANK_FACTOR, **params):
+        self.rerank_factor = rerank_factor
+        self.params = {'rerank_factor': rerank_factor, **params}
+        self.reset()
+
+    @abstractmethod
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        pass
+
+    @abstractmethod
+    def dot(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """
+        Approximate inner products between the encoded rows and query.
+        """
+
+    def train(self, embeddings: np.ndarray) -> None:
+        pass
+
+    def reset(self) -> None:
+        self._codes: Optional[np.ndarray] = None
+        self._norms: np.ndarray = np.empty(0, dtype=np.float32)
+
+    def build(self, embeddings: np.ndarray) -> None:
+        self.reset()
+        if len(embeddings) > 0:
+            self.add(embeddings, np.arange(len(embeddings)))
+
+    def add(self, embeddings: np.ndarray, rows: np.ndarray) -> None:
+        """
+        Encodes rows that were appended to or overwritten in embeddings.
+        Training happens on the first call with enough rows, and encodes every row seen so far.
+        """
+        size = len(embeddings)
+        vectors = np.asarray(embeddings[rows], dtype=np.float32)
+        if len(self._norms) < size:
+            self._norms = np.concatenate([self._norms, np.zeros(size - len(self._norms), dtype=np.float32)])
+        self._norms[rows] = row_norms(vectors)
+
+        if self._codes is None:
+            if not self._can_train(size):
+                return
+            self.train(embeddings)
+            rows = np.arange(size)
+            vectors = np.asarray(embeddings, dtype=np.float32)
+
+        codes = np.concatenate([
+            self.encode(vectors[start:start + CHUNK_SIZE])
+            for start in range(0, len(vectors), CHUNK_SIZE)
+        ])
+        if self._codes is None:
+            self._codes = np.empty((size, *codes.shape[1:]), dtype=codes.dtype)
+        elif len(self._codes) < size:
+            self._codes = np.concatenate([
+                self._codes,
+                np.empty((size - len(self._codes), *codes.shape[1:]), dtype=codes.dtype)
+            ])
+        self._codes[rows] = codes
+
+    def compact(self, kept_rows: np.ndarray) -> None:
+        self._norms = self._norms[kept_rows]
+        if self._codes is not None:
+            self._codes = self._codes[kept_rows]
+
+    def search(
+        self,
+        embeddings: np.ndarray,
+        query: np.ndarray,
+        k: int,
+        metric: SimilarityMetric,
+        rows: Optional[np.ndarray] = None,
+        rerank_factor: Optional[int] = None
+    ) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        """
+        Returns the rows and exact similarities of the top k matches, or None while the quantizer is untrained.
+        """
+        if self._codes is None:
+            return None
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        approximate = self.scores(query, metric, rows=rows)
+        candidates = top_k_indices(approximate, k * (rerank_factor or self.rerank_factor))
+        if rows is not None:
+            candidates = rows[candidates]
+        return self.rerank(embeddings, candidates, query, k, metric)
+
+    def scores(self, query: np.ndarray, metric: SimilarityMetric, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Approximate similarities of rows, or of every row when rows is None, scored on the codes.
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        codes = self._codes if rows is None else self._codes[rows]
+        norms = self._norms if rows is None else self._norms[rows]
+        dots = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), CHUNK_SIZE):
+            dots[start:start + CHUNK_SIZE] = self.dot(codes[start:start + CHUNK_SIZE], query)
+        return similarities_from_dot(dots, query, metric=metric, norms=norms)
+
+    def rerank(
+        self,
+        embeddings: np.ndarray,
+        candidates: np.ndarray,
+        query: np.ndarray,
+        k: int,
+        metric: SimilarityMetric
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the rows and exact similarities of the top k candidate rows.
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        # The re-rank is the only read of the full-precision matrix, sorted rows keep it sequential.
+        candidates = np.sort(candidates)
+        exact = similarities_from_dot(
+            np.asarray(embeddings[candidates], dtype=np.float32) @ query,
+            query,
+            metric=metric,
+            norms=self._norms[candidates]
+        )
+        top = top_k_indices(exact, k)
+        return candidates[top], exact[top]
+
+    def copy(self) -> Self:
+        return copy.deepcopy(self)
+
+    def save(self, path: str, fs: fsspec.AbstractFileSystem) -> None:
+        with fs.open(os.path.join(path, QUANTIZER_CONFIG_FILE), 'w') as f:
+            json.dump({'quantizer_type': self.quantizer_type, **self.params}, f)
+        with fs.open(os.path.join(path, QUANTIZER_ARRAYS_FILE), 'wb') as f:
+            np.savez(f, **self._to_arrays())
+
+    def _can_train(self, size: int) -> bool:
+        return size > 0
+
+    def _to_arrays(self) -> dict[str, np.ndarray]:
+        arrays = {'norms': self._norms}
+        if self._codes is not None:
+            arrays['codes'] = self._codes
+        return arrays
+
+    def _from_arrays(self, arrays: dict[str, np.ndarray]) -> None:
+        self._norms = arrays['norms']
+        self._codes = arrays.get('codes')
+
+class Float16Quantizer(Quantizer):
+    """
+    Half-precision codes, 2x smaller than float32.
+    """
+
+    quantizer_type = 'FP16'
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors.astype(np.float16)
+
+    def dot(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) @ query
+
+class ScalarQuantizer(Quantizer):
+    """
+    8-bit scalar quantization, 4x smaller than float32. Each dimension is mapped linearly onto 0..255
+    between its minimum and maximum over the training rows, later values outside that range are clipped.
+    Until MIN_TRAINING_ROWS rows have been added, searches are exact, a range fitted to a handful of rows
+    would clip most of what comes after it.
+    """
+
+    quantizer_type = 'SQ8'
+
+    MIN_TRAINING_ROWS: ClassVar[int] = 256
+
+    def train(self, embeddings: np.ndarray) -> None:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        self._offset = vectors.min(axis=0)
+        self._scale = np.maximum(vectors.max(axis=0) - self._offset, 1e-12) / 255
+
+    def reset(self) -> None:
+        super().reset()
+        self._offset: Optional[np.ndarray] = None
+        self._scale: Optional[np.ndarray] = None
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((vectors - self._offset) / self._scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def dot(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # x ~ offset + scale * code, so x . q ~ offset . q + code . (scale * q)
+        return codes.astype(np.float32) @ (self._scale * query) + np.dot(self._offset, query)
+
+    def _can_train(self, size: int) -> bool:
+        return size >= self.MIN_TRAINING_ROWS
+
+    def _to_arrays(self) -> dict[str, np.ndarray]:
+        arrays = super()._to_arrays()
+        if self._offset is not None:
+            arrays['offset'] = self._offset
+            arrays['scale'] = self._scale
+        return arrays
+
+    def _from_arrays(self, arrays: dict[str, np.ndarray]) -> None:
+        super()._from_arrays(arrays)
+        self._offset = arrays.get('offset')
+        self._scale = arrays.get('scale')
+
+class ProductQuantizer(Quantizer):
+    """
+    Product quantization. Vectors are split into m sub-vectors, each replaced by the id of its nearest
+    sub-centroid, so a row costs m bytes. Queries score codes through one lookup table per sub-space.
+    The codes are coarser than SQ8, so more candidates are re-ranked by default.
+    Until MIN_TRAINING_ROWS rows have been added, searches are exact.
+    """
+
+    quantizer_type = 'PQ'
+
+    MIN_TRAINING_ROWS: ClassVar[int] = 256
+    MAX_TRAINING_ROWS: ClassVar[int] = 65_536
+
+    def __init__(
+        self,
+        m: int = 8,
+        nbits: int = 8,
+        niter: int = 20,
+        seed: int = 0,
+        rerank_factor: int = DEFAULT_PQ_RERANK_FACTOR
+    ):
+        if not 1 <= nbits <= 8:
+            raise ValueError(f'nbits must be between 1 and 8, got {nbits}.')
+        self.m = m
+        self.ksub = 2 ** nbits
+        self.niter = niter
+        self.seed = seed
+        super().__init__(rerank_factor=rerank_factor, m=m, nbits=nbits, niter=niter, seed=seed)
+
+    def train(self, embeddings: np.ndarray) -> None:
+        dim = embeddings.shape[1]
+        if dim % self.m != 0:
+            raise ValueError(f'Embedding dimension {dim} is not divisible by the number of sub-vectors {self.m}.')
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(embeddings), self.MAX_TRAINING_ROWS)
+        sample = np.asarray(
+            embeddings[np.sort(rng.choice(len(embeddings), sample_size, replace=False))],
+            dtype=np.float32
+        ).reshape(sample_size, self.m, -1)
+        codebooks = np.empty((self.m, self.ksub, dim // self.m), dtype=np.float32)
+        for j in range(self.m):
+            centroids = kmeans(sample[:, j], self.ksub, metric=SimilarityMetric.L2, niter=self.niter, seed=self.seed + j)
+            # kmeans returns fewer centroids when there are fewer sample rows than ksub.
+            codebooks[j] = centroids[np.arange(self.ksub) % len(centroids)]
+        self._codebooks = codebooks
+
+    def reset(self) -> None:
+        super().reset()
+        self._codebooks: Optional[np.ndarray] = None
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        subvectors = vectors.reshape(len(vectors), self.m, -1)
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j, codebook in enumerate(self._codebooks):
+            distances = np.einsum('ij,ij->i', codebook, codebook)[None, :] - 2 * subvectors[:, j] @ codebook.T
+            codes[:, j] = np.argmin(distances, axis=1)
+        return codes
+
+    def dot(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # tables[j, c] is the inner product of sub-centroid c of sub-space j with the matching part of query.
+        tables = np.einsum('jcd,jd->jc', self._codebooks, query.reshape(self.m, -1))
+        return tables[np.arange(self.m), codes].sum(axis=1)
+
+    def _can_train(self, size: int) -> bool:
+        return size >= self.MIN_TRAINING_ROWS
+
+    def _to_arrays(self) -> dict[str, np.ndarray]:
+        arrays = super()._to_arrays()
+        if self._codebooks is not None:
+            arrays['codebooks'] = self._codebooks
+        return arrays
+
+    def _from_arrays(self, arrays: dict[str, np.ndarray]) -> None:
+        super()._from_arrays(arrays)
+        self._codebooks = arrays.get('codebooks')
+
+class TruncationQuantizer(Quantizer):
+    """
+    Keeps the first dim components of every vector, for Matryoshka embeddings whose prefixes are embeddings themselves.
+    Codes are rescaled to the norm of the full vector and queries are scored on their prefix the same way,
+    so the first pass estimates each inner product as the prefix cosine similarity times both full norms.
+    """
+
+    quantizer_type = 'TRUNCATE'
+
+    def __init__(self, dim: int, rerank_factor: int = DEFAULT_RERANK_FACTOR):
+        self.dim = dim
+        super().__init__(rerank_factor=rerank_factor, dim=dim)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        prefixes = vectors[:, :self.dim]
+        scale = row_norms(vectors) / np.maximum(row_norms(prefixes), 1e-12)
+        return (prefixes * scale[:, None]).astype(np.float32)
+
+    def dot(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        prefix = query[:self.dim]
+        return codes @ prefix * (np.linalg.norm(query) / max(float(np.linalg.norm(prefix)), 1e-12))
+
+class PCAQuantizer(Quantizer):
+    """
+    Projects vectors onto their top dim principal components, fitted on a sample of the rows,
+    for embeddings that cannot simply be truncated. explained_variance_ratio tells how much of the spread dim keeps.
+    Until MIN_TRAINING_ROWS rows have been added, searches are exact.
+    """
+
+    quantizer_type = 'PCA'
+
+    MIN_TRAINING_ROWS: ClassVar[int] = 256
+    MAX_TRAINING_ROWS: ClassVar[int] = 65_536
+
+    @property
+    def explained_variance_ratio(self) -> Optional[float]:
+        return self._explained_variance_ratio
+
+    def __init__(self, dim: int, seed: int = 0, rerank_factor: int = DEFAULT_RERANK_FACTOR):
+        self.dim = dim
+        self.seed = seed
+        super().__init__(rerank_factor=rerank_factor, dim=dim, seed=seed)
+
+    def train(self, embeddings: np.ndarray) -> None:
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(embeddings), self.MAX_TRAINING_ROWS)
+        sample = np.asarray(
+            embeddings[np.sort(rng.choice(len(embeddings), sample_size, replace=False))],
+            dtype=np.float32
+        )
+        self._mean = sample.mean(axis=0)
+        centered = sample - self._mean
+        eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered / len(sample))
+        # eigh sorts eigenvalues in ascending order.
+        top = np.argsort(eigenvalues)[::-1][:self.dim]
+        self._components = np.ascontiguousarray(eigenvectors[:, top].T, dtype=np.float32)
+        self._explained_variance_ratio = float(eigenvalues[top].sum() / max(eigenvalues.sum(), 1e-12))
+
+    def reset(self) -> None:
+        super().reset()
+        self._mean: Optional[np.ndarray] = None
+        self._components: Optional[np.ndarray] = None
+        self._explained_variance_ratio: Optional[float] = None
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return ((vectors - self._mean) @ self._components.T).astype(np.float32)
+
+    def dot(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # x ~ mean + components.T @ code, so x . q ~ mean . q + code . (components @ q)
+        return codes @ (self._components @ query) + np.dot(self._mean, query)
+
+    def _can_train(self, size: int) -> bool:
+        return size >= self.MIN_TRAINING_ROWS
+
+    def _to_arrays(self) -> dict[str, np.ndarray]:
+        arrays = super()._to_arrays()
+        if self._components is not None:
+            arrays['mean'] = self._mean
+            arrays['components'] = self._components
+            arrays['explained_variance_ratio'] = np.array(self._explained_variance_ratio)
+        return arrays
+
+    def _from_arrays(self, arrays: dict[str, np.ndarray]) -> None:
+        super()._from_arrays(arrays)
+        self._mean = arrays.get('mean')
+        self._components = arrays.get('components')
+        if 'explained_variance_ratio' in arrays:
+            self._explained_variance_ratio = float(arrays['explained_variance_ratio'])
+
+QUANTIZER_TYPES: dict[str, Type[Quantizer]] = {
+    quantizer_type.quantizer_type: quantizer_type
+    for quantizer_type in [Float16Quantizer, ScalarQuantizer, ProductQuantizer, TruncationQuantizer, PCAQuantizer]
+}
+
+def create_quantizer(quantization_config: dict[str, Any]) -> Optional[Quantizer]:
+    """
+    Returns None when quantization_config has no quantizer_type, the store then searches full-precision vectors only.
+    """
+    params = dict(quantization_config)
+    quantizer_type = params.pop('quantizer_type', None)
+    if quantizer_type is None:
+        return None
+    if quantizer_type not in QUANTIZER_TYPES:
+        raise ValueError(f'Unsupported quantizer type: {quantizer_type}.')
+    return QUANTIZER_TYPES[quantizer_type](**params)
+
+def load_quantizer(path: str, fs: fsspec.AbstractFileSystem) -> Optional[Quantizer]:
+    config_path = os.path.join(path, QUANTIZER_CONFIG_FILE)
+    if not fs.exists(config_path):
+        return None
+    with fs.open(config_path, 'r') as f:
+        quantizer = create_quantizer(json.load(f))
+    with fs.open(os.path.join(path, QUANTIZER_ARRAYS_FILE), 'rb') as f:
+        with np.load(f, allow_pickle=False) as arrays:
+            quantizer._from_arrays({key: arrays[key] for key in arrays.files})
+    return quantizer
\ No newline at end of file
@@ -0,0 +1,368 @@
+from dataclasses import dataclass
+import logging
+import os.path
+import threading
+from typing import Optional, Self, Sequence, Unpack
+
+import fsspec
+import numpy as np
+
+from flowstack.artifacts import Artifact
+from flowstack.stores import VectorStore, VectorStoreQuery, VectorStoreQueryResult
+from flowstack.stores.vector.sharded import merge_results, result_size
+from flowstack.stores.vector.simple import SimpleVectorStore
+from flowstack.typing import Embedding, MetadataFilters
+
+SEGMENT_DIR_FORMAT = 'segment-{:05d}'
+TOMBSTONES_FILE = 'tombstones.npy'
+DEFAULT_MERGE_FACTOR = 8
+DEFAULT_MAX_DEAD_FRACTION = 0.2
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True, eq=False)
+class StoreSegment:
+    """
+    A SimpleVectorStore that is no longer written to, the tombstones of its deleted rows,
+    and the view of it that queries run against.
+    """
+    store: SimpleVectorStore
+    tombstones: np.ndarray
+    view: SimpleVectorStore
+    num_dead: int
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.tombstones)
+
+    @property
+    def num_live(self) -> int:
+        return self.num_rows - self.num_dead
+
+    @property
+    def dead_fraction(self) -> float:
+        return self.num_dead / self.num_rows if self.num_rows > 0 else 0.0
+
+    @classmethod
+    def of(cls, store: SimpleVectorStore, tombstones: Optional[np.ndarray] = None) -> Self:
+        if tombstones is None:
+            tombstones = np.zeros(len(store.ids), dtype=bool)
+        return cls(store=store, tombstones=tombstones, view=store.masked(tombstones), num_dead=int(tombstones.sum()))
+
+class SegmentedVectorStore(VectorStore):
+    """
+    Local vector store made of immutable SimpleVectorStore segments, so that queries never wait for writes.
+    The published segments are a single tuple: a query reads it once and searches that snapshot without locking,
+    while one writer at a time builds new segments off to the side and publishes them by swapping in a new tuple.
+
+    Every insert becomes a new segment. Deletes, and upserts of rows held by older segments, only set tombstones,
+    a boolean mask per segment that queries leave out, so they cost nothing like copying the segment.
+    A merge policy then rewrites segments in a background thread, or in the writer if merge_in_background is False:
+    a segment whose fraction of dead rows passes max_dead_fraction is compacted, and once merge_factor segments
+    fall in the same size tier, powers of merge_factor live rows, they are merged into one,
+    so the number of segments stays logarithmic in the number of rows.
+    store_kwargs configure every segment. As with ShardedVectorStore, segments score independently,
+    so only the modes in MERGEABLE_QUERY_MODES are supported.
+    """
+
+    @property
+    def segments(self) -> tuple[StoreSegment, ...]:
+        return self._segments
+
+    def __init__(
+        self,
+        merge_factor: int = DEFAULT_MERGE_FACTOR,
+        max_dead_fraction: float = DEFAULT_MAX_DEAD_FRACTION,
+        merge_in_background: bool = True,
+        segments: Sequence[StoreSegment] = (),
+        **store_kwargs
+    ):
+        if merge_factor < 2:
+            raise ValueError(f'merge_factor must be at least 2, got {merge_factor}.')
+        self.merge_factor = merge_factor
+        self.max_dead_fraction = max_dead_fraction
+        self.merge_in_background = merge_in_background
+        self.store_kwargs = store_kwargs
+        self._write_lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+        self._merge_thread: Optional[threading.Thread] = None
+        # Only writers read or change the owner of each live id, queries only ever read _segments.
+        self._owners: dict[str, SimpleVectorStore] = {}
+        self._segments: tuple[StoreSegment, ...] = ()
+        for segment in segments:
+            segment.store.warm()
+        with self._write_lock:
+            self._publish(list(segments), added=list(segments))
+
+    def persist(self, path: str, fs: Optional[fsspec.AbstractFileSystem] = None, **kwargs) -> None:
+        """
+        Writes every segment of the current snapshot to its own directory under path, tombstones included.
+        Segments loaded from path may be memory-mapping the directories being replaced, and may sit at another
+        position by now, so each one is written to a temporary directory first and then swapped in.
+        """
+        fs = fs or fsspec.filesystem('file')
+        segments = self._segments
+        stale = set(fs.glob(os.path.join(path, 'segment-*')))
+        for i, segment in enumerate(segments):
+            segment_path = os.path.join(path, SEGMENT_DIR_FORMAT.format(i))
+            # The leading dot keeps a directory left behind by a crash out of the glob in from_persist_path.
+            tmp_path = os.path.join(path, f'.{SEGMENT_DIR_FORMAT.format(i)}.tmp')
+            if fs.exists(tmp_path):
+                fs.rm(tmp_path, recursive=True)
+            segment.store.persist(tmp_path, fs=fs)
+            with fs.open(os.path.join(tmp_path, TOMBSTONES_FILE), 'wb') as f:
+                np.save(f, segment.tombstones, allow_pickle=False)
+            if fs.exists(segment_path):
+                fs.rm(segment_path, recursive=True)
+            fs.mv(tmp_path, segment_path, recursive=True)
+            stale.discard(fs._strip_protocol(segment_path))
+        for segment_path in stale:
+            fs.rm(segment_path, recursive=True)
+
+    @classmethod
+    def from_persist_path(
+        cls,
+        path: str,
+        fs: Optional[fsspec.AbstractFileSystem] = None,
+        mmap: bool = True,
+        merge_factor: int = DEFAULT_MERGE_FACTOR,
+        max_dead_fraction: float = DEFAULT_MAX_DEAD_FRACTION,
+        merge_in_background: bool = True,
+        **store_kwargs
+    ) -> Self:
+        fs = fs or fsspec.filesystem('file')
+        segments: list[StoreSegment] = []
+        for segment_path in sorted(fs.glob(os.path.join(path, 'segment-*'))):
+            store = SimpleVectorStore.from_persist_path(segment_path, fs=fs, mmap=mmap, **store_kwargs)
+            tombstones_path = os.path.join(segment_path, TOMBSTONES_FILE)
+            tombstones: Optional[np.ndarray] = None
+            if fs.exists(tombstones_path):
+                with fs.open(tombstones_path, 'rb') as f:
+                    tombstones = np.load(f, allow_pickle=False)
+            segments.append(StoreSegment.of(store, tombstones))
+        return cls(
+            merge_factor=merge_factor,
+            max_dead_fraction=max_dead_fraction,
+            merge_in_background=merge_in_background,
+            segments=segments,
+            **store_kwargs
+        )
+
+    def merge(self) -> None:
+        """
+        Runs the merge policy in the calling thread until no segment needs rewriting.
+        """
+        with self._merge_lock:
+            while True:
+                with self._write_lock:
+                    job = self._next_merge()
+                if job is None:
+                    return
+                self._replace(job, self._rewrite(job))
+
+    def close(self) -> None:
+        """
+        Waits for a running background merge.
+        """
+        thread = self._merge_thread
+        if thread is not None:
+            thread.join()
+
+    def retrieve(self, **query: Unpack[VectorStoreQuery]) -> VectorStoreQueryResult:
+        k = result_size(query, 'SegmentedVectorStore')
+        segments = self._segments
+        return merge_results([segment.view.retrieve(**query) for segment in segments], k)
+
+    def retrieve_many(
+        self,
+        query_embeddings: list[Embedding],
+        **query: Unpack[VectorStoreQuery]
+    ) -> list[VectorStoreQueryResult]:
+        k = result_size(query, 'SegmentedVectorStore')
+        segments = self._segments
+        segment_results = [segment.view.retrieve_many(query_embeddings, **query) for segment in segments]
+        return [
+            merge_results([results[i] for results in segment_results], k)
+            for i in range(len(query_embeddings))
+        ]
+
+    def insert(self, artifacts: list[Artifact], **kwargs) -> list[str]:
+        if len(artifacts) == 0:
+            return []
+        # The new segment is built before taking the write lock, so concurrent inserts only serialize on publishing.
+        store = SimpleVectorStore(**self.store_kwargs)
+        ids = store.insert(artifacts, **kwargs)
+        store.warm()
+        segment = StoreSegment.of(store)
+        with self._write_lock:
+            owned: dict[SimpleVectorStore, list[str]] = {}
+            for artifact_id in ids:
+                owner = self._owners.get(artifact_id)
+                if owner is not None:
+                    owned.setdefault(owner, []).append(artifact_id)
+            segments = self._kill({
+                owner: self._segment_of(owner).view.select_rows(artifact_ids=owner_ids)
+                for owner, owner_ids in owned.items()
+            })
+            self._publish(segments + [segment], added=[segment])
+        self._schedule_merge()
+        return ids
+
+    def delete(
+        self,
+        artifact_ids: Optional[list[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        **kwargs
+    ) -> None:
+        if artifact_ids is None and filters is None:
+            return
+        with self._write_lock:
+            if artifact_ids is not None:
+                owned: dict[SimpleVectorStore, list[str]] = {}
+                for artifact_id in artifact_ids:
+                    owner = self._owners.get(artifact_id)
+                    if owner is not None:
+                        owned.setdefault(owner, []).append(artifact_id)
+                dead_rows = {
+                    owner: self._segment_of(owner).view.select_rows(artifact_ids=owner_ids, filters=filters)
+                    for owner, owner_ids in owned.items()
+                }
+            else:
+                dead_rows = {segment.store: segment.view.select_rows(filters=filters) for segment in self._segments}
+            self._publish(self._kill(dead_rows))
+        self._schedule_merge()
+
+    def delete_refs(self, ref_ids: list[str], **kwargs) -> None:
+        with self._write_lock:
+            self._publish(self._kill({
+                segment.store: segment.view.select_rows(ref_artifact_ids=ref_ids)
+                for segment in self._segments
+            }))
+        self._schedule_merge()
+
+    def clear(self, **kwargs) -> None:
+        with self._write_lock:
+            self._owners = {}
+            self._segments = ()
+
+    def _segment_of(self, store: SimpleVectorStore) -> StoreSegment:
+        return next(segment for segment in self._segments if segment.store is store)
+
+    def _kill(self, dead_rows: dict[SimpleVectorStore, np.ndarray]) -> list[StoreSegment]:
+        """
+        Returns the published segments with dead_rows tombstoned, dropping segments left without live rows.
+        Tombstones are copied rather than set in place, since queries may still be reading the old ones.
+        """
+        segments: list[StoreSegment] = []
+        for segment in self._segments:
+            rows = dead_rows.get(segment.store)
+            if rows is None or len(rows) == 0:
+                segments.append(segment)
+                continue
+            for row in rows.tolist():
+                del self._owners[segment.store.ids[row]]
+            tombstones = segment.tombstones.copy()
+            tombstones[rows] = True
+            segment = StoreSegment.of(segment.store, tombstones)
+            if segment.num_live > 0:
+                segments.append(segment)
+        return segments
+
+    def _publish(self, segments: list[StoreSegment], added: list[StoreSegment] = []) -> None:
+        for segment in added:
+            ids = segment.store.ids
+            for row in np.flatnonzero(~segment.tombstones).tolist():
+                self._owners[ids[row]] = segment.store
+        # A single reference assignment, so a query sees either the old tuple or the new one.
+        self._segments = tuple(segments)
+
+    def _schedule_merge(self) -> None:
+        """
+        Runs the merge policy after a write, in the writer or in a background thread that is started if none is running.
+        The thread clears _merge_thread under the write lock when it finds nothing left to do,
+        so a write published before the check below is never left unmerged by a thread that was just finishing.
+        """
+        if not self.merge_in_background:
+            self.merge()
+            return
+        with self._write_lock:
+            if self._merge_thread is not None or self._next_merge() is None:
+                return
+
+            def _merge() -> None:
+                try:
+                    with self._merge_lock:
+                        while True:
+                            with self._write_lock:
+                                job = self._next_merge()
+                                if job is None:
+                                    self._merge_thread = None
+                                    return
+                            self._replace(job, self._rewrite(job))
+                except Exception:
+                    logger.exception('Background merge of vector store segments failed.')
+                    with self._write_lock:
+                        self._merge_thread = None
+
+            self._merge_thread = threading.Thread(target=_merge, daemon=True)
+            self._merge_thread.start()
+
+    def _next_merge(self) -> Optional[list[StoreSegment]]:
+        """
+        Picks the segments to rewrite next: the first one with too many dead rows,
+        otherwise the first merge_factor segments of the smallest full size tier.
+        """
+        for segment in self._segments:
+            if segment.dead_fraction > self.max_dead_fraction:
+                return [segment]
+        tiers: dict[int, list[StoreSegment]] = {}
+        for segment in self._segments:
+            tiers.setdefault(_tier(segment.num_live, self.merge_factor), []).append(segment)
+        for _, tier in sorted(tiers.items()):
+            if len(tier) >= self.merge_factor:
+                return tier[:self.merge_factor]
+        return None
+
+    def _rewrite(self, job: list[StoreSegment]) -> SimpleVectorStore:
+        """
+        Builds the store replacing the segments of job, without their dead rows. Runs without the write lock.
+        """
+        stores: list[SimpleVectorStore] = []
+        for segment in job:
+            if segment.num_dead == 0:
+                stores.append(segment.store)
+                continue
+            store = segment.store.copy()
+            store.delete([segment.store.ids[row] for row in np.flatnonzero(segment.tombstones).tolist()])
+            stores.append(store)
+        store = stores[0] if len(stores) == 1 else SimpleVectorStore.merge(stores, **self.store_kwargs)
+        store.warm()
+        return store
+
+    def _replace(self, job: list[StoreSegment], store: SimpleVectorStore) -> None:
+        """
+        Publishes store in place of the segments of job, carrying over the rows deleted while it was built.
+        The result is dropped if any of them has been replaced in the meantime, by a clear for instance.
+        """
+        with self._write_lock:
+            current = {segment.store: segment for segment in self._segments}
+            if any(segment.store not in current for segment in job):
+                return
+            dead_ids = [
+                segment.store.ids[row]
+                for segment in job
+                for row in np.flatnonzero(current[segment.store].tombstones & ~segment.tombstones).tolist()
+            ]
+            tombstones = np.zeros(len(store.ids), dtype=bool)
+            tombstones[store.select_rows(artifact_ids=dead_ids)] = True
+            replaced = {segment.store for segment in job}
+            segments = [segment for segment in self._segments if segment.store not in replaced]
+            added = [StoreSegment.of(store, tombstones)] if len(dead_ids) < len(store.ids) else []
+            self._publish(segments + added, added=added)
+
+def _tier(size: int, merge_factor: int) -> int:
+    tier = 0
+    while size >= merge_factor:
+        size //= merge_factor
+        tier += 1
+    return tier
\ No newline at end of file
@@ -0,0 +1,226 @@
+import heapq
+from itertools import islice
+import multiprocessing
+from multiprocessing.connection import Connection
+import os.path
+import threading
+from typing import Any, Optional, Unpack
+import zlib
+
+from flowstack.artifacts import Artifact
+from flowstack.core.utils.constants import DEFAULT_SIMILARITY_TOP_K
+from flowstack.stores import VectorStore, VectorStoreQuery, VectorStoreQueryMode, VectorStoreQueryResult
+from flowstack.stores.vector.simple import SimpleVectorStore
+from flowstack.typing import Embedding, MetadataFilters
+
+SHARD_DIR_FORMAT = 'shard-{:05d}'
+# Modes whose scores only depend on the query and the row, so that the scores of partitions can be merged.
+MERGEABLE_QUERY_MODES = [VectorStoreQueryMode.DEFAULT, VectorStoreQueryMode.LATE_INTERACTION]
+
+class ShardedVectorStore(VectorStore):
+    """
+    Partitions artifacts by a hash of their id across num_shards worker processes, each serving one SimpleVectorStore,
+    so a query is scored on that many cores. Queries are sent to every shard before any reply is read,
+    and the per-shard top k lists are merged with a heap.
+
+    With path, shard i lives in path/shard-i and is loaded with SimpleVectorStore.from_persist_path,
+    memory-mapped or, with use_wal, behind its own write-ahead log. store_kwargs configure every shard.
+    Shards score independently, so only the modes in MERGEABLE_QUERY_MODES are supported:
+    BM25 statistics, hybrid fusion, MMR selection and learned-mode models would be per shard and not comparable.
+    """
+
+    def __init__(
+        self,
+        num_shards: Optional[int] = None,
+        path: Optional[str] = None,
+        use_wal: bool = False,
+        start_method: Optional[str] = None,
+        **store_kwargs
+    ):
+        self.num_shards = num_shards or os.cpu_count() or 1
+        self.path = path
+        self.use_wal = use_wal
+        self.store_kwargs = store_kwargs
+
+        context = multiprocessing.get_context(start_method)
+        self._lock = threading.Lock()
+        self._connections: list[Connection] = []
+        self._workers: list[multiprocessing.Process] = []
+        for shard in range(self.num_shards):
+            connection, worker_connection = context.Pipe()
+            worker = context.Process(
+                target=_serve,
+                args=(worker_connection, self._shard_path(path, shard), use_wal, store_kwargs),
+                daemon=True
+            )
+            worker.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._workers.append(worker)
+
+    def persist(self, path: Optional[str] = None, **kwargs) -> None:
+        """
+        Writes every shard to its directory under path, which defaults to the path the store was opened with.
+        """
+        path = path or self.path
+        if path is None:
+            raise ValueError('No path given to persist ShardedVectorStore to.')
+        self._scatter({
+            shard: ('persist', (self._shard_path(path, shard),), kwargs)
+            for shard in range(self.num_shards)
+        })
+
+    def close(self) -> None:
+        with self._lock:
+            for connection, worker in zip(self._connections, self._workers):
+                if worker.is_alive():
+                    connection.send(None)
+                    worker.join()
+                connection.close()
+            self._connections, self._workers = [], []
+
+    def retrieve(self, **query: Unpack[VectorStoreQuery]) -> VectorStoreQueryResult:
+        k = result_size(query, 'ShardedVectorStore')
+        results = self._broadcast('retrieve', **query)
+        return merge_results(results, k)
+
+    def retrieve_many(
+        self,
+        query_embeddings: list[Embedding],
+        **query: Unpack[VectorStoreQuery]
+    ) -> list[VectorStoreQueryResult]:
+        k = result_size(query, 'ShardedVectorStore')
+        if len(query_embeddings) == 0:
+            return []
+        shard_results = self._broadcast('retrieve_many', query_embeddings, **query)
+        return [merge_results(results, k) for results in zip(*shard_results)]
+
+    def insert(self, artifacts: list[Artifact], **kwargs) -> list[str]:
+        if len(artifacts) == 0:
+            return []
+        positions: dict[int, list[int]] = {}
+        for i, artifact in enumerate(artifacts):
+            positions.setdefault(self._shard_of(artifact.id), []).append(i)
+        # Per-artifact arguments are split along with the artifacts.
+        token_embeddings = kwargs.pop('token_embeddings', None)
+        results = self._scatter({
+            shard: (
+                'insert',
+                ([artifacts[i] for i in shard_positions],),
+                {
+                    **kwargs,
+                    **(
+                        {'token_embeddings': [token_embeddings[i] for i in shard_positions]}
+                        if token_embeddings is not None
+                        else {}
+                    )
+                }
+            )
+            for shard, shard_positions in positions.items()
+        })
+        ids: list[str] = [''] * len(artifacts)
+        for shard, shard_ids in results.items():
+            for i, artifact_id in zip(positions[shard], shard_ids):
+                ids[i] = artifact_id
+        return ids
+
+    def delete(
+        self,
+        artifact_ids: Optional[list[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        **kwargs
+    ) -> None:
+        if artifact_ids is None:
+            self._broadcast('delete', filters=filters, **kwargs)
+            return
+        shard_ids: dict[int, list[str]] = {}
+        for artifact_id in artifact_ids:
+            shard_ids.setdefault(self._shard_of(artifact_id), []).append(artifact_id)
+        self._scatter({
+            shard: ('delete', (), {'artifact_ids': ids, 'filters': filters, **kwargs})
+            for shard, ids in shard_ids.items()
+        })
+
+    def delete_refs(self, ref_ids: list[str], **kwargs) -> None:
+        self._broadcast('delete_refs', ref_ids, **kwargs)
+
+    def clear(self, **kwargs) -> None:
+        self._broadcast('clear', **kwargs)
+
+    def _shard_of(self, artifact_id: str) -> int:
+        # crc32 rather than hash, which is salted per process.
+        return zlib.crc32(artifact_id.encode('utf-8')) % self.num_shards
+
+    def _broadcast(self, method: str, *args, **kwargs) -> list[Any]:
+        results = self._scatter({shard: (method, args, kwargs) for shard in range(self.num_shards)})
+        return [results[shard] for shard in range(self.num_shards)]
+
+    def _scatter(self, requests: dict[int, tuple[str, tuple, dict[str, Any]]]) -> dict[int, Any]:
+        """
+        Sends every request before reading any reply, so the shards work in parallel.
+        Every reply is read even when one shard fails, keeping each pipe in step with its worker.
+        """
+        with self._lock:
+            if len(self._connections) == 0:
+                raise ValueError('ShardedVectorStore is closed.')
+            for shard, request in requests.items():
+                self._connections[shard].send(request)
+            replies = {shard: self._connections[shard].recv() for shard in requests}
+        for ok, result in replies.values():
+            if not ok:
+                raise result
+        return {shard: result for shard, (_, result) in replies.items()}
+
+    @staticmethod
+    def _shard_path(path: Optional[str], shard: int) -> Optional[str]:
+        return os.path.join(path, SHARD_DIR_FORMAT.format(shard)) if path is not None else None
+
+def _serve(
+    connection: Connection,
+    path: Optional[str],
+    use_wal: bool,
+    store_kwargs: dict[str, Any]
+) -> None:
+    if path is not None and (use_wal or os.path.exists(path)):
+        store = SimpleVectorStore.from_persist_path(path, use_wal=use_wal, **store_kwargs)
+    else:
+        store = SimpleVectorStore(**store_kwargs)
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        method, args, kwargs = request
+        try:
+            connection.send((True, getattr(store, method)(*args, **kwargs)))
+        except Exception as e:
+            connection.send((False, e))
+    store.close()
+    connection.close()
+
+def result_size(query: dict[str, Any], store_name: str) -> int:
+    """
+    Number of hits a query over partitions asks for. Raises ValueError for modes not in MERGEABLE_QUERY_MODES.
+    """
+    mode = query.get('mode') or VectorStoreQueryMode.DEFAULT
+    if mode not in MERGEABLE_QUERY_MODES:
+        raise ValueError(
+            f'Query mode {mode} is not supported in {store_name}, its scores are not comparable across partitions.'
+        )
+    return query.get('similarity_top_k') or DEFAULT_SIMILARITY_TOP_K
+
+def merge_results(results: list[VectorStoreQueryResult], k: int) -> VectorStoreQueryResult:
+    """
+    Merges results of disjoint partitions, each sorted best first, into the top k with a heap over their heads.
+    """
+    merged = list(islice(
+        heapq.merge(
+            *[zip(result.similarities or [], result.ids or []) for result in results],
+            key=lambda entry: entry[0],
+            reverse=True
+        ),
+        k
+    ))
+    return VectorStoreQueryResult(
+        ids=[artifact_id for _, artifact_id in merged],
+        similarities=[similarity for similarity, _ in merged]
+    )
\ No newline at end of file
@@ -1,29 +1,189 @@
+import copy
 from dataclasses import dataclass, field
 import json
+import logging
 import os.path
-from typing import Any, Optional, Unpack
+import threading
+from typing import Any, Optional, Self, Unpack
 
-from dataclasses_json import DataClassJsonMixin
+from dataclasses_json import DataClassJsonMixin, config
 import fsspec
+from fsspec.implementations.local import LocalFileSystem
+import numpy as np
 
-from flowstack.artifacts import Artifact
-from flowstack.stores import VectorStore, VectorStoreQuery, VectorStoreQueryResult
-from flowstack.typing import Embedding, MetadataFilters
+from flowstack.artifacts import Artifact, TextLike, Utf8Artifact
+from flowstack.core.utils.constants import DEFAULT_MMR_PREFETCH_FACTOR, DEFAULT_MMR_THRESHOLD, DEFAULT_SIMILARITY_TOP_K
+from flowstack.stores import VectorStore, VectorStoreQuery, VectorStoreQueryMode, VectorStoreQueryResult
+from flowstack.stores.filtering import MetadataColumns
+from flowstack.stores.metadata_index import HashIndex
+from flowstack.stores.vector.fusion import fuse_results
+from flowstack.stores.vector.index import VectorIndex, create_index, load_index
+from flowstack.stores.vector.late_interaction import LateInteractionIndex, load_late_interaction_index
+from flowstack.stores.vector.learners import DEFAULT_NUM_NEGATIVES, fit_linear_scorer
+from flowstack.stores.vector.planner import QueryPlan, QueryStrategy, plan_query
+from flowstack.stores.vector.quantization import Quantizer, create_quantizer, load_quantizer
+from flowstack.stores.vector.sparse import BM25Index, load_sparse_index
+from flowstack.stores.vector.utils import (
+    SimilarityMetric,
+    as_matrix,
+    maximal_marginal_relevance,
+    row_norms,
+    top_k_indices
+)
+from flowstack.stores.wal import DEFAULT_COMPACTION_THRESHOLD, LogRecord, LogStructuredStorage
+from flowstack.typing import Embedding, FilterOperator, MetadataFilters
+
+EMBEDDINGS_FILE = 'embeddings.npy'
+IDS_FILE = 'ids.json'
+REF_ID_MAPPING_FILE = 'ref_id_mapping.json'
+METADATA_FILE = 'metadata.json'
+
+SPARSE_QUERY_MODES = [VectorStoreQueryMode.TEXT_SEARCH, VectorStoreQueryMode.SPARSE]
+HYBRID_QUERY_MODES = [VectorStoreQueryMode.HYBRID, VectorStoreQueryMode.SEMANTIC_HYBRID]
+LEARNER_QUERY_MODES = [
+    VectorStoreQueryMode.LINEAR_REGRESSION,
+    VectorStoreQueryMode.LOGISTIC_REGRESSION,
+    VectorStoreQueryMode.SVM
+]
+
+logger = logging.getLogger(__name__)
+
+def _empty_embeddings() -> Embedding:
+    return np.empty((0, 0), dtype=np.float32)
 
 @dataclass
 class SimpleVectorStoreData(DataClassJsonMixin):
-    embeddings: dict[str, Embedding] = field(default_factory=dict)
+    embeddings: Embedding = field(
+        default_factory=_empty_embeddings,
+        metadata=config(
+            encoder=lambda embeddings: embeddings.tolist(),
+            decoder=lambda embeddings: as_matrix(embeddings) if len(embeddings) > 0 else _empty_embeddings()
+        )
+    )
+    ids: list[str] = field(default_factory=list)
     ref_id_mapping: dict[str, str] = field(default_factory=dict)
     metadata: dict[str, Any] = field(default_factory=dict)
+    index: Optional[VectorIndex] = field(default=None, metadata=config(exclude=lambda _: True))
+    quantizer: Optional[Quantizer] = field(default=None, metadata=config(exclude=lambda _: True))
+    sparse_index: Optional[BM25Index] = field(default=None, metadata=config(exclude=lambda _: True))
+    late_interaction_index: Optional[LateInteractionIndex] = field(default=None, metadata=config(exclude=lambda _: True))
 
 class SimpleVectorStore(VectorStore):
+    """
+    In-process vector store. Embeddings live in one contiguous float32 matrix,
+    with ids[row] giving the artifact id of each row.
+
+    With a quantization_config such as {'quantizer_type': 'PQ', 'm': 16}, queries are scored on compressed codes
+    held in memory and only a small candidate set is re-ranked against the full-precision matrix.
+    Combined with from_persist_path(mmap=True), the full-precision vectors then stay on disk.
+    The TRUNCATE (Matryoshka prefixes) and PCA quantizers, configured with a reduced dim, run the first pass
+    at that dimension instead, and rerank_factor in additional_kwargs trades speed for recall per query.
+    Metadata keys listed in metadata_indexes, such as {'doc_id': 'HASH', 'year': 'SORTED', 'title': 'PREFIX'},
+    get a secondary index kept in sync on every write, so selective filters on them skip the column scan.
+    With enable_sparse, the text of inserted artifacts also goes into a BM25 index for the TEXT_SEARCH, SPARSE,
+    HYBRID and SEMANTIC_HYBRID query modes. Hybrid results are fused with hybrid_ranker, RRFRanker or WeightedRanker.
+    With enable_late_interaction, insert also takes one matrix of token vectors per artifact as token_embeddings,
+    kept compressed in a LateInteractionIndex for the LATE_INTERACTION query mode.
+    """
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._dim
+
+    @property
+    def ids(self) -> list[str]:
+        return self._data.ids
+
     def __init__(
         self,
         data: Optional[SimpleVectorStoreData] = None,
-        fs: Optional[fsspec.AbstractFileSystem] = None
+        fs: Optional[fsspec.AbstractFileSystem] = None,
+        similarity_metric: str = SimilarityMetric.IP,
+        dim: Optional[int] = None,
+        index_config: dict = {},
+        search_config: dict = {},
+        quantization_config: dict = {},
+        metadata_indexes: dict[str, str] = {},
+        enable_sparse: bool = False,
+        sparse_config: dict = {},
+        hybrid_ranker: str = 'RRFRanker',
+        hybrid_ranker_params: dict = {},
+        enable_late_interaction: bool = False,
+        late_interaction_config: dict = {}
     ):
         self._data: SimpleVectorStoreData = data or SimpleVectorStoreData()
         self._fs: fsspec.AbstractFileSystem = fs or fsspec.filesystem('file')
+        self.similarity_metric = SimilarityMetric(similarity_metric.upper())
+        self.index_config = index_config
+        self.search_config = search_config
+        self.quantization_config = quantization_config
+        self.metadata_indexes = metadata_indexes
+        self.enable_sparse = enable_sparse
+        self.sparse_config = sparse_config
+        self.hybrid_ranker = hybrid_ranker
+        self.hybrid_ranker_params = hybrid_ranker_params
+        self.enable_late_interaction = enable_late_interaction
+        self.late_interaction_config = late_interaction_config
+
+        embeddings = self._data.embeddings
+        if embeddings.size == 0 and len(self._data.ids) == 0:
+            embeddings = np.empty((0, dim or 0), dtype=np.float32)
+        if len(embeddings) != len(self._data.ids):
+            raise ValueError(
+                f'Number of embeddings ({len(embeddings)}) does not match number of ids ({len(self._data.ids)}).'
+            )
+        self._dim: Optional[int] = dim or (embeddings.shape[1] if len(embeddings) > 0 else None)
+        self._buffer: np.ndarray = (
+            embeddings
+            if embeddings.dtype == np.float32 and embeddings.flags.c_contiguous
+            else np.ascontiguousarray(embeddings, dtype=np.float32)
+        )
+        self._size: int = len(embeddings)
+        # Row norms are only needed for COSINE and L2, and are computed on first use
+        # so that loading a memory-mapped store does not read the whole matrix.
+        self._norms: Optional[np.ndarray] = None
+        self._id_to_row: dict[str, int] = {
+            artifact_id: row for row, artifact_id in enumerate(self._data.ids)
+        }
+        # Filters are evaluated over a columnar copy of the metadata, kept in row order.
+        self._columns = MetadataColumns(indexes=metadata_indexes)
+        self._columns.set(
+            np.arange(self._size),
+            [self._data.metadata.get(artifact_id, {}) for artifact_id in self._data.ids]
+        )
+        self._ref_index = HashIndex()
+        self._ref_index.add(
+            [self._id_to_row[artifact_id] for artifact_id in self._data.ref_id_mapping],
+            list(self._data.ref_id_mapping.values())
+        )
+        self._sync_data()
+
+        if self._data.index is None:
+            self._data.index = create_index(index_config, metric=self.similarity_metric)
+            self._data.index.build(self._data.embeddings)
+        self._index: VectorIndex = self._data.index
+
+        if self._data.quantizer is None:
+            self._data.quantizer = create_quantizer(quantization_config)
+            if self._data.quantizer is not None:
+                self._data.quantizer.build(self._data.embeddings)
+        self._quantizer: Optional[Quantizer] = self._data.quantizer
+
+        # Texts are not kept by the store, so only artifacts inserted while enable_sparse is set are searchable by text.
+        if self._data.sparse_index is None and enable_sparse:
+            self._data.sparse_index = BM25Index(**sparse_config)
+        self._sparse_index: Optional[BM25Index] = self._data.sparse_index
+
+        if self._data.late_interaction_index is None and enable_late_interaction:
+            self._data.late_interaction_index = LateInteractionIndex(**late_interaction_config)
+        self._late_interaction_index: Optional[LateInteractionIndex] = self._data.late_interaction_index
+
+        # Set only on views returned by masked, whose queries leave out the tombstoned rows.
+        self._tombstones: Optional[np.ndarray] = None
+        self._live_rows: Optional[np.ndarray] = None
+
+        self._lock = threading.RLock()
+        self._storage: Optional[LogStructuredStorage[SimpleVectorStoreData]] = None
 
     def persist(
         self,
@@ -31,18 +191,330 @@ class SimpleVectorStore(VectorStore):
         fs: Optional[fsspec.AbstractFileSystem] = None,
         **kwargs
     ) -> None:
-        fs = fs or self._fs
-        dirname = os.path.dirname(path)
-        if not fs.exists(dirname):
-            fs.makedirs(dirname)
-        with fs.open(path, 'w') as f:
-            json.dump(self._data.to_dict(), f)
+        """
+        Writes the store to the directory at path. Embeddings are saved as a raw float32 .npy file
+        so that from_persist_path can memory-map them, ids and metadata go to small JSON sidecars.
+        If the store was loaded with use_wal and path is its own directory, the log is compacted instead.
+        """
+        if self._storage is not None and path == self._storage.path:
+            self.compact()
+            return
+        with self._lock:
+            _write_data(self._data, path, fs or self._fs)
+
+    @classmethod
+    def from_persist_path(
+        cls,
+        path: str,
+        fs: Optional[fsspec.AbstractFileSystem] = None,
+        mmap: bool = True,
+        use_wal: bool = False,
+        compaction_threshold: int = DEFAULT_COMPACTION_THRESHOLD,
+        **kwargs
+    ) -> Self:
+        """
+        Loads a store written by persist. On a local filesystem the embedding matrix is memory-mapped
+        copy-on-write, so queries can be served before the file has been read into memory.
+
+        With use_wal, path holds a base snapshot plus a write-ahead log. The log tail is replayed on load,
+        every later insert and delete is appended to it, and once it grows past compaction_threshold
+        bytes it is folded into a new snapshot in the background.
+        """
+        fs = fs or fsspec.filesystem('file')
+        if not use_wal:
+            return cls(data=_read_data(path, fs, mmap=mmap), fs=fs, **kwargs)
+
+        storage = LogStructuredStorage(
+            path,
+            write_snapshot=_write_data,
+            fs=fs,
+            compaction_threshold=compaction_threshold
+        )
+        snapshot_path = storage.snapshot_path
+        data = _read_data(snapshot_path, fs, mmap=mmap) if snapshot_path else None
+        store = cls(data=data, fs=fs, **kwargs)
+        for record in storage.replay():
+            store._apply(record)
+        store._storage = storage
+        return store
+
+    def build_index(self) -> None:
+        """
+        Rebuilds the index and quantizer from scratch, for example to retrain IVF centroids after the data has drifted.
+        """
+        with self._lock:
+            self._index.build(self._data.embeddings)
+            if self._quantizer is not None:
+                self._quantizer.build(self._data.embeddings)
+
+    def compact(self) -> None:
+        """
+        Folds the write-ahead log into a new base snapshot.
+        """
+        if self._storage is None:
+            raise ValueError('SimpleVectorStore has no write-ahead log, load it with from_persist_path(use_wal=True).')
+        self._storage.compact(self._snapshot)
+
+    def close(self) -> None:
+        if self._storage is not None:
+            self._storage.close()
 
-    def retrieve(self, **query: Unpack[VectorStoreQuery]) -> VectorStoreQueryResult:
-        pass
+    def copy(self) -> Self:
+        """
+        Returns an independent store with the same rows and configuration, without a write-ahead log.
+        """
+        return type(self)(data=self._snapshot(), fs=self._fs, **self._config())
+
+    @classmethod
+    def merge(cls, stores: list['SimpleVectorStore'], **kwargs) -> Self:
+        """
+        Builds one store, configured by kwargs, from the rows of stores, which must not share ids.
+        The index and quantizer are built from the concatenated embeddings, BM25 and late-interaction
+        postings are carried over with their rows shifted.
+        """
+        stores = [store for store in stores if store._size > 0]
+        if len(stores) == 0:
+            return cls(**kwargs)
+        merged = cls(
+            data=SimpleVectorStoreData(
+                embeddings=np.concatenate([store._data.embeddings for store in stores]),
+                ids=[artifact_id for store in stores for artifact_id in store._data.ids],
+                ref_id_mapping={
+                    artifact_id: ref_id
+                    for store in stores
+                    for artifact_id, ref_id in store._data.ref_id_mapping.items()
+                },
+                metadata={
+                    artifact_id: metadata
+                    for store in stores
+                    for artifact_id, metadata in store._data.metadata.items()
+                }
+            ),
+            **kwargs
+        )
+        offsets = np.cumsum([0] + [store._size for store in stores]).tolist()
+        for store, offset in zip(stores, offsets):
+            if merged._sparse_index is not None and store._sparse_index is not None:
+                merged._sparse_index.extend(store._sparse_index, offset)
+            if merged._late_interaction_index is not None and store._late_interaction_index is not None:
+                merged._late_interaction_index.extend(store._late_interaction_index, offset)
+        return merged
+
+    def warm(self) -> None:
+        """
+        Builds what queries otherwise build on first use, row norms and sorted postings,
+        so that queries against a store that is no longer written to only read and can run concurrently.
+        """
+        with self._lock:
+            self._row_norms()
+            if self._sparse_index is not None:
+                self._sparse_index._merge()
+            if self._late_interaction_index is not None:
+                self._late_interaction_index._postings()
+
+    def masked(self, tombstones: np.ndarray) -> Self:
+        """
+        Returns a read-only view that shares everything with the store but leaves the rows set in tombstones,
+        a boolean mask over the rows, out of every query. The view is only valid while the store is not written to.
+        """
+        view = copy.copy(self)
+        view._tombstones = tombstones
+        view._live_rows = np.flatnonzero(~tombstones[:self._size])
+        return view
+
+    def retrieve(
+        self,
+        mode: str = VectorStoreQueryMode.DEFAULT,
+        query_value: Optional[TextLike] = None,
+        query_embedding: Optional[Embedding] = None,
+        ref_artifact_ids: Optional[list[str]] = None,
+        artifact_ids: Optional[list[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        similarity_top_k: Optional[int] = None,
+        sparse_top_k: Optional[int] = None,
+        hybrid_top_k: Optional[int] = None,
+        mmr_threshold: Optional[float] = None,
+        additional_kwargs: Optional[dict[str, Any]] = None,
+        **query: Unpack[VectorStoreQuery]
+    ) -> VectorStoreQueryResult:
+        """
+        MMR over-fetches similarity_top_k * mmr_prefetch_factor rows, or mmr_prefetch_k rows, set in additional_kwargs,
+        then re-selects similarity_top_k of them, trading relevance for diversity as mmr_threshold goes from 1 to 0.
+        The similarities of an MMR result are the MMR scores.
+        LINEAR_REGRESSION, LOGISTIC_REGRESSION and SVM fit a linear model on the query embedding
+        and the positive_ids in additional_kwargs against num_negatives rows sampled from the candidates,
+        then rank the candidates by its decision value.
+        LATE_INTERACTION takes a matrix of query token vectors as query_embedding and ranks rows by MaxSim,
+        nprobe and rerank_factor in additional_kwargs tune its candidate generation.
+        """
+        if mode == VectorStoreQueryMode.LATE_INTERACTION:
+            return self._retrieve_late_interaction(
+                query_embedding,
+                ref_artifact_ids,
+                artifact_ids,
+                filters,
+                similarity_top_k or DEFAULT_SIMILARITY_TOP_K,
+                additional_kwargs
+            )
+        if mode in LEARNER_QUERY_MODES:
+            return self._retrieve_learner(
+                mode,
+                query_embedding,
+                ref_artifact_ids,
+                artifact_ids,
+                filters,
+                similarity_top_k or DEFAULT_SIMILARITY_TOP_K,
+                additional_kwargs
+            )
+        if mode == VectorStoreQueryMode.MMR:
+            return self._retrieve_mmr(
+                query_embedding,
+                ref_artifact_ids,
+                artifact_ids,
+                filters,
+                similarity_top_k or DEFAULT_SIMILARITY_TOP_K,
+                mmr_threshold,
+                additional_kwargs
+            )
+        if mode in SPARSE_QUERY_MODES or mode in HYBRID_QUERY_MODES:
+            return self._retrieve_sparse(
+                mode,
+                query_value,
+                query_embedding,
+                ref_artifact_ids,
+                artifact_ids,
+                filters,
+                similarity_top_k or DEFAULT_SIMILARITY_TOP_K,
+                sparse_top_k,
+                hybrid_top_k,
+                additional_kwargs
+            )
+        if mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f'Query mode {mode} is not supported in SimpleVectorStore.')
+        if query_embedding is None:
+            raise ValueError('Query embedding is not set.')
+        return self.retrieve_many(
+            [query_embedding],
+            mode=mode,
+            ref_artifact_ids=ref_artifact_ids,
+            artifact_ids=artifact_ids,
+            filters=filters,
+            similarity_top_k=similarity_top_k,
+            additional_kwargs=additional_kwargs
+        )[0]
+
+    def retrieve_many(
+        self,
+        query_embeddings: list[Embedding],
+        mode: str = VectorStoreQueryMode.DEFAULT,
+        ref_artifact_ids: Optional[list[str]] = None,
+        artifact_ids: Optional[list[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        similarity_top_k: Optional[int] = None,
+        additional_kwargs: Optional[dict[str, Any]] = None,
+        **query: Unpack[VectorStoreQuery]
+    ) -> list[VectorStoreQueryResult]:
+        """
+        Filters are resolved once for the whole batch, and with a FLAT index
+        all queries are scored against the candidate rows with one matrix product.
+        Restricted queries are planned by plan_query, see explain.
+        """
+        if mode != VectorStoreQueryMode.DEFAULT:
+            return super().retrieve_many(
+                query_embeddings,
+                mode=mode,
+                ref_artifact_ids=ref_artifact_ids,
+                artifact_ids=artifact_ids,
+                filters=filters,
+                similarity_top_k=similarity_top_k,
+                additional_kwargs=additional_kwargs,
+                **query
+            )
+        if len(query_embeddings) == 0:
+            return []
+
+        similarity_top_k = similarity_top_k or DEFAULT_SIMILARITY_TOP_K
+        if self._size == 0:
+            return [VectorStoreQueryResult(ids=[], similarities=[]) for _ in query_embeddings]
+
+        queries = self._as_queries(query_embeddings)
+
+        # Search parameters, such as nprobe for IVF_FLAT, ef for HNSW or rerank_factor, can be tuned per query,
+        # and filter_strategy forces PRE_FILTER or POST_FILTER.
+        params = {**self.search_config, **(additional_kwargs or {})}
+        rows = self._candidate_rows(ref_artifact_ids, artifact_ids, filters)
+        plan = self._plan(rows, similarity_top_k, params)
+        results = self._search(queries, rows, similarity_top_k, plan, params)
+
+        return [self._to_result(top_rows, top_scores) for top_rows, top_scores in results]
+
+    def explain(
+        self,
+        ref_artifact_ids: Optional[list[str]] = None,
+        artifact_ids: Optional[list[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        similarity_top_k: Optional[int] = None,
+        additional_kwargs: Optional[dict[str, Any]] = None,
+        **query: Unpack[VectorStoreQuery]
+    ) -> QueryPlan:
+        """
+        Returns the plan retrieve would run for a query, without searching.
+        """
+        rows = self._candidate_rows(ref_artifact_ids, artifact_ids, filters)
+        return self._plan(
+            rows,
+            similarity_top_k or DEFAULT_SIMILARITY_TOP_K,
+            {**self.search_config, **(additional_kwargs or {})}
+        )
+
+    def select_rows(
+        self,
+        ref_artifact_ids: Optional[list[str]] = None,
+        artifact_ids: Optional[list[str]] = None,
+        filters: Optional[MetadataFilters] = None
+    ) -> np.ndarray:
+        """
+        Returns the sorted rows a query with these restrictions would search, every row if there is none.
+        """
+        rows = self._candidate_rows(ref_artifact_ids, artifact_ids, filters)
+        return rows if rows is not None else np.arange(self._size)
+
+    def insert(
+        self,
+        artifacts: list[Artifact],
+        token_embeddings: Optional[list[Optional[Embedding]]] = None,
+        **kwargs
+    ) -> list[str]:
+        if len(artifacts) == 0:
+            return []
+        for artifact in artifacts:
+            if artifact.embedding is None:
+                raise ValueError(f'Artifact {artifact.id} does not have an embedding.')
+        if token_embeddings is not None and len(token_embeddings) != len(artifacts):
+            raise ValueError(f'Got {len(token_embeddings)} token embeddings for {len(artifacts)} artifacts.')
 
-    def insert(self, artifacts: list[Artifact], **kwargs) -> list[str]:
-        pass
+        ids = [artifact.id for artifact in artifacts]
+        ref_ids = [artifact.ref_id for artifact in artifacts]
+        metadata = [_filterable_metadata(artifact) for artifact in artifacts]
+        embeddings = as_matrix([artifact.embedding for artifact in artifacts])
+        texts = [str(artifact) if isinstance(artifact, Utf8Artifact) else None for artifact in artifacts]
+        tokens = [
+            as_matrix(matrix) if matrix is not None else None
+            for matrix in token_embeddings or [None] * len(artifacts)
+        ]
+        with self._lock:
+            self._upsert(ids, embeddings, ref_ids, metadata, texts, tokens)
+            log_args: dict[str, Any] = {'ids': ids, 'ref_ids': ref_ids, 'metadata': metadata}
+            data = embeddings.tobytes()
+            if self._sparse_index is not None:
+                log_args['texts'] = texts
+            if self._late_interaction_index is not None:
+                # Token vectors follow the embeddings in the record data, token_counts splits them per artifact.
+                log_args['token_counts'] = [len(matrix) if matrix is not None else None for matrix in tokens]
+                log_args['token_dim'] = next((matrix.shape[1] for matrix in tokens if matrix is not None), 0)
+                data += b''.join(matrix.tobytes() for matrix in tokens if matrix is not None)
+            self._log('insert', log_args, data)
+        return ids
 
     def delete(
         self,
@@ -50,10 +522,527 @@ class SimpleVectorStore(VectorStore):
         filters: Optional[MetadataFilters] = None,
         **kwargs
     ) -> None:
-        pass
+        if artifact_ids is None and filters is None:
+            return
+        with self._lock:
+            rows = self._candidate_rows(None, artifact_ids, filters)
+            if rows is not None:
+                self._delete_rows(rows)
 
     def delete_refs(self, ref_ids: list[str], **kwargs) -> None:
-        pass
+        with self._lock:
+            rows = self._ref_rows(ref_ids)
+            if len(rows) > 0:
+                self._delete_rows(rows)
 
     def clear(self, **kwargs) -> None:
-        pass
\ No newline at end of file
+        with self._lock:
+            self._clear()
+            self._log('clear', {})
+
+    def _upsert(
+        self,
+        ids: list[str],
+        embeddings: np.ndarray,
+        ref_ids: list[Optional[str]],
+        metadata: list[dict[str, Any]],
+        texts: Optional[list[Optional[str]]] = None,
+        token_embeddings: Optional[list[Optional[np.ndarray]]] = None
+    ) -> None:
+        if self._dim is None:
+            self._dim = embeddings.shape[1]
+            self._buffer = np.empty((0, self._dim), dtype=np.float32)
+        if embeddings.shape[1] != self._dim:
+            raise ValueError(f'Embeddings have dimension {embeddings.shape[1]}, expected {self._dim}.')
+
+        # Existing ids are overwritten in place, new ids are appended after the last row.
+        rows = np.empty(len(ids), dtype=np.int64)
+        new_ids: list[str] = []
+        for i, artifact_id in enumerate(ids):
+            row = self._id_to_row.get(artifact_id)
+            if row is None:
+                row = self._size + len(new_ids)
+                self._id_to_row[artifact_id] = row
+                new_ids.append(artifact_id)
+            rows[i] = row
+            if ref_ids[i] is not None:
+                self._data.ref_id_mapping[artifact_id] = ref_ids[i]
+            else:
+                self._data.ref_id_mapping.pop(artifact_id, None)
+            self._data.metadata[artifact_id] = metadata[i]
+
+        self._reserve(self._size + len(new_ids))
+        self._data.ids.extend(new_ids)
+        self._size += len(new_ids)
+        self._buffer[rows] = embeddings
+        if self._norms is not None:
+            self._norms = np.concatenate([self._norms, np.zeros(len(new_ids), dtype=np.float32)])
+            self._norms[rows] = row_norms(embeddings)
+        self._columns.set(rows, metadata)
+        row_refs = {row: ref_id for row, ref_id in zip(rows.tolist(), ref_ids) if ref_id is not None}
+        self._ref_index.remove(rows)
+        self._ref_index.add(list(row_refs.keys()), list(row_refs.values()))
+        if self._sparse_index is not None:
+            self._sparse_index.add(rows, texts or [None] * len(rows))
+        if self._late_interaction_index is not None:
+            self._late_interaction_index.add(rows, token_embeddings or [None] * len(rows))
+        self._sync_data()
+        self._index.add(self._data.embeddings, rows)
+        if self._quantizer is not None:
+            self._quantizer.add(self._data.embeddings, rows)
+
+    def _clear(self) -> None:
+        self._index.reset()
+        if self._quantizer is not None:
+            self._quantizer.reset()
+        self._data = SimpleVectorStoreData(
+            embeddings=np.empty((0, self._dim or 0), dtype=np.float32),
+            index=self._index,
+            quantizer=self._quantizer
+        )
+        self._buffer = self._data.embeddings
+        self._size = 0
+        self._norms = None
+        self._id_to_row = {}
+        self._columns.reset()
+        self._ref_index.reset()
+        if self._sparse_index is not None:
+            self._sparse_index.reset()
+        if self._late_interaction_index is not None:
+            self._late_interaction_index.reset()
+
+    def _apply(self, record: LogRecord) -> None:
+        match record.operation:
+            case 'insert':
+                ids = record.args['ids']
+                values = np.frombuffer(record.data, dtype=np.float32)
+                token_counts = record.args.get('token_counts')
+                tokens: Optional[list[Optional[np.ndarray]]] = None
+                if token_counts is not None:
+                    token_dim = record.args['token_dim']
+                    offsets = np.cumsum([0] + [count or 0 for count in token_counts]) * token_dim
+                    values, token_values = values[:len(values) - offsets[-1]], values[len(values) - offsets[-1]:]
+                    tokens = [
+                        token_values[start:end].reshape(-1, token_dim) if count is not None else None
+                        for count, start, end in zip(token_counts, offsets[:-1], offsets[1:])
+                    ]
+                self._upsert(
+                    ids,
+                    values.reshape(len(ids), -1),
+                    record.args['ref_ids'],
+                    record.args['metadata'],
+                    record.args.get('texts'),
+                    tokens
+                )
+            case 'delete':
+                self._delete_rows(self._id_rows(record.args['ids']), log=False)
+            case 'clear':
+                self._clear()
+            case _:
+                raise ValueError(f'Unknown log operation: {record.operation}.')
+
+    def _log(self, operation: str, args: dict[str, Any], data: bytes = b'') -> None:
+        if self._storage is None:
+            return
+        self._storage.append(operation, args, data)
+        if self._storage.needs_compaction:
+            self._storage.compact_in_background(self._snapshot)
+
+    def _snapshot(self) -> SimpleVectorStoreData:
+        with self._lock:
+            return SimpleVectorStoreData(
+                embeddings=self._data.embeddings.copy(),
+                ids=list(self._data.ids),
+                ref_id_mapping=dict(self._data.ref_id_mapping),
+                metadata=dict(self._data.metadata),
+                index=self._index.copy(),
+                quantizer=self._quantizer.copy() if self._quantizer is not None else None,
+                sparse_index=self._sparse_index.copy() if self._sparse_index is not None else None,
+                late_interaction_index=(
+                    self._late_interaction_index.copy() if self._late_interaction_index is not None else None
+                )
+            )
+
+    def _retrieve_sparse(
+        self,
+        mode: str,
+        query_value: Optional[TextLike],
+        query_embedding: Optional[Embedding],
+        ref_artifact_ids: Optional[list[str]],
+        artifact_ids: Optional[list[str]],
+        filters: Optional[MetadataFilters],
+        similarity_top_k: int,
+        sparse_top_k: Optional[int],
+        hybrid_top_k: Optional[int],
+        additional_kwargs: Optional[dict[str, Any]]
+    ) -> VectorStoreQueryResult:
+        if self._sparse_index is None:
+            raise ValueError(f'Query mode is {mode}, but enable_sparse is False.')
+        if query_value is None:
+            raise ValueError(f'Query mode is {mode}, but query was not provided.')
+        if mode in HYBRID_QUERY_MODES and query_embedding is None:
+            raise ValueError('Query embedding is not set.')
+        if self._size == 0:
+            return VectorStoreQueryResult(ids=[], similarities=[])
+
+        rows = self._candidate_rows(ref_artifact_ids, artifact_ids, filters)
+        sparse_result = self._sparse_index.search(
+            str(query_value),
+            sparse_top_k or similarity_top_k,
+            self._size,
+            rows=rows
+        )
+        if mode in SPARSE_QUERY_MODES:
+            return self._to_result(*sparse_result)
+
+        # Both rankings see the same candidate rows, and are fused client-side.
+        params = {**self.search_config, **(additional_kwargs or {})}
+        queries = self._as_queries([query_embedding])
+        plan = self._plan(rows, similarity_top_k, params)
+        dense_result = self._search(queries, rows, similarity_top_k, plan, params)[0]
+        return self._to_result(*fuse_results(
+            [dense_result, sparse_result],
+            hybrid_top_k or similarity_top_k,
+            ranker=self.hybrid_ranker,
+            ranker_params=self.hybrid_ranker_params
+        ))
+
+    def _retrieve_mmr(
+        self,
+        query_embedding: Optional[Embedding],
+        ref_artifact_ids: Optional[list[str]],
+        artifact_ids: Optional[list[str]],
+        filters: Optional[MetadataFilters],
+        similarity_top_k: int,
+        mmr_threshold: Optional[float],
+        additional_kwargs: Optional[dict[str, Any]]
+    ) -> VectorStoreQueryResult:
+        if query_embedding is None:
+            raise ValueError('Query embedding is not set.')
+        if self._size == 0:
+            return VectorStoreQueryResult(ids=[], similarities=[])
+
+        params = {**self.search_config, **(additional_kwargs or {})}
+        prefetch_k = params.pop('mmr_prefetch_k', None) or similarity_top_k * params.pop(
+            'mmr_prefetch_factor',
+            DEFAULT_MMR_PREFETCH_FACTOR
+        )
+        queries = self._as_queries([query_embedding])
+        rows = self._candidate_rows(ref_artifact_ids, artifact_ids, filters)
+        plan = self._plan(rows, prefetch_k, params)
+        candidates, _ = self._search(queries, rows, prefetch_k, plan, params)[0]
+        norms = self._row_norms(candidates)
+        picked, scores = maximal_marginal_relevance(
+            queries[0],
+            self._data.embeddings[candidates],
+            similarity_top_k,
+            mmr_threshold=mmr_threshold if mmr_threshold is not None else DEFAULT_MMR_THRESHOLD,
+            metric=self.similarity_metric,
+            norms=norms
+        )
+        return self._to_result(candidates[picked], scores)
+
+    def _retrieve_learner(
+        self,
+        mode: str,
+        query_embedding: Optional[Embedding],
+        ref_artifact_ids: Optional[list[str]],
+        artifact_ids: Optional[list[str]],
+        filters: Optional[MetadataFilters],
+        similarity_top_k: int,
+        additional_kwargs: Optional[dict[str, Any]]
+    ) -> VectorStoreQueryResult:
+        params = additional_kwargs or {}
+        positive_rows = self._id_rows(params.get('positive_ids', []))
+        if query_embedding is None and len(positive_rows) == 0:
+            raise ValueError(f'Query mode {mode} needs a query embedding or positive_ids.')
+        if self._size == 0:
+            return VectorStoreQueryResult(ids=[], similarities=[])
+
+        rows = self._candidate_rows(ref_artifact_ids, artifact_ids, filters)
+        pool_size = len(rows) if rows is not None else self._size
+        # Training only ever sees the positives and a bounded sample of negatives, whatever the size of the store.
+        rng = np.random.default_rng(params.get('seed', 0))
+        num_negatives = min(params.get('num_negatives', DEFAULT_NUM_NEGATIVES), pool_size)
+        sample = rng.choice(pool_size, size=min(num_negatives + len(positive_rows), pool_size), replace=False)
+        negative_rows = np.sort(rows[sample] if rows is not None else sample)
+        negative_rows = negative_rows[~np.isin(negative_rows, positive_rows)][:num_negatives]
+
+        positives = self._data.embeddings[positive_rows]
+        if query_embedding is not None:
+            positives = np.concatenate([self._as_queries([query_embedding]), positives])
+        negatives = self._data.embeddings[negative_rows]
+        if self.similarity_metric == SimilarityMetric.COSINE:
+            positives = positives / np.maximum(row_norms(positives), 1e-12)[:, None]
+            negatives = negatives / np.maximum(self._row_norms(negative_rows), 1e-12)[:, None]
+        weights, bias = fit_linear_scorer(
+            positives,
+            negatives,
+            mode,
+            **{key: params[key] for key in ['regularization', 'max_iter'] if key in params}
+        )
+
+        matrix = self._data.embeddings if rows is None else self._data.embeddings[rows]
+        scores = matrix @ weights
+        if self.similarity_metric == SimilarityMetric.COSINE:
+            scores /= np.maximum(self._row_norms(rows), 1e-12)
+        scores += bias
+        top = top_k_indices(scores, similarity_top_k)
+        return self._to_result(top if rows is None else rows[top], scores[top])
+
+    def _retrieve_late_interaction(
+        self,
+        query_embedding: Optional[Embedding],
+        ref_artifact_ids: Optional[list[str]],
+        artifact_ids: Optional[list[str]],
+        filters: Optional[MetadataFilters],
+        similarity_top_k: int,
+        additional_kwargs: Optional[dict[str, Any]]
+    ) -> VectorStoreQueryResult:
+        if self._late_interaction_index is None:
+            raise ValueError('Query mode is late_interaction, but enable_late_interaction is False.')
+        if query_embedding is None:
+            raise ValueError('Query embedding is not set.')
+        if self._size == 0:
+            return VectorStoreQueryResult(ids=[], similarities=[])
+
+        params = additional_kwargs or {}
+        rows = self._candidate_rows(ref_artifact_ids, artifact_ids, filters)
+        return self._to_result(*self._late_interaction_index.search(
+            query_embedding,
+            similarity_top_k,
+            rows=rows,
+            **{key: params[key] for key in ['nprobe', 'rerank_factor'] if key in params}
+        ))
+
+    def _config(self) -> dict[str, Any]:
+        return {
+            'similarity_metric': self.similarity_metric,
+            'dim': self._dim,
+            'index_config': self.index_config,
+            'search_config': self.search_config,
+            'quantization_config': self.quantization_config,
+            'metadata_indexes': self.metadata_indexes,
+            'enable_sparse': self.enable_sparse,
+            'sparse_config': self.sparse_config,
+            'hybrid_ranker': self.hybrid_ranker,
+            'hybrid_ranker_params': self.hybrid_ranker_params,
+            'enable_late_interaction': self.enable_late_interaction,
+            'late_interaction_config': self.late_interaction_config
+        }
+
+    def _as_queries(self, query_embeddings: list[Embedding]) -> np.ndarray:
+        queries = as_matrix(query_embeddings)
+        if queries.shape[1] != self._dim:
+            raise ValueError(f'Query embedding has dimension {queries.shape[1]}, expected {self._dim}.')
+        return queries
+
+    def _to_result(self, rows: np.ndarray, scores: np.ndarray) -> VectorStoreQueryResult:
+        return VectorStoreQueryResult(
+            ids=[self._data.ids[row] for row in rows],
+            similarities=scores.tolist()
+        )
+
+    def _plan(self, rows: Optional[np.ndarray], k: int, params: dict[str, Any]) -> QueryPlan:
+        plan = plan_query(self._index, self._size, len(rows) if rows is not None else None, k, **params)
+        logger.debug(f'Query plan: {plan}.')
+        return plan
+
+    def _search(
+        self,
+        queries: np.ndarray,
+        rows: Optional[np.ndarray],
+        k: int,
+        plan: QueryPlan,
+        params: dict[str, Any]
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        params = {key: value for key, value in params.items() if key != 'filter_strategy'}
+        norms = self._row_norms()
+        if plan.strategy == QueryStrategy.PRE_FILTER:
+            return self._index.exact_search_many(
+                self._data.embeddings,
+                queries,
+                k,
+                rows=rows,
+                norms=norms,
+                quantizer=self._quantizer,
+                rerank_factor=params.get('rerank_factor')
+            )
+
+        if plan.strategy == QueryStrategy.POST_FILTER:
+            params = {**params, **plan.search_params}
+        results = self._index.search_many(
+            self._data.embeddings,
+            queries,
+            k,
+            rows=rows,
+            norms=norms,
+            quantizer=self._quantizer,
+            **params
+        )
+        if rows is None:
+            return results
+
+        # The filter can be correlated with the query, so queries that post-filtering left short are searched exactly.
+        short = [i for i, (top_rows, _) in enumerate(results) if len(top_rows) < min(k, len(rows))]
+        if len(short) > 0:
+            exact = self._index.exact_search_many(
+                self._data.embeddings,
+                queries[short],
+                k,
+                rows=rows,
+                norms=norms,
+                quantizer=self._quantizer,
+                rerank_factor=params.get('rerank_factor')
+            )
+            for i, result in zip(short, exact):
+                results[i] = result
+        return results
+
+    def _candidate_rows(
+        self,
+        ref_artifact_ids: Optional[list[str]],
+        artifact_ids: Optional[list[str]],
+        filters: Optional[MetadataFilters]
+    ) -> Optional[np.ndarray]:
+        """
+        Returns the sorted rows that satisfy every restriction, or None if the query is unrestricted.
+        """
+        rows: Optional[np.ndarray] = None
+
+        if artifact_ids is not None:
+            rows = np.unique(self._id_rows(artifact_ids))
+
+        if ref_artifact_ids is not None:
+            ref_rows = self._ref_rows(ref_artifact_ids)
+            rows = ref_rows if rows is None else np.intersect1d(rows, ref_rows, assume_unique=True)
+
+        if filters is not None:
+            filter_rows = self._columns.select(filters)
+            rows = filter_rows if rows is None else np.intersect1d(rows, filter_rows, assume_unique=True)
+
+        if self._tombstones is not None:
+            rows = self._live_rows if rows is None else rows[~self._tombstones[rows]]
+
+        return rows
+
+    def _id_rows(self, artifact_ids: list[str]) -> np.ndarray:
+        return np.fromiter(
+            (self._id_to_row[artifact_id] for artifact_id in artifact_ids if artifact_id in self._id_to_row),
+            dtype=np.int64
+        )
+
+    def _ref_rows(self, ref_ids: list[str]) -> np.ndarray:
+        return self._ref_index.lookup(FilterOperator.IN, ref_ids)
+
+    def _delete_rows(self, rows: np.ndarray, log: bool = True) -> None:
+        keep = np.ones(self._size, dtype=bool)
+        keep[rows] = False
+        deleted_ids = [self._data.ids[row] for row in np.flatnonzero(~keep)]
+        if len(deleted_ids) == 0:
+            return
+
+        # Compact the surviving rows to the front of the buffer in one vectorized copy.
+        kept_rows = np.flatnonzero(keep)
+        self._buffer[:len(kept_rows)] = self._buffer[kept_rows]
+        if self._norms is not None:
+            self._norms = self._norms[kept_rows]
+        self._data.ids = [self._data.ids[row] for row in kept_rows]
+        self._size = len(kept_rows)
+        for artifact_id in deleted_ids:
+            self._data.ref_id_mapping.pop(artifact_id, None)
+            self._data.metadata.pop(artifact_id, None)
+        self._id_to_row = {artifact_id: row for row, artifact_id in enumerate(self._data.ids)}
+        self._ref_index.compact(kept_rows, len(keep))
+        self._columns.compact(kept_rows)
+        self._sync_data()
+        self._index.compact(self._data.embeddings, kept_rows)
+        if self._quantizer is not None:
+            self._quantizer.compact(kept_rows)
+        if self._sparse_index is not None:
+            self._sparse_index.compact(kept_rows)
+        if self._late_interaction_index is not None:
+            self._late_interaction_index.compact(kept_rows)
+        if log:
+            self._log('delete', {'ids': deleted_ids})
+
+    def _row_norms(self, rows: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        if self.similarity_metric == SimilarityMetric.IP:
+            return None
+        if self._quantizer is not None:
+            return self._quantizer.norms if rows is None else self._quantizer.norms[rows]
+        if self._norms is None:
+            self._norms = row_norms(self._data.embeddings)
+        return self._norms if rows is None else self._norms[rows]
+
+    def _reserve(self, size: int) -> None:
+        capacity = self._buffer.shape[0]
+        if size <= capacity:
+            return
+        buffer = np.empty((max(size, 2 * capacity, 16), self._dim), dtype=np.float32)
+        buffer[:self._size] = self._buffer[:self._size]
+        self._buffer = buffer
+
+    def _sync_data(self) -> None:
+        self._data.embeddings = self._buffer[:self._size]
+
+def _write_data(data: SimpleVectorStoreData, path: str, fs: fsspec.AbstractFileSystem) -> None:
+    if not fs.exists(path):
+        fs.makedirs(path)
+    # The store may be memory-mapping the very file it is saved to, see _read_data. Truncating that file in place
+    # would pull the pages out from under the map, so the array is written next to it and renamed over it,
+    # which leaves the mapped inode intact.
+    embeddings_path = os.path.join(path, EMBEDDINGS_FILE)
+    with fs.open(f'{embeddings_path}.tmp', 'wb') as f:
+        np.save(f, data.embeddings, allow_pickle=False)
+    fs.mv(f'{embeddings_path}.tmp', embeddings_path)
+    with fs.open(os.path.join(path, IDS_FILE), 'w') as f:
+        json.dump(data.ids, f)
+    with fs.open(os.path.join(path, REF_ID_MAPPING_FILE), 'w') as f:
+        json.dump(data.ref_id_mapping, f)
+    with fs.open(os.path.join(path, METADATA_FILE), 'w') as f:
+        json.dump(data.metadata, f)
+    if data.index is not None:
+        data.index.save(path, fs)
+    if data.quantizer is not None:
+        data.quantizer.save(path, fs)
+    if data.sparse_index is not None:
+        data.sparse_index.save(path, fs)
+    if data.late_interaction_index is not None:
+        data.late_interaction_index.save(path, fs)
+
+def _read_data(path: str, fs: fsspec.AbstractFileSystem, mmap: bool = True) -> SimpleVectorStoreData:
+    embeddings_path = os.path.join(path, EMBEDDINGS_FILE)
+    if mmap and isinstance(fs, LocalFileSystem):
+        embeddings = np.load(fs._strip_protocol(embeddings_path), mmap_mode='c', allow_pickle=False)
+    else:
+        with fs.open(embeddings_path, 'rb') as f:
+            embeddings = np.load(f, allow_pickle=False)
+    with fs.open(os.path.join(path, IDS_FILE), 'r') as f:
+        ids = json.load(f)
+    with fs.open(os.path.join(path, REF_ID_MAPPING_FILE), 'r') as f:
+        ref_id_mapping = json.load(f)
+    with fs.open(os.path.join(path, METADATA_FILE), 'r') as f:
+        metadata = json.load(f)
+    return SimpleVectorStoreData(
+        embeddings=embeddings,
+        ids=ids,
+        ref_id_mapping=ref_id_mapping,
+        metadata=metadata,
+        index=load_index(path, fs),
+        quantizer=load_quantizer(path, fs),
+        sparse_index=load_sparse_index(path, fs),
+        late_interaction_index=load_late_interaction_index(path, fs)
+    )
+
+def _filterable_metadata(artifact: Artifact) -> dict[str, Any]:
+    return {
+        key: value
+        for key, value in artifact.metadata.items()
+        if _is_filterable(value)
+    }
+
+def _is_filterable(value: Any) -> bool:
+    if isinstance(value, (str, int, float, bool)):
+        return True
+    return isinstance(value, list) and all(isinstance(item, (str, int, float, bool)) for item in value)
\ No newline at end of file
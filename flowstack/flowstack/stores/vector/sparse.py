@@ -0,0 +1,281 @@
+import copy
+import json
+import os.path
+import re
+from typing import Optional, Self
+
+import fsspec
+import numpy as np
+
+from flowstack.stores.vector.utils import top_k_indices
+
+SPARSE_CONFIG_FILE = 'sparse.json'
+SPARSE_ARRAYS_FILE = 'sparse.npz'
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+DEFAULT_DELTA_RATIO = 0.1
+MIN_DELTA_SIZE = 4096
+
+class BM25Index:
+    """
+    In-memory inverted index scored with Okapi BM25. Postings are flat (term, row, term frequency) arrays
+    sorted by term, so a query reads each of its terms with one slice and accumulates the scores of every row
+    with one bincount. Writes never touch those arrays: new postings go to a delta buffer keyed by term,
+    and a removed row only has its version bumped, which turns its postings dead. Both are folded into the sorted
+    arrays once they pass delta_ratio of them, so interleaved writes and queries cost amortized O(log P) per posting.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, delta_ratio: float = DEFAULT_DELTA_RATIO):
+        self.k1 = k1
+        self.b = b
+        self.delta_ratio = delta_ratio
+        self.reset()
+
+    def reset(self) -> None:
+        self.vocabulary: dict[str, int] = {}
+        self._lengths: np.ndarray = np.empty(0, dtype=np.float32)
+        self._indexed: np.ndarray = np.empty(0, dtype=bool)
+        # A posting is live while its version equals the version of its row.
+        self._row_versions: np.ndarray = np.empty(0, dtype=np.int32)
+        self._row_postings: np.ndarray = np.empty(0, dtype=np.int64)
+        self._set_postings(
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float32)
+        )
+
+    def add(self, rows: np.ndarray, texts: list[Optional[str]]) -> None:
+        """
+        Indexes the texts of rows, replacing what was indexed for them before. A text of None leaves the row unindexed.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        self.remove(rows)
+        size = int(rows.max()) + 1 if len(rows) > 0 else 0
+        if size > len(self._lengths):
+            self._resize(size)
+
+        for row, text in zip(rows.tolist(), texts):
+            if text is None:
+                continue
+            tokens = tokenize(text)
+            counts: dict[int, int] = {}
+            for token in tokens:
+                term = self.vocabulary.setdefault(token, len(self.vocabulary))
+                counts[term] = counts.get(term, 0) + 1
+            version = int(self._row_versions[row])
+            for term, tf in counts.items():
+                self._delta.setdefault(term, []).append(len(self._delta_rows))
+                self._delta_rows.append(row)
+                self._delta_tfs.append(tf)
+                self._delta_versions.append(version)
+            self._lengths[row] = len(tokens)
+            self._indexed[row] = True
+            self._row_postings[row] = len(counts)
+        self._maybe_merge()
+
+    def extend(self, other: 'BM25Index', offset: int) -> None:
+        """
+        Appends the postings of other with its rows shifted by offset, which must be past every row indexed here.
+        """
+        if offset < len(self._indexed):
+            raise ValueError(f'Cannot extend at row {offset}, rows up to {len(self._indexed)} are taken.')
+        self._merge()
+        other._merge()
+        terms = np.empty(len(other.vocabulary), dtype=np.int64)
+        for token, term in other.vocabulary.items():
+            terms[term] = self.vocabulary.setdefault(token, len(self.vocabulary))
+        padding = offset - len(self._indexed)
+        self._lengths = np.concatenate([self._lengths, np.zeros(padding, dtype=np.float32), other._lengths])
+        self._indexed = np.concatenate([self._indexed, np.zeros(padding, dtype=bool), other._indexed])
+        self._row_versions = np.zeros(len(self._indexed), dtype=np.int32)
+        self._row_postings = np.concatenate([
+            self._row_postings,
+            np.zeros(padding, dtype=np.int64),
+            other._row_postings
+        ])
+        self._set_postings(
+            np.concatenate([self._terms, terms[other._terms]]),
+            np.concatenate([self._rows, other._rows + offset]),
+            np.concatenate([self._tfs, other._tfs])
+        )
+
+    def remove(self, rows: np.ndarray) -> None:
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = np.unique(rows[rows < len(self._indexed)])
+        rows = rows[self._indexed[rows]]
+        if len(rows) == 0:
+            return
+        self._row_versions[rows] += 1
+        self._num_dead += int(self._row_postings[rows].sum())
+        self._row_postings[rows] = 0
+        self._lengths[rows] = 0
+        self._indexed[rows] = False
+        self._maybe_merge()
+
+    def compact(self, kept_rows: np.ndarray) -> None:
+        """
+        Called after the store dropped rows, kept_rows[i] is the old row number of new row i.
+        """
+        self._merge()
+        mapping = np.full(len(self._indexed), -1, dtype=np.int64)
+        kept_rows = kept_rows[kept_rows < len(self._indexed)]
+        mapping[kept_rows] = np.arange(len(kept_rows))
+        rows = mapping[self._rows]
+        keep = rows >= 0
+        self._lengths = self._lengths[kept_rows]
+        self._indexed = self._indexed[kept_rows]
+        self._row_versions = self._row_versions[kept_rows]
+        self._row_postings = self._row_postings[kept_rows]
+        # Dropping postings keeps them sorted by term.
+        self._set_postings(self._terms[keep], rows[keep], self._tfs[keep], is_sorted=True)
+
+    def scores(self, query: str, size: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        BM25 scores of the first size rows for query, rows outside of rows score 0.
+        """
+        terms = [self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary]
+        scores = np.zeros(size, dtype=np.float32)
+        num_indexed = int(self._indexed.sum())
+        if len(terms) == 0 or num_indexed == 0:
+            return scores
+
+        avg_length = float(self._lengths.sum()) / num_indexed
+        norm_lengths = self.k1 * (1 - self.b + self.b * self._lengths / max(avg_length, 1e-9))
+        term_ids, query_tfs = np.unique(np.array(terms, dtype=np.int64), return_counts=True)
+        posting_rows: list[np.ndarray] = []
+        posting_scores: list[np.ndarray] = []
+        for term, query_tf in zip(term_ids.tolist(), query_tfs.tolist()):
+            term_rows, tfs = self._term_postings(term)
+            if len(term_rows) == 0:
+                continue
+            df = len(term_rows)
+            idf = np.log(1 + (num_indexed - df + 0.5) / (df + 0.5))
+            posting_rows.append(term_rows)
+            posting_scores.append(query_tf * idf * tfs * (self.k1 + 1) / (tfs + norm_lengths[term_rows]))
+        if len(posting_rows) == 0:
+            return scores
+
+        all_rows = np.concatenate(posting_rows)
+        all_scores = np.concatenate(posting_scores)
+        if rows is not None:
+            allowed = np.zeros(size, dtype=bool)
+            allowed[rows] = True
+            keep = allowed[all_rows]
+            all_rows, all_scores = all_rows[keep], all_scores[keep]
+        scores += np.bincount(all_rows, weights=all_scores, minlength=size)[:size].astype(np.float32)
+        return scores
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        size: int,
+        rows: Optional[np.ndarray] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the rows and BM25 scores of the top k rows sharing at least one term with query, best first.
+        """
+        scores = self.scores(query, size, rows=rows)
+        matches = np.flatnonzero(scores > 0)
+        top = top_k_indices(scores[matches], k)
+        return matches[top], scores[matches[top]]
+
+    def copy(self) -> Self:
+        return copy.deepcopy(self)
+
+    def save(self, path: str, fs: fsspec.AbstractFileSystem) -> None:
+        self._merge()
+        with fs.open(os.path.join(path, SPARSE_CONFIG_FILE), 'w') as f:
+            json.dump({'k1': self.k1, 'b': self.b, 'vocabulary': list(self.vocabulary)}, f)
+        with fs.open(os.path.join(path, SPARSE_ARRAYS_FILE), 'wb') as f:
+            np.savez(
+                f,
+                terms=self._terms,
+                rows=self._rows,
+                tfs=self._tfs,
+                lengths=self._lengths,
+                indexed=self._indexed
+            )
+
+    def _term_postings(self, term: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Live rows and term frequencies of term, from its slice of the sorted arrays and from the delta.
+        """
+        if term + 1 < len(self._indptr):
+            start, end = self._indptr[term], self._indptr[term + 1]
+            rows, tfs, versions = self._rows[start:end], self._tfs[start:end], self._versions[start:end]
+        else:
+            rows, tfs, versions = self._rows[:0], self._tfs[:0], self._versions[:0]
+        delta = self._delta.get(term)
+        if delta is not None:
+            rows = np.concatenate([rows, np.array([self._delta_rows[i] for i in delta], dtype=np.int64)])
+            tfs = np.concatenate([tfs, np.array([self._delta_tfs[i] for i in delta], dtype=np.float32)])
+            versions = np.concatenate([versions, np.array([self._delta_versions[i] for i in delta], dtype=np.int32)])
+        if self._num_dead > 0:
+            live = versions == self._row_versions[rows]
+            rows, tfs = rows[live], tfs[live]
+        return rows, tfs
+
+    def _resize(self, size: int) -> None:
+        extra = size - len(self._lengths)
+        self._lengths = np.concatenate([self._lengths, np.zeros(extra, dtype=np.float32)])
+        self._indexed = np.concatenate([self._indexed, np.zeros(extra, dtype=bool)])
+        self._row_versions = np.concatenate([self._row_versions, np.zeros(extra, dtype=np.int32)])
+        self._row_postings = np.concatenate([self._row_postings, np.zeros(extra, dtype=np.int64)])
+
+    def _maybe_merge(self) -> None:
+        pending = len(self._delta_rows) + self._num_dead
+        if pending > max(MIN_DELTA_SIZE, self.delta_ratio * len(self._terms)):
+            self._merge()
+
+    def _merge(self) -> None:
+        """
+        Drops dead postings and sorts the delta into the term-sorted arrays.
+        """
+        if len(self._delta_rows) == 0 and self._num_dead == 0:
+            return
+        delta_terms = np.empty(len(self._delta_rows), dtype=np.int64)
+        for term, positions in self._delta.items():
+            delta_terms[positions] = term
+        terms = np.concatenate([self._terms, delta_terms])
+        rows = np.concatenate([self._rows, np.array(self._delta_rows, dtype=np.int64)])
+        tfs = np.concatenate([self._tfs, np.array(self._delta_tfs, dtype=np.float32)])
+        versions = np.concatenate([self._versions, np.array(self._delta_versions, dtype=np.int32)])
+        live = versions == self._row_versions[rows]
+        # Every posting left is live, so versions start over.
+        self._row_versions = np.zeros(len(self._indexed), dtype=np.int32)
+        self._set_postings(terms[live], rows[live], tfs[live])
+
+    def _set_postings(self, terms: np.ndarray, rows: np.ndarray, tfs: np.ndarray, is_sorted: bool = False) -> None:
+        if not is_sorted:
+            order = np.argsort(terms, kind='stable')
+            terms, rows, tfs = terms[order], rows[order], tfs[order]
+        self._terms, self._rows, self._tfs = terms, rows, tfs
+        self._versions = np.zeros(len(terms), dtype=np.int32)
+        self._indptr = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(self.vocabulary)))])
+        self._delta: dict[int, list[int]] = {}
+        self._delta_rows: list[int] = []
+        self._delta_tfs: list[float] = []
+        self._delta_versions: list[int] = []
+        self._num_dead = 0
+
+def load_sparse_index(path: str, fs: fsspec.AbstractFileSystem) -> Optional[BM25Index]:
+    config_path = os.path.join(path, SPARSE_CONFIG_FILE)
+    if not fs.exists(config_path):
+        return None
+    with fs.open(config_path, 'r') as f:
+        config = json.load(f)
+    index = BM25Index(k1=config['k1'], b=config['b'])
+    index.vocabulary = {token: term for term, token in enumerate(config['vocabulary'])}
+    with fs.open(os.path.join(path, SPARSE_ARRAYS_FILE), 'rb') as f:
+        with np.load(f, allow_pickle=False) as arrays:
+            index._lengths = arrays['lengths']
+            index._indexed = arrays['indexed']
+            index._row_versions = np.zeros(len(index._indexed), dtype=np.int32)
+            index._row_postings = np.bincount(arrays['rows'], minlength=len(index._indexed)).astype(np.int64)
+            index._set_postings(arrays['terms'], arrays['rows'], arrays['tfs'])
+    return index
\ No newline at end of file
@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from enum import StrEnum
-from typing import Any, Optional, Sequence, TypedDict
+from typing import Any, Callable, Optional, Sequence, TypedDict, overload
 
 from flowstack.artifacts import Artifact, TextLike
 from flowstack.typing import Embedding, MetadataFilter, MetadataFilterInfo, MetadataFilters, Serializable
@@ -19,6 +19,7 @@ class VectorStoreQueryMode(StrEnum):
     LINEAR_REGRESSION = 'linear_regression'
     LOGISTIC_REGRESSION = 'logistic_regression'
     SVM = 'svm'
+    LATE_INTERACTION = 'late_interaction'
 
 class VectorStoreQuerySpec(Serializable):
     query: TextLike
@@ -44,4 +45,36 @@ class VectorStoreQuery(TypedDict, total=False):
 class VectorStoreQueryResult:
     artifacts: Optional[Sequence[Artifact]] = None
     ids: Optional[list[str]] = None
-    similarities: Optional[list[float]] = None
\ No newline at end of file
+    similarities: Optional[list[float]] = None
+
+class LazyArtifacts(Sequence[Artifact]):
+    """
+    A sequence of artifacts that are hydrated from their raw entries the first time they are accessed,
+    so results can be handed out before, or without, deserializing every hit.
+    """
+
+    def __init__(self, entries: Sequence[Any], hydrate: Callable[[Any], Artifact]):
+        self._entries = entries
+        self._hydrate = hydrate
+        self._artifacts: list[Optional[Artifact]] = [None] * len(entries)
+
+    @overload
+    def __getitem__(self, index: int) -> Artifact:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> 'LazyArtifacts':
+        ...
+
+    def __getitem__(self, index: int | slice) -> 'Artifact | LazyArtifacts':
+        if isinstance(index, slice):
+            artifacts = LazyArtifacts(self._entries[index], self._hydrate)
+            artifacts._artifacts = self._artifacts[index]
+            return artifacts
+        artifact = self._artifacts[index]
+        if artifact is None:
+            artifact = self._artifacts[index] = self._hydrate(self._entries[index])
+        return artifact
+
+    def __len__(self) -> int:
+        return len(self._entries)
\ No newline at end of file
@@ -0,0 +1,172 @@
+from enum import StrEnum
+from typing import Optional
+
+import numpy as np
+
+from flowstack.core.utils.constants import DEFAULT_MMR_THRESHOLD
+from flowstack.typing import Embedding
+
+class SimilarityMetric(StrEnum):
+    IP = 'IP'
+    COSINE = 'COSINE'
+    L2 = 'L2'
+
+def as_matrix(embeddings: Embedding | list[Embedding], dtype: type = np.float32) -> np.ndarray:
+    matrix = np.asarray(embeddings, dtype=dtype)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if matrix.ndim != 2:
+        raise ValueError(f'Expected a vector or a matrix of embeddings, got an array with {matrix.ndim} dimensions.')
+    return np.ascontiguousarray(matrix)
+
+def row_norms(matrix: np.ndarray) -> np.ndarray:
+    return np.sqrt(np.einsum('ij,ij->i', matrix, matrix, dtype=np.float32))
+
+def compute_similarities(
+    matrix: np.ndarray,
+    query: Embedding | list[Embedding],
+    metric: SimilarityMetric = SimilarityMetric.IP,
+    norms: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Scores every row of matrix against query in a single pass. Higher is always better,
+    so L2 is returned as the negated euclidean distance.
+    query can also be a (num_queries, dim) matrix, all queries are then scored with one matrix product
+    and row i of the result holds the similarities of query i.
+    norms can be passed in to reuse cached row norms for COSINE and L2.
+    """
+    query = np.asarray(query, dtype=np.float32)
+    if metric != SimilarityMetric.IP and norms is None:
+        norms = row_norms(matrix)
+    dots = query @ matrix.T if query.ndim == 2 else matrix @ query.reshape(-1)
+    return similarities_from_dot(dots, query, metric=metric, norms=norms)
+
+def similarities_from_dot(
+    dots: np.ndarray,
+    query: Embedding | list[Embedding],
+    metric: SimilarityMetric = SimilarityMetric.IP,
+    norms: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Turns inner products with query into similarities for metric, norms are the row norms.
+    For a matrix of queries, dots has one row per query.
+    """
+    if metric == SimilarityMetric.IP:
+        return dots
+    query = np.asarray(query, dtype=np.float32)
+    query_norm = np.linalg.norm(query, axis=-1, keepdims=query.ndim == 2).astype(np.float32)
+    if metric == SimilarityMetric.COSINE:
+        denominator = norms * query_norm
+        return np.divide(dots, denominator, out=np.zeros_like(dots), where=denominator > 0)
+    if metric == SimilarityMetric.L2:
+        squared = np.maximum(norms * norms - 2 * dots + query_norm * query_norm, 0)
+        return -np.sqrt(squared)
+    raise ValueError(f'Unsupported similarity metric: {metric}.')
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the indices of the k highest scores along the last axis, best first,
+    using argpartition so that only the k winners are fully sorted.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty((*scores.shape[:-1], 0), dtype=np.int64)
+    if k < n:
+        indices = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        indices = np.broadcast_to(np.arange(n), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, indices, axis=-1), axis=-1, kind='stable')
+    return np.take_along_axis(indices, order, axis=-1)
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = row_norms(vectors)
+    return vectors / np.where(norms > 0, norms, 1)[:, None]
+
+def centroid_scores(
+    vectors: np.ndarray,
+    centroids: np.ndarray,
+    metric: SimilarityMetric = SimilarityMetric.L2
+) -> np.ndarray:
+    """
+    Scores every vector against every centroid. Terms that are constant per vector are dropped,
+    so the scores rank centroids correctly but are not similarities.
+    """
+    scores = vectors @ centroids.T
+    if metric == SimilarityMetric.COSINE:
+        scores /= np.maximum(row_norms(vectors), 1e-12)[:, None]
+    elif metric == SimilarityMetric.L2:
+        scores = 2 * scores - np.einsum('ij,ij->i', centroids, centroids)[None, :]
+    return scores
+
+def kmeans(
+    vectors: np.ndarray,
+    k: int,
+    metric: SimilarityMetric = SimilarityMetric.L2,
+    niter: int = 20,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    Lloyd's k-means. Centroid updates use one sort and np.add.reduceat per iteration,
+    empty clusters are re-seeded from random vectors. COSINE runs spherical k-means.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if metric == SimilarityMetric.COSINE:
+        vectors = normalize(vectors)
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(niter):
+        labels = np.argmax(centroid_scores(vectors, centroids, metric), axis=1)
+        counts = np.bincount(labels, minlength=k)
+        order = np.argsort(labels, kind='stable')
+        present = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[present]
+        centroids[present] = np.add.reduceat(vectors[order], starts, axis=0) / counts[present, None]
+        empty = np.flatnonzero(counts == 0)
+        if len(empty) > 0:
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        if metric == SimilarityMetric.COSINE:
+            centroids = normalize(centroids)
+    return centroids
+
+def maximal_marginal_relevance(
+    query: Embedding,
+    embeddings: np.ndarray,
+    k: int,
+    mmr_threshold: float = DEFAULT_MMR_THRESHOLD,
+    metric: SimilarityMetric = SimilarityMetric.COSINE,
+    norms: Optional[np.ndarray] = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Greedily picks k rows of embeddings, each maximizing
+    mmr_threshold * sim(query, row) - (1 - mmr_threshold) * max(sim(row, picked rows)).
+    The max similarity of every row to the picked rows is updated with one matrix-vector product per pick,
+    rather than recomputing pairwise similarities. Returns the picked indices and their MMR scores, in pick order.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    k = min(k, len(embeddings))
+    if metric != SimilarityMetric.IP and norms is None:
+        norms = row_norms(embeddings)
+    relevance = mmr_threshold * compute_similarities(embeddings, query, metric=metric, norms=norms)
+    if metric == SimilarityMetric.COSINE:
+        inverse_norms = np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)
+    elif metric == SimilarityMetric.L2:
+        squared_norms = norms * norms
+    picked = np.empty(k, dtype=np.int64)
+    scores = np.empty(k, dtype=np.float32)
+    max_similarities = np.full(len(embeddings), -np.inf, dtype=np.float32)
+    candidate_scores = relevance.copy()
+    for i in range(k):
+        best = int(np.argmax(candidate_scores))
+        picked[i] = best
+        scores[i] = candidate_scores[best]
+        similarities = embeddings @ embeddings[best]
+        if metric == SimilarityMetric.COSINE:
+            similarities *= inverse_norms * inverse_norms[best]
+        elif metric == SimilarityMetric.L2:
+            similarities = -np.sqrt(np.maximum(squared_norms - 2 * similarities + squared_norms[best], 0))
+        np.maximum(max_similarities, similarities, out=max_similarities)
+        candidate_scores = relevance - (1 - mmr_threshold) * max_similarities
+        candidate_scores[picked[:i + 1]] = -np.inf
+    return picked, scores
\ No newline at end of file
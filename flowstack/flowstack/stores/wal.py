@@ -0,0 +1,311 @@
+import io
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from typing import Any, Callable, Iterator, NamedTuple, Optional
+import zlib
+
+import fsspec
+from fsspec.implementations.local import LocalFileSystem
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+WAL_DIR = 'wal'
+SNAPSHOT_PREFIX = 'snapshot-'
+SEGMENT_SUFFIX = '.log'
+
+DEFAULT_SYNC_BATCH_SIZE = 64
+DEFAULT_SYNC_INTERVAL = 1.0  # seconds
+DEFAULT_COMPACTION_THRESHOLD = 64 * 1024 * 1024  # bytes
+
+# header length, data length, crc32 of header and data
+_RECORD_PREFIX = struct.Struct('<III')
+
+class LogRecord(NamedTuple):
+    operation: str
+    args: dict[str, Any]
+    data: bytes
+
+class WriteAheadLog:
+    """
+    Append-only log of store operations, split into numbered segment files.
+    Every record is flushed to the operating system as it is appended, so it survives a crash of the process.
+    fsyncs, which make it survive a power loss, are batched: one per sync_batch_size records, and at most
+    sync_interval seconds after the last unsynced record, by a timer if no further append comes.
+    A torn record at the tail of a segment is skipped on replay.
+    """
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __init__(
+        self,
+        path: str,
+        fs: Optional[fsspec.AbstractFileSystem] = None,
+        sync_batch_size: int = DEFAULT_SYNC_BATCH_SIZE,
+        sync_interval: float = DEFAULT_SYNC_INTERVAL
+    ):
+        self.path = path
+        self.sync_batch_size = sync_batch_size
+        self.sync_interval = sync_interval
+        self._fs: fsspec.AbstractFileSystem = fs or fsspec.filesystem('file')
+        if not self._fs.exists(path):
+            self._fs.makedirs(path)
+
+        # Always start a fresh segment, so nothing is ever appended after a torn record.
+        segments = self.segments()
+        self._seq: int = segments[-1] + 1 if len(segments) > 0 else 0
+        self._size: int = sum(self._fs.size(self._segment_path(seq)) for seq in segments)
+        self._file: Optional[io.IOBase] = None
+        self._pending: int = 0
+        self._last_sync: float = time.monotonic()
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def segments(self) -> list[int]:
+        return sorted(
+            int(os.path.basename(name)[:-len(SEGMENT_SUFFIX)])
+            for name in self._fs.ls(self.path, detail=False)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def append(self, operation: str, args: dict[str, Any], data: bytes = b'') -> None:
+        header = json.dumps({'operation': operation, 'args': args}).encode('utf-8')
+        record = b''.join([
+            _RECORD_PREFIX.pack(len(header), len(data), zlib.crc32(data, zlib.crc32(header))),
+            header,
+            data
+        ])
+        with self._lock:
+            if self._file is None:
+                self._file = self._fs.open(self._segment_path(self._seq), 'ab')
+            self._file.write(record)
+            self._file.flush()
+            self._size += len(record)
+            self._pending += 1
+            if (
+                self._pending >= self.sync_batch_size or
+                time.monotonic() - self._last_sync >= self.sync_interval
+            ):
+                self._sync()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.sync_interval, self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def sync(self) -> None:
+        with self._lock:
+            self._sync()
+
+    def rotate(self) -> int:
+        """
+        Closes the current segment and starts a new one. Returns the sequence number of the new segment,
+        every record written before the call lives in a segment with a lower number.
+        """
+        with self._lock:
+            self._sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._seq += 1
+            return self._seq
+
+    def replay(self, from_seq: int = 0) -> Iterator[LogRecord]:
+        for seq in self.segments():
+            if seq < from_seq:
+                continue
+            yield from self._read_segment(seq)
+
+    def truncate(self, before_seq: int) -> None:
+        """
+        Deletes every segment with a sequence number lower than before_seq.
+        """
+        with self._lock:
+            for seq in self.segments():
+                if seq >= before_seq:
+                    continue
+                path = self._segment_path(seq)
+                self._size -= self._fs.size(path)
+                self._fs.rm(path)
+            self._size = max(self._size, 0)
+
+    def close(self) -> None:
+        with self._lock:
+            self._sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _sync(self) -> None:
+        if self._timer is not None:
+            # A no-op when called from the timer itself.
+            self._timer.cancel()
+            self._timer = None
+        if self._file is not None and self._pending > 0:
+            self._file.flush()
+            try:
+                os.fsync(self._file.fileno())
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                pass
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def _read_segment(self, seq: int) -> Iterator[LogRecord]:
+        path = self._segment_path(seq)
+        with self._fs.open(path, 'rb') as f:
+            buffer = f.read()
+        offset = 0
+        while offset < len(buffer):
+            if offset + _RECORD_PREFIX.size > len(buffer):
+                logger.warning(f'Skipping torn record at the end of {path}.')
+                return
+            header_length, data_length, checksum = _RECORD_PREFIX.unpack_from(buffer, offset)
+            start = offset + _RECORD_PREFIX.size
+            end = start + header_length + data_length
+            header = buffer[start:start + header_length]
+            data = buffer[start + header_length:end]
+            if end > len(buffer) or zlib.crc32(data, zlib.crc32(header)) != checksum:
+                logger.warning(f'Skipping torn record at the end of {path}.')
+                return
+            record = json.loads(header)
+            yield LogRecord(record['operation'], record['args'], data)
+            offset = end
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.path, f'{seq:010d}{SEGMENT_SUFFIX}')
+
+class LogStructuredStorage[T]:
+    """
+    Durable storage for an in-memory store: a base snapshot plus a write-ahead log of
+    every operation applied since. A manifest names the current snapshot and the first log
+    segment that is not folded into it. Compaction writes a new snapshot, swaps the manifest,
+    then drops the old snapshot and log segments. On a local filesystem the snapshot, the manifest and
+    the directory entries pointing at them are fsynced before anything is dropped, so a power loss at any point
+    leaves either the old manifest with its snapshot and log, or the new manifest with its snapshot.
+    """
+
+    @property
+    def snapshot_path(self) -> Optional[str]:
+        manifest = self._read_manifest()
+        return os.path.join(self.path, manifest['snapshot']) if manifest else None
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self._log.size >= self.compaction_threshold
+
+    def __init__(
+        self,
+        path: str,
+        write_snapshot: Callable[[T, str, fsspec.AbstractFileSystem], None],
+        fs: Optional[fsspec.AbstractFileSystem] = None,
+        compaction_threshold: int = DEFAULT_COMPACTION_THRESHOLD,
+        **log_kwargs
+    ):
+        self.path = path
+        self.compaction_threshold = compaction_threshold
+        self._write_snapshot = write_snapshot
+        self._fs: fsspec.AbstractFileSystem = fs or fsspec.filesystem('file')
+        self._log = WriteAheadLog(os.path.join(path, WAL_DIR), fs=self._fs, **log_kwargs)
+        self._compaction_lock = threading.Lock()
+        self._compaction_thread: Optional[threading.Thread] = None
+
+    def replay(self) -> Iterator[LogRecord]:
+        manifest = self._read_manifest()
+        yield from self._log.replay(manifest['log_seq'] if manifest else 0)
+
+    def append(self, operation: str, args: dict[str, Any], data: bytes = b'') -> None:
+        self._log.append(operation, args, data)
+
+    def sync(self) -> None:
+        self._log.sync()
+
+    def compact(self, take_snapshot: Callable[[], T], blocking: bool = True) -> None:
+        """
+        Folds the log into a new snapshot. take_snapshot must return a consistent copy of the store,
+        it is called after the log has been rotated, so any operation it misses is in the new segment.
+        Operations are replayed idempotently, so the snapshot may also include some of them.
+        """
+        if not self._compaction_lock.acquire(blocking=blocking):
+            return
+        try:
+            log_seq = self._log.rotate()
+            snapshot = take_snapshot()
+            snapshot_name = f'{SNAPSHOT_PREFIX}{log_seq:010d}'
+            snapshot_path = os.path.join(self.path, snapshot_name)
+            self._write_snapshot(snapshot, snapshot_path, self._fs)
+            _fsync_tree(self._fs, snapshot_path)
+            _fsync_tree(self._fs, self.path, recursive=False)
+
+            previous = self._read_manifest()
+            self._write_manifest({'snapshot': snapshot_name, 'log_seq': log_seq})
+            if previous and previous['snapshot'] != snapshot_name:
+                self._fs.rm(os.path.join(self.path, previous['snapshot']), recursive=True)
+            self._log.truncate(log_seq)
+            logger.debug(f'Compacted write-ahead log into {snapshot_name}.')
+        finally:
+            self._compaction_lock.release()
+
+    def compact_in_background(self, take_snapshot: Callable[[], T]) -> None:
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+
+        def _compact() -> None:
+            try:
+                self.compact(take_snapshot, blocking=False)
+            except Exception:
+                logger.exception(f'Background compaction of {self.path} failed.')
+
+        self._compaction_thread = threading.Thread(target=_compact, daemon=True)
+        self._compaction_thread.start()
+
+    def close(self) -> None:
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+        self._log.close()
+
+    def _read_manifest(self) -> Optional[dict[str, Any]]:
+        path = os.path.join(self.path, MANIFEST_FILE)
+        if not self._fs.exists(path):
+            return None
+        with self._fs.open(path, 'r') as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: dict[str, Any]) -> None:
+        path = os.path.join(self.path, MANIFEST_FILE)
+        with self._fs.open(f'{path}.tmp', 'w') as f:
+            json.dump(manifest, f)
+        _fsync_tree(self._fs, f'{path}.tmp')
+        self._fs.mv(f'{path}.tmp', path)
+        _fsync_tree(self._fs, self.path, recursive=False)
+
+def _fsync_tree(fs: fsspec.AbstractFileSystem, path: str, recursive: bool = True) -> None:
+    """
+    fsyncs the file at path, or the directory at path along with, if recursive, everything below it.
+    Only local files can be fsynced, on other filesystems durability is up to the backend.
+    """
+    if not isinstance(fs, LocalFileSystem):
+        return
+    path = fs._strip_protocol(path)
+    if os.path.isdir(path) and recursive:
+        for root, _, files in os.walk(path):
+            for name in files:
+                _fsync(os.path.join(root, name))
+            _fsync(root)
+    else:
+        _fsync(path)
+
+def _fsync(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
\ No newline at end of file
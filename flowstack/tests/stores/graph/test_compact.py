@@ -0,0 +1,60 @@
+import random
+
+from flowstack.stores import CompactGraph, EntityNode, Graph, GraphRelation
+from flowstack.stores.graph import compact
+
+def test_deleted_delta_edges_do_not_count_twice_toward_a_rebuild(monkeypatch):
+    monkeypatch.setattr(compact, 'MIN_DELTA_SIZE', 10)
+    graph = CompactGraph()
+    for i in range(8):
+        graph.add_relation(GraphRelation(source=f'n{i}', target=f'n{i + 1}', label='next'))
+    for i in range(4):
+        graph.delete_relation((f'n{i}', f'n{i + 1}'))
+    assert graph._num_indexed == 0
+    assert len(graph.relations) == 4
+
+def _assert_same(compact: CompactGraph, graph: Graph) -> None:
+    assert set(compact.nodes) == set(graph.nodes)
+    for node_id, node in graph.nodes.items():
+        assert compact.nodes[node_id] == node
+    assert compact.triplets == graph.triplets
+    assert len(compact.relations) == len(graph.relations)
+    for relation_id, relation in graph.relations.items():
+        assert compact.relations[relation_id] == relation
+    for node_id in graph.nodes:
+        assert set(compact.get_outgoing(node_id)) == set(graph.get_outgoing(node_id))
+        assert set(compact.get_incoming(node_id)) == set(graph.get_incoming(node_id))
+        assert set(compact.traverse([node_id], depth=2)) == set(graph.traverse([node_id], depth=2))
+
+def test_matches_graph_under_interleaved_adds_and_deletes(monkeypatch):
+    monkeypatch.setattr(compact, 'MIN_DELTA_SIZE', 16)
+    rebuilds = []
+    rebuild = CompactGraph._rebuild
+
+    def counted_rebuild(self) -> None:
+        rebuilds.append(self._num_edges)
+        rebuild(self)
+
+    monkeypatch.setattr(CompactGraph, '_rebuild', counted_rebuild)
+
+    rng = random.Random(0)
+    compact_graph, graph = CompactGraph(), Graph()
+    names = [f'n{i}' for i in range(30)]
+    for step in range(1500):
+        source, target = rng.sample(names, 2)
+        operation, label = rng.random(), rng.choice(['a', 'b'])
+        for g in [compact_graph, graph]:
+            if operation < 0.5:
+                g.add_relation(GraphRelation(source=source, target=target, label=label))
+            elif operation < 0.6:
+                g.add_node(EntityNode(name=source, properties={'step': step}))
+            elif operation < 0.7:
+                g.delete_node(source)
+            elif operation < 0.85:
+                g.delete_relation((source, target))
+            else:
+                g.delete_triplet((source, f'{source}->{target}', target))
+        if step % 100 == 0:
+            _assert_same(compact_graph, graph)
+    _assert_same(compact_graph, graph)
+    assert len(rebuilds) >= 3
\ No newline at end of file
@@ -0,0 +1,33 @@
+import pytest
+
+from flowstack.artifacts import ArtifactInfo, Text
+from flowstack.stores import EntityNode, GraphRelation, SimpleGraphStore
+
+@pytest.fixture(params=[False, True], ids=['graph', 'compact'])
+def store(request) -> SimpleGraphStore:
+    store = SimpleGraphStore(compact=request.param)
+    store.upsert_nodes([EntityNode(name='a', properties={'kind': 'x'}), EntityNode(name='b')])
+    store.upsert_relations([GraphRelation(source='a', target='b', label='knows')])
+    return store
+
+@pytest.mark.parametrize('query', [{}, {'properties': {}}, {'properties': None, 'filters': None}])
+def test_delete_without_a_restriction_deletes_nothing(store, query):
+    store.delete(**query)
+    assert sorted(node.id for node in store.get()) == ['a', 'b']
+    assert len(store.get_triplets()) == 1
+
+def test_delete_by_property(store):
+    store.delete(properties={'kind': 'x'})
+    assert [node.id for node in store.get()] == ['b']
+    assert store.get_triplets() == []
+
+def test_delete_artifacts_by_ref_removes_the_nodes_extracted_from_it(store):
+    chunk = Text('c knows d', id='chunk')
+    chunk.ref = ArtifactInfo('doc')
+    store.upsert_artifacts([chunk])
+    store.upsert_nodes([EntityNode(name='c').set_source(chunk), EntityNode(name='d').set_source(chunk)])
+    store.upsert_relations([GraphRelation(source='c', target='d', label='knows')])
+
+    store.delete_artifacts(ref_artifact_ids=['doc'])
+    assert sorted(node.id for node in store.get()) == ['a', 'b']
+    assert len(store.get_triplets()) == 1
\ No newline at end of file
@@ -0,0 +1,47 @@
+import pytest
+
+from flowstack.stores import CompactGraph, Graph, GraphRelation
+
+# a -> b -> c -> d is a chain of 'next' edges, e points at a and a also 'likes' x.
+EDGES = [('a', 'b', 'next'), ('b', 'c', 'next'), ('c', 'd', 'next'), ('e', 'a', 'next'), ('a', 'x', 'likes')]
+
+@pytest.fixture(params=[Graph, CompactGraph], ids=['graph', 'compact'])
+def graph(request):
+    graph = request.param()
+    for source, target, label in EDGES:
+        graph.add_relation(GraphRelation(source=source, target=target, label=label))
+    return graph
+
+def _triplet(source: str, target: str) -> tuple[str, str, str]:
+    return (source, f'{source}->{target}', target)
+
+def test_depth_bounds_the_hops_in_either_direction(graph):
+    assert graph.traverse(['a'], depth=0) == []
+    assert set(graph.traverse(['a'], depth=1)) == {_triplet('a', 'b'), _triplet('e', 'a'), _triplet('a', 'x')}
+    assert set(graph.traverse(['a'], depth=2)) == {
+        _triplet('a', 'b'), _triplet('e', 'a'), _triplet('a', 'x'), _triplet('b', 'c')
+    }
+    assert set(graph.traverse(['a'], depth=5)) == {_triplet(source, target) for source, target, _ in EDGES}
+
+def test_triplets_come_out_nearest_first(graph):
+    triplets = graph.traverse(['a'], depth=3)
+    assert set(triplets[:3]) == {_triplet('a', 'b'), _triplet('e', 'a'), _triplet('a', 'x')}
+    assert triplets[3:] == [_triplet('b', 'c'), _triplet('c', 'd')]
+
+def test_limit_stops_after_that_many_triplets(graph):
+    assert graph.traverse(['a'], depth=3, limit=0) == []
+    triplets = graph.traverse(['a'], depth=3, limit=2)
+    assert len(triplets) == 2
+    assert set(triplets) <= {_triplet('a', 'b'), _triplet('e', 'a'), _triplet('a', 'x')}
+    assert len(graph.traverse(['a'], depth=3, limit=100)) == len(EDGES)
+
+def test_ignored_relations_are_neither_returned_nor_followed(graph):
+    graph.add_relation(GraphRelation(source='x', target='y', label='next'))
+    assert set(graph.traverse(['a'], depth=2, ignore_rels=['likes'])) == {
+        _triplet('a', 'b'), _triplet('e', 'a'), _triplet('b', 'c')
+    }
+    assert graph.traverse(['x'], depth=3, ignore_rels=['next']) == [_triplet('a', 'x')]
+
+def test_unknown_and_repeated_start_nodes(graph):
+    assert graph.traverse(['missing'], depth=3) == []
+    assert sorted(graph.traverse(['c', 'c', 'missing'], depth=1)) == [_triplet('b', 'c'), _triplet('c', 'd')]
\ No newline at end of file
@@ -0,0 +1,114 @@
+import operator
+from typing import Any
+
+import numpy as np
+import pytest
+
+from flowstack.stores import MetadataColumns, compile_filters
+from flowstack.typing import FilterCondition, FilterOperator, MetadataFilter, MetadataFilters
+
+METADATA = [
+    {'kind': 'paper', 'year': 2020, 'score': 0.5, 'tags': ['nlp', 'ir'], 'title': 'dense retrieval'},
+    {'kind': 'blog', 'year': 2021, 'score': 1.5, 'tags': ['ir']},
+    {'kind': 'paper', 'year': 2022, 'tags': [], 'title': 'sparse retrieval'},
+    {'kind': 'book', 'score': 2.5, 'title': 'dense passages'},
+    {'year': 2023, 'tags': ['nlp', 'cv', 'ir']},
+    {}
+]
+
+FILTERS = [
+    MetadataFilter('kind', 'paper'),
+    MetadataFilter('kind', 'paper', FilterOperator.NE),
+    MetadataFilter('year', 2021),
+    MetadataFilter('year', 2021, FilterOperator.NE),
+    MetadataFilter('year', 2021, FilterOperator.GT),
+    MetadataFilter('year', 2021, FilterOperator.GTE),
+    MetadataFilter('score', 1.5, FilterOperator.LT),
+    MetadataFilter('score', 1.5, FilterOperator.LTE),
+    MetadataFilter('kind', 'book', FilterOperator.GT),
+    MetadataFilter('kind', ['blog', 'book'], FilterOperator.IN),
+    MetadataFilter('kind', ['blog', 'book'], FilterOperator.NIN),
+    MetadataFilter('tags', ['cv', 'ir'], FilterOperator.ANY),
+    MetadataFilter('tags', ['nlp', 'ir'], FilterOperator.ALL),
+    MetadataFilter('tags', 'nlp', FilterOperator.CONTAINS),
+    MetadataFilter('title', 'dense', FilterOperator.TEXT_MATCH),
+    MetadataFilter('missing', 'x'),
+    MetadataFilter('missing', 'x', FilterOperator.NE)
+]
+
+_COMPARISONS = {
+    FilterOperator.GT: operator.gt,
+    FilterOperator.GTE: operator.ge,
+    FilterOperator.LT: operator.lt,
+    FilterOperator.LTE: operator.le
+}
+
+def _matches(metadata: dict[str, Any], filter: MetadataFilter) -> bool:
+    """
+    Row by row reference, a row without the key only matches NE and NIN.
+    """
+    if filter.operator in [FilterOperator.NE, FilterOperator.NIN]:
+        positive = FilterOperator.EQ if filter.operator == FilterOperator.NE else FilterOperator.IN
+        return not _matches(metadata, MetadataFilter(filter.key, filter.value, positive))
+    if filter.key not in metadata:
+        return False
+    actual, value = metadata[filter.key], filter.value
+    match filter.operator:
+        case FilterOperator.EQ:
+            return actual == value
+        case FilterOperator.IN:
+            return actual in value
+        case FilterOperator.ANY:
+            return isinstance(actual, list) and any(v in actual for v in value)
+        case FilterOperator.ALL:
+            return isinstance(actual, list) and all(v in actual for v in value)
+        case FilterOperator.CONTAINS:
+            return isinstance(actual, list) and value in actual
+        case FilterOperator.TEXT_MATCH:
+            return isinstance(actual, str) and actual.startswith(value)
+    return type(actual) is type(value) and _COMPARISONS[filter.operator](actual, value)
+
+def _expected(filters: MetadataFilters) -> list[int]:
+    combine = all if filters.condition == FilterCondition.AND else any
+    return [
+        row for row, metadata in enumerate(METADATA)
+        if combine(
+            row in _expected(f) if isinstance(f, MetadataFilters) else _matches(metadata, f)
+            for f in filters.filters
+        )
+    ]
+
+@pytest.fixture
+def columns() -> MetadataColumns:
+    columns = MetadataColumns()
+    columns.set(np.arange(len(METADATA)), METADATA)
+    return columns
+
+@pytest.mark.parametrize('filter', FILTERS, ids=lambda f: f'{f.key}{f.operator}{f.value}')
+def test_every_operator_matches_the_row_by_row_reference(columns, filter):
+    filters = MetadataFilters([filter])
+    assert columns.select(filters).tolist() == _expected(filters)
+    assert np.flatnonzero(columns.mask(filters)).tolist() == _expected(filters)
+
+@pytest.mark.parametrize('condition', [FilterCondition.AND, FilterCondition.OR])
+def test_pairs_of_filters_combine_with_and_and_or(columns, condition):
+    for left in FILTERS:
+        for right in FILTERS:
+            filters = MetadataFilters([left, right], condition)
+            assert columns.select(filters).tolist() == _expected(filters), (left, right)
+
+def test_nested_filters(columns):
+    filters = MetadataFilters([
+        MetadataFilter('kind', 'paper'),
+        MetadataFilters([
+            MetadataFilter('year', 2022, FilterOperator.GTE),
+            MetadataFilter('tags', 'nlp', FilterOperator.CONTAINS)
+        ], FilterCondition.OR)
+    ])
+    assert columns.select(filters).tolist() == _expected(filters) == [0, 2]
+
+def test_unsupported_operator_fails_before_touching_rows():
+    filter = MetadataFilter('kind', 'paper')
+    filter.operator = 'regex'
+    with pytest.raises(ValueError, match='Unsupported filter operator'):
+        compile_filters(MetadataFilters([filter]))
\ No newline at end of file
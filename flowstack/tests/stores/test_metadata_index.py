@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from flowstack.artifacts import Text
+from flowstack.stores import MetadataColumns, SimpleVectorStore
+from flowstack.typing import FilterCondition, FilterOperator, MetadataFilter, MetadataFilters
+
+INDEXES = {'kind': 'HASH', 'year': 'SORTED', 'title': 'PREFIX'}
+
+FILTERS = [
+    MetadataFilter('kind', 'paper'),
+    MetadataFilter('kind', 'paper', FilterOperator.NE),
+    MetadataFilter('kind', ['blog', 'book'], FilterOperator.IN),
+    MetadataFilter('kind', ['blog', 'book'], FilterOperator.NIN),
+    MetadataFilter('year', 2021),
+    MetadataFilter('year', 2021, FilterOperator.GT),
+    MetadataFilter('year', 2021, FilterOperator.GTE),
+    MetadataFilter('year', 2021, FilterOperator.LT),
+    MetadataFilter('year', 2021, FilterOperator.LTE),
+    MetadataFilter('title', 'dense', FilterOperator.TEXT_MATCH),
+    MetadataFilter('title', 'dense retrieval'),
+    MetadataFilters([MetadataFilter('kind', 'paper'), MetadataFilter('year', 2021, FilterOperator.GT)]),
+    MetadataFilters([MetadataFilter('kind', 'blog'), MetadataFilter('title', 'sparse', FilterOperator.TEXT_MATCH)],
+                    FilterCondition.OR)
+]
+
+def _metadata(rng: np.random.Generator) -> dict:
+    return {
+        'kind': str(rng.choice(['paper', 'blog', 'book'])),
+        'year': int(rng.integers(2018, 2025)),
+        'title': f"{rng.choice(['dense', 'sparse', 'dense passage'])} retrieval"
+    }
+
+def _filters(filter) -> MetadataFilters:
+    return filter if isinstance(filter, MetadataFilters) else MetadataFilters([filter])
+
+def test_indexed_columns_match_scans_after_sets_overwrites_and_compaction():
+    rng = np.random.default_rng(0)
+    indexed, scanned = MetadataColumns(indexes=INDEXES), MetadataColumns()
+    for columns in [indexed, scanned]:
+        columns.set(np.arange(200), [_metadata(np.random.default_rng(row)) for row in range(200)])
+
+    def check():
+        for filter in FILTERS:
+            assert indexed.select(_filters(filter)).tolist() == scanned.select(_filters(filter)).tolist(), filter
+
+    check()
+    # An index answers its operators with rows, never with a mask over every row.
+    assert indexed.get_index('year').lookup(FilterOperator.GT, 2021).dtype != bool
+
+    overwritten = rng.choice(200, size=50, replace=False)
+    metadata = [_metadata(rng) for _ in overwritten]
+    for columns in [indexed, scanned]:
+        columns.set(overwritten, metadata)
+    check()
+
+    kept_rows = np.sort(rng.choice(200, size=120, replace=False))
+    for columns in [indexed, scanned]:
+        columns.compact(kept_rows)
+    check()
+
+def test_index_declared_after_rows_are_stored():
+    columns = MetadataColumns()
+    columns.set(np.arange(3), [{'kind': 'paper'}, {'kind': 'blog'}, {'kind': 'paper'}])
+    columns.create_index('kind', 'HASH')
+    assert columns.get_index('kind').lookup(FilterOperator.EQ, 'paper').tolist() == [0, 2]
+
+@pytest.mark.parametrize('filter', FILTERS[:11], ids=lambda f: f'{f.key}{f.operator}{f.value}')
+def test_store_with_indexes_filters_like_one_without_after_inserts_and_deletes(filter):
+    rng = np.random.default_rng(1)
+    stores = [SimpleVectorStore(metadata_indexes=INDEXES), SimpleVectorStore()]
+    artifacts = [
+        Text(str(row), id=str(row), embedding=rng.standard_normal(8).astype(np.float32), metadata=_metadata(rng))
+        for row in range(100)
+    ]
+    for store in stores:
+        store.insert(artifacts)
+        store.delete(artifact_ids=[str(row) for row in range(0, 100, 3)])
+        store.delete(filters=MetadataFilters([MetadataFilter('year', 2018)]))
+
+    query = rng.standard_normal(8).astype(np.float32)
+    indexed, scanned = (
+        store.retrieve(query_embedding=query, filters=_filters(filter), similarity_top_k=100) for store in stores
+    )
+    assert indexed.ids == scanned.ids
+    assert all(int(id_) % 3 != 0 for id_ in indexed.ids)
\ No newline at end of file
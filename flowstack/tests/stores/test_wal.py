@@ -0,0 +1,87 @@
+import json
+import os
+import time
+
+import pytest
+
+from flowstack.stores import LogStructuredStorage, WriteAheadLog
+
+def _write_snapshot(snapshot: list[int], path: str, fs) -> None:
+    fs.makedirs(path, exist_ok=True)
+    with fs.open(os.path.join(path, 'values.json'), 'w') as f:
+        json.dump(snapshot, f)
+
+def _read_snapshot(storage: LogStructuredStorage) -> list[int]:
+    if storage.snapshot_path is None:
+        return []
+    with open(os.path.join(storage.snapshot_path, 'values.json')) as f:
+        return json.load(f)
+
+def _recover(path: str) -> list[int]:
+    storage = LogStructuredStorage(path, write_snapshot=_write_snapshot)
+    values = _read_snapshot(storage) + [record.args['value'] for record in storage.replay()]
+    storage.close()
+    return values
+
+def _append(path: str, values: list[int]) -> LogStructuredStorage:
+    storage = LogStructuredStorage(path, write_snapshot=_write_snapshot)
+    for value in values:
+        storage.append('add', {'value': value})
+    return storage
+
+def test_appended_records_reach_the_file_before_any_sync(tmp_path):
+    log = WriteAheadLog(str(tmp_path), sync_batch_size=1000, sync_interval=60)
+    log.append('add', {'value': 1})
+    # Read back through another handle, as a restarted process would after a crash.
+    assert [record.args for record in WriteAheadLog(str(tmp_path)).replay()] == [{'value': 1}]
+    log.close()
+
+def test_unsynced_records_are_synced_once_the_interval_elapses(tmp_path):
+    log = WriteAheadLog(str(tmp_path), sync_batch_size=1000, sync_interval=0.05)
+    log.append('add', {'value': 1})
+    assert log._pending == 1
+    time.sleep(0.5)
+    assert log._pending == 0
+    log.close()
+
+def test_torn_tail_record_is_skipped_on_recovery(tmp_path):
+    path = str(tmp_path)
+    _append(path, [1, 2, 3]).close()
+    segment = os.path.join(path, 'wal', sorted(os.listdir(os.path.join(path, 'wal')))[-1])
+    with open(segment, 'r+b') as f:
+        f.truncate(os.path.getsize(segment) - 3)
+    assert _recover(path) == [1, 2]
+
+    # New records go to a fresh segment, after the torn one.
+    _append(path, [4]).close()
+    assert _recover(path) == [1, 2, 4]
+
+def test_compaction_interrupted_before_the_manifest_swap_keeps_the_log(tmp_path):
+    path = str(tmp_path)
+    storage = _append(path, [1, 2])
+
+    def _crash() -> list[int]:
+        raise RuntimeError('crash while taking the snapshot')
+
+    with pytest.raises(RuntimeError):
+        storage.compact(_crash)
+    storage.append('add', {'value': 3})
+    storage.close()
+    assert _recover(path) == [1, 2, 3]
+
+def test_compaction_interrupted_after_the_manifest_swap_uses_the_new_snapshot(tmp_path, monkeypatch):
+    path = str(tmp_path)
+    storage = _append(path, [1, 2])
+    storage.compact(lambda: [1, 2])
+    storage.append('add', {'value': 3})
+
+    def _crash(before_seq: int) -> None:
+        raise RuntimeError('crash before the log is truncated')
+
+    monkeypatch.setattr(storage._log, 'truncate', _crash)
+    with pytest.raises(RuntimeError):
+        storage.compact(lambda: [1, 2, 3])
+    storage.append('add', {'value': 4})
+    storage.close()
+    # The old snapshot and the already folded segments are left behind, but only the tail after the new one is replayed.
+    assert _recover(path) == [1, 2, 3, 4]
\ No newline at end of file
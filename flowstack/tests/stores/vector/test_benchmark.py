@@ -0,0 +1,23 @@
+import pytest
+
+from flowstack.stores import SegmentedVectorStore, SimpleVectorStore, VectorStoreQueryMode
+from flowstack.stores.vector.benchmark import make_corpus, run_benchmark
+
+@pytest.mark.parametrize('store_factory', [SimpleVectorStore, SegmentedVectorStore], ids=['simple', 'segmented'])
+def test_run_benchmark_on_a_tiny_corpus(store_factory):
+    corpus = make_corpus(num_rows=300, dim=8, num_queries=5)
+    report = run_benchmark(store_factory, corpus, k=5, batch_size=100, concurrency=2, measure_memory=False)
+
+    assert report.num_rows == 300
+    cases = {case.name: case for case in report.cases}
+    for name in ('unfiltered', 'filter-50%', 'filter-10%', 'filter-1%'):
+        # Both stores default to exact search.
+        assert cases[name].error is None
+        assert cases[name].recall == pytest.approx(1.0)
+    mmr = cases['mmr']
+    assert mmr.mode == VectorStoreQueryMode.MMR
+    if store_factory is SegmentedVectorStore:
+        assert mmr.error is not None and mmr.qps is None
+    else:
+        assert mmr.error is None and mmr.qps > 0
+    assert report.to_dict()['cases'][0]['name'] == 'unfiltered'
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from flowstack.artifacts import Text
+from flowstack.stores import CachedVectorStore, SimpleVectorStore
+
+DIM = 4
+
+@pytest.fixture
+def store() -> CachedVectorStore:
+    rng = np.random.default_rng(0)
+    store = SimpleVectorStore()
+    store.insert([
+        Text(f'artifact {i}', id=f'a{i}', embedding=rng.standard_normal(DIM).astype(np.float32))
+        for i in range(10)
+    ])
+    return CachedVectorStore(store)
+
+def test_arrays_that_print_the_same_get_different_keys(store):
+    # Both print as [0. 0. 0. ... 0. 0. 0.], only their bytes tell them apart.
+    first, second = np.zeros(10_000), np.zeros(10_000)
+    second[5_000] = 1
+    query = np.ones(DIM, dtype=np.float32)
+    for value in (first, second, first.reshape(100, 100)):
+        store.retrieve(query_embedding=query, additional_kwargs={'weights': value})
+    assert store.cache_info().misses == 3
+
+    store.retrieve(query_embedding=query, additional_kwargs={'weights': first.copy()})
+    assert store.cache_info().hits == 1
+
+def test_embeddings_of_another_dtype_or_shape_miss(store):
+    query = np.ones(DIM, dtype=np.float32)
+    store.retrieve(query_embedding=query)
+    store.retrieve(query_embedding=query.astype(np.float64))
+    store.retrieve(query_embedding=query.tolist())
+    store.retrieve(query_embedding=query.tolist())
+    assert (store.cache_info().hits, store.cache_info().misses) == (1, 3)
+
+def test_values_without_a_json_form_are_rejected(store):
+    with pytest.raises(ValueError):
+        store.retrieve(query_embedding=np.ones(DIM), additional_kwargs={'callback': object()})
@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+from flowstack.artifacts import Text
+from flowstack.stores import SimpleVectorStore
+
+DIM = 16
+K = 10
+
+def _clustered(rng: np.random.Generator, size: int, centers: np.ndarray) -> np.ndarray:
+    return (centers[rng.integers(len(centers), size=size)] + 0.3 * rng.standard_normal((size, DIM))).astype(np.float32)
+
+def _insert(store: SimpleVectorStore, embeddings: dict[int, np.ndarray]) -> None:
+    store.insert([Text(str(row), id=str(row), embedding=embedding) for row, embedding in embeddings.items()])
+
+def _recall(store: SimpleVectorStore, embeddings: dict[int, np.ndarray], queries: np.ndarray) -> float:
+    ids = np.array(list(embeddings))
+    matrix = np.stack(list(embeddings.values()))
+    found = 0
+    for query in queries:
+        truth = {str(row) for row in ids[np.argsort(-(matrix @ query))[:K]]}
+        found += len(truth & set(store.retrieve(query_embedding=query, similarity_top_k=K).ids))
+    return found / (K * len(queries))
+
+@pytest.fixture
+def data() -> tuple[dict[int, np.ndarray], np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((20, DIM))
+    embeddings = dict(enumerate(_clustered(rng, 2000, centers)))
+    return embeddings, _clustered(rng, 50, centers), centers
+
+@pytest.mark.parametrize('index_config', [
+    {'index_type': 'IVF_FLAT', 'nlist': 16, 'nprobe': 4},
+    {'index_type': 'HNSW', 'M': 8, 'efConstruction': 64}
+], ids=['ivf', 'hnsw'])
+def test_approximate_recall_against_flat_before_and_after_deletes(data, index_config):
+    embeddings, queries, _ = data
+    flat, store = SimpleVectorStore(index_config={'index_type': 'FLAT'}), SimpleVectorStore(index_config=index_config)
+
+    def recall() -> float:
+        found = 0
+        for query in queries:
+            truth = set(flat.retrieve(query_embedding=query, similarity_top_k=K).ids)
+            found += len(truth & set(store.retrieve(query_embedding=query, similarity_top_k=K).ids))
+        return found / (K * len(queries))
+
+    for target in [flat, store]:
+        _insert(target, embeddings)
+    assert recall() >= 0.9
+
+    deleted = [str(row) for row in np.random.default_rng(2).permutation(len(embeddings))[:1000]]
+    for target in [flat, store]:
+        target.delete(artifact_ids=deleted)
+    retrieved = {id_ for query in queries for id_ in store.retrieve(query_embedding=query, similarity_top_k=K).ids}
+    assert not retrieved & set(deleted)
+    assert recall() >= 0.9
+
+def test_hnsw_recall_survives_deletes_and_upserts(data):
+    embeddings, queries, centers = data
+    rng = np.random.default_rng(1)
+    store = SimpleVectorStore(index_config={'index_type': 'HNSW', 'M': 8, 'efConstruction': 64})
+    _insert(store, embeddings)
+    assert _recall(store, embeddings, queries) >= 0.9
+
+    # Deletes in small batches remove most of the graph, relinking it on the way.
+    order = rng.permutation(len(embeddings))
+    for start in range(0, 1400, 100):
+        deleted = order[start:start + 100].tolist()
+        store.delete(artifact_ids=[str(row) for row in deleted])
+        for row in deleted:
+            del embeddings[row]
+    assert _recall(store, embeddings, queries) >= 0.9
+
+    overwritten = list(embeddings)[::2]
+    embeddings.update(zip(overwritten, _clustered(rng, len(overwritten), centers)))
+    _insert(store, {row: embeddings[row] for row in overwritten})
+    assert _recall(store, embeddings, queries) >= 0.9
+
+def test_hnsw_delete_keeps_a_surviving_entry_point(data):
+    embeddings, _, _ = data
+    store = SimpleVectorStore(index_config={'index_type': 'HNSW', 'M': 8, 'efConstruction': 64})
+    _insert(store, embeddings)
+    index = store._index
+    entry_id = store.ids[index._node_rows[index._entry_point]]
+
+    store.delete(artifact_ids=[str(row) for row in range(100) if str(row) != entry_id])
+    assert store.ids[index._node_rows[index._entry_point]] == entry_id
+    store.delete(artifact_ids=[entry_id])
+    assert index._entry_point is not None
+    assert entry_id not in store.retrieve(query_embedding=embeddings[int(entry_id)], similarity_top_k=K).ids
+
+class _ReadCounter:
+    """
+    Stands in for the embedding matrix and counts the rows read from it.
+    """
+
+    def __init__(self, embeddings: np.ndarray):
+        self.embeddings = embeddings
+        self.rows_read = 0
+
+    def __len__(self) -> int:
+        return len(self.embeddings)
+
+    def __getitem__(self, rows):
+        vectors = self.embeddings[rows]
+        self.rows_read += len(vectors) if vectors.ndim > 1 else 1
+        return vectors
+
+def test_quantized_hnsw_traverses_codes_and_only_reads_reranked_rows(data):
+    embeddings, queries, _ = data
+    store = SimpleVectorStore(
+        index_config={'index_type': 'HNSW', 'M': 8, 'efConstruction': 64},
+        quantization_config={'quantizer_type': 'SQ8', 'rerank_factor': 4}
+    )
+    _insert(store, embeddings)
+    assert _recall(store, embeddings, queries) >= 0.9
+
+    matrix = _ReadCounter(store._data.embeddings)
+    rows, scores = store._index.search(matrix, queries[0], K, quantizer=store._quantizer)
+    assert matrix.rows_read <= 4 * K
+    np.testing.assert_allclose(scores, store._data.embeddings[rows] @ queries[0], rtol=1e-5)
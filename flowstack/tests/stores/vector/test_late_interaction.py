@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from flowstack.artifacts import Text
+from flowstack.stores import SimpleVectorStore, VectorStoreQueryMode
+
+DIM = 16
+TOKENS = 8
+K = 10
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.linalg.norm(matrix, axis=-1, keepdims=True)
+
+def _maxsim(tokens: np.ndarray, query: np.ndarray) -> float:
+    """
+    The sum over query tokens of their best cosine similarity with the document's tokens.
+    """
+    return float((_normalize(query) @ _normalize(tokens).T).max(axis=1).sum())
+
+def _exact(tokens: dict[str, np.ndarray], query: np.ndarray) -> tuple[list[str], np.ndarray]:
+    ids = list(tokens)
+    scores = np.array([_maxsim(tokens[id_], query) for id_ in ids])
+    order = np.argsort(-scores)[:K]
+    return [ids[i] for i in order], scores[order]
+
+def _insert(store: SimpleVectorStore, tokens: dict[str, np.ndarray]) -> None:
+    artifacts = [Text(id_, id=id_, embedding=matrix.mean(axis=0)) for id_, matrix in tokens.items()]
+    store.insert(artifacts, token_embeddings=list(tokens.values()))
+
+def _retrieve(store: SimpleVectorStore, query: np.ndarray, **params):
+    return store.retrieve(
+        mode=VectorStoreQueryMode.LATE_INTERACTION,
+        query_embedding=query,
+        similarity_top_k=K,
+        additional_kwargs=params
+    )
+
+@pytest.fixture
+def topics() -> np.ndarray:
+    return np.random.default_rng(0).standard_normal((20, DIM))
+
+def _documents(rng: np.random.Generator, topics: np.ndarray, start: int, size: int) -> dict[str, np.ndarray]:
+    # Tokens of a document cluster around a few topics, so centroids have structure to find.
+    return {
+        str(row): (topics[rng.integers(len(topics), size=TOKENS)] + 0.3 * rng.standard_normal((TOKENS, DIM)))
+        .astype(np.float32)
+        for row in range(start, start + size)
+    }
+
+def test_results_match_exact_maxsim_before_and_after_training(topics):
+    rng = np.random.default_rng(1)
+    store = SimpleVectorStore(enable_late_interaction=True, late_interaction_config={'num_centroids': 16})
+    tokens = _documents(rng, topics, 0, 50)
+    _insert(store, tokens)
+    assert not store._late_interaction_index.is_trained
+
+    queries = [(topics[rng.integers(len(topics), size=4)] + 0.3 * rng.standard_normal((4, DIM))) for _ in range(10)]
+    for query in queries:
+        ids, scores = _exact(tokens, query)
+        result = _retrieve(store, query)
+        assert result.ids == ids
+        np.testing.assert_allclose(result.similarities, scores, rtol=1e-5)
+
+    tokens.update(_documents(rng, topics, 50, 450))
+    _insert(store, {id_: tokens[id_] for id_ in list(tokens)[50:]})
+    assert store._late_interaction_index.is_trained
+
+    found = 0
+    for query in queries:
+        ids, scores = _exact(tokens, query)
+        result = _retrieve(store, query, nprobe=4)
+        found += len(set(result.ids) & set(ids))
+        np.testing.assert_allclose(result.similarities, [_maxsim(tokens[id_], query) for id_ in result.ids], atol=0.05)
+    assert found >= 0.9 * K * len(queries)
+
+    deleted = [str(row) for row in range(0, 500, 2)]
+    store.delete(artifact_ids=deleted)
+    for id_ in deleted:
+        del tokens[id_]
+    found = 0
+    for query in queries:
+        ids, _ = _exact(tokens, query)
+        result = _retrieve(store, query, nprobe=4)
+        assert not set(result.ids) & set(deleted)
+        found += len(set(result.ids) & set(ids))
+    assert found >= 0.9 * K * len(queries)
\ No newline at end of file
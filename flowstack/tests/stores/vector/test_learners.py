@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from flowstack.artifacts import Text
+from flowstack.stores import SimpleVectorStore, VectorStoreQueryMode
+
+DIM = 32
+NUM_RELEVANT = 20
+
+LEARNER_MODES = [
+    VectorStoreQueryMode.LINEAR_REGRESSION,
+    VectorStoreQueryMode.LOGISTIC_REGRESSION,
+    VectorStoreQueryMode.SVM
+]
+
+@pytest.fixture(params=['ip', 'cosine'])
+def store(request) -> SimpleVectorStore:
+    # The first NUM_RELEVANT rows share a direction, the rest are noise.
+    rng = np.random.default_rng(0)
+    direction = rng.standard_normal(DIM)
+    embeddings = rng.standard_normal((2000, DIM))
+    embeddings[:NUM_RELEVANT] += 2 * direction
+    store = SimpleVectorStore(similarity_metric=request.param)
+    store.insert([Text(str(row), id=str(row), embedding=e.astype(np.float32)) for row, e in enumerate(embeddings)])
+    return store
+
+@pytest.mark.parametrize('mode', LEARNER_MODES)
+def test_positives_rank_first(store, mode):
+    positive_ids = [str(row) for row in range(5)]
+    result = store.retrieve(mode=mode, similarity_top_k=NUM_RELEVANT, additional_kwargs={'positive_ids': positive_ids})
+    assert set(positive_ids) <= set(result.ids)
+    assert all(int(id_) < NUM_RELEVANT for id_ in result.ids[:10])
+    assert len(set(result.ids) & {str(row) for row in range(NUM_RELEVANT)}) >= 0.8 * NUM_RELEVANT
+    assert result.similarities == sorted(result.similarities, reverse=True)
+
+@pytest.mark.parametrize('mode', LEARNER_MODES)
+def test_query_embedding_alone_is_the_positive(store, mode):
+    query = store._data.embeddings[:NUM_RELEVANT].mean(axis=0)
+    result = store.retrieve(mode=mode, query_embedding=query, similarity_top_k=NUM_RELEVANT)
+    assert len(set(result.ids) & {str(row) for row in range(NUM_RELEVANT)}) >= 0.8 * NUM_RELEVANT
+
+@pytest.mark.parametrize('mode', LEARNER_MODES)
+def test_learner_needs_a_query_or_positives(store, mode):
+    with pytest.raises(ValueError, match='positive_ids'):
+        store.retrieve(mode=mode)
\ No newline at end of file
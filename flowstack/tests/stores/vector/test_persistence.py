@@ -0,0 +1,53 @@
+import numpy as np
+
+from flowstack.artifacts import Text
+from flowstack.stores import SegmentedVectorStore, SimpleVectorStore
+
+DIM = 16
+
+def _artifacts(embeddings: np.ndarray, start: int = 0) -> list[Text]:
+    return [
+        Text(f'artifact {start + i}', id=f'a{start + i}', embedding=embedding)
+        for i, embedding in enumerate(embeddings)
+    ]
+
+def _top_ids(store, query: np.ndarray) -> list[str]:
+    return store.retrieve(query_embedding=query, similarity_top_k=5).ids
+
+def test_persist_to_the_path_a_store_was_mapped_from(tmp_path):
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((200, DIM)).astype(np.float32)
+    path = str(tmp_path)
+    store = SimpleVectorStore()
+    store.insert(_artifacts(embeddings))
+    store.persist(path)
+
+    loaded = SimpleVectorStore.from_persist_path(path)
+    # The embeddings are still the memory map of path here, persisting over them must not truncate the mapped file.
+    loaded.persist(path)
+    assert _top_ids(loaded, embeddings[3]) == _top_ids(store, embeddings[3])
+
+    loaded.delete(artifact_ids=['a3'])
+    loaded.insert(_artifacts(rng.standard_normal((10, DIM)).astype(np.float32), start=200))
+    loaded.persist(path)
+    reloaded = SimpleVectorStore.from_persist_path(path)
+    assert _top_ids(reloaded, embeddings[3]) == _top_ids(loaded, embeddings[3])
+    assert 'a3' not in _top_ids(reloaded, embeddings[3])
+
+def test_persist_segments_to_the_path_they_were_mapped_from(tmp_path):
+    rng = np.random.default_rng(1)
+    embeddings = rng.standard_normal((300, DIM)).astype(np.float32)
+    path = str(tmp_path)
+    store = SegmentedVectorStore(merge_in_background=False, merge_factor=2)
+    store.insert(_artifacts(embeddings[:100]))
+    store.insert(_artifacts(embeddings[100:], start=100))
+    store.persist(path)
+
+    loaded = SegmentedVectorStore.from_persist_path(path, merge_in_background=False, merge_factor=2)
+    loaded.delete(artifact_ids=['a150'])
+    loaded.merge()
+    loaded.persist(path)
+    reloaded = SegmentedVectorStore.from_persist_path(path, merge_in_background=False)
+    for query in embeddings[[0, 150, 299]]:
+        assert _top_ids(reloaded, query) == _top_ids(loaded, query)
+    assert 'a150' not in _top_ids(reloaded, embeddings[150])
\ No newline at end of file
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from flowstack.artifacts import Text
+from flowstack.stores import QueryStrategy, SimpleVectorStore
+from flowstack.typing import FilterOperator, MetadataFilter, MetadataFilters
+
+DIM = 16
+K = 10
+SIZE = 4000
+
+@pytest.fixture(scope='module')
+def stores() -> tuple[SimpleVectorStore, SimpleVectorStore]:
+    rng = np.random.default_rng(0)
+    artifacts = [
+        Text(str(row), id=str(row), embedding=embedding, metadata={'bucket': row % 100})
+        for row, embedding in enumerate(rng.standard_normal((SIZE, DIM)).astype(np.float32))
+    ]
+    hnsw = SimpleVectorStore(index_config={'index_type': 'HNSW', 'M': 8, 'efConstruction': 64})
+    flat = SimpleVectorStore(index_config={'index_type': 'FLAT'})
+    for store in [hnsw, flat]:
+        store.insert(artifacts)
+    return hnsw, flat
+
+def _below(bucket: int) -> MetadataFilters:
+    return MetadataFilters([MetadataFilter('bucket', bucket, FilterOperator.LT)])
+
+def test_unrestricted_query_searches_the_index(stores):
+    hnsw, _ = stores
+    assert hnsw.explain(similarity_top_k=K).strategy == QueryStrategy.INDEX
+
+def test_selective_filter_is_pre_filtered_and_broad_filter_post_filtered(stores):
+    hnsw, _ = stores
+    selective = hnsw.explain(filters=_below(1), similarity_top_k=K)
+    broad = hnsw.explain(filters=_below(90), similarity_top_k=K)
+    assert selective.strategy == QueryStrategy.PRE_FILTER
+    assert selective.pre_filter_cost <= selective.post_filter_cost
+    assert broad.strategy == QueryStrategy.POST_FILTER
+    assert broad.post_filter_cost < broad.pre_filter_cost
+    assert broad.fetch_k >= K / broad.selectivity
+
+def test_flat_index_always_pre_filters(stores):
+    _, flat = stores
+    assert flat.explain(filters=_below(90), similarity_top_k=K).strategy == QueryStrategy.PRE_FILTER
+
+@pytest.mark.parametrize('filter_strategy', ['pre_filter', 'post_filter'])
+def test_forced_strategy_returns_the_filtered_nearest_rows(stores, filter_strategy):
+    hnsw, flat = stores
+    filters = _below(50)
+    plan = hnsw.explain(filters=filters, additional_kwargs={'filter_strategy': filter_strategy})
+    assert plan.strategy == filter_strategy.upper()
+
+    query = np.random.default_rng(1).standard_normal(DIM).astype(np.float32)
+    result = hnsw.retrieve(
+        query_embedding=query,
+        filters=filters,
+        similarity_top_k=K,
+        additional_kwargs={'filter_strategy': filter_strategy}
+    )
+    exact = flat.retrieve(query_embedding=query, filters=filters, similarity_top_k=K)
+    assert all(int(id_) % 100 < 50 for id_ in result.ids)
+    assert len(set(result.ids) & set(exact.ids)) >= 0.9 * K
\ No newline at end of file
@@ -0,0 +1,27 @@
+import numpy as np
+
+from flowstack.artifacts import Text
+from flowstack.stores import ScalarQuantizer, SimpleVectorStore
+
+def _artifacts(embeddings: np.ndarray, start: int = 0) -> list[Text]:
+    return [
+        Text(f'artifact {start + i}', id=f'a{start + i}', embedding=embedding)
+        for i, embedding in enumerate(embeddings)
+    ]
+
+def test_sq8_is_not_trained_on_a_small_first_insert():
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((1000, 32)).astype(np.float32)
+    quantized = SimpleVectorStore(quantization_config={'quantizer_type': 'SQ8'})
+    exact = SimpleVectorStore()
+    for store in (quantized, exact):
+        store.insert(_artifacts(embeddings[:1]))
+        store.insert(_artifacts(embeddings[1:], start=1))
+
+    quantizer = quantized._quantizer
+    assert isinstance(quantizer, ScalarQuantizer)
+    # Trained once enough rows had arrived, over all of them rather than the single first row.
+    assert np.all(quantizer._scale > 1e-6)
+    for query in embeddings[[0, 10, 500, 999]]:
+        assert quantized.retrieve(query_embedding=query, similarity_top_k=5).ids == \
+            exact.retrieve(query_embedding=query, similarity_top_k=5).ids
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from flowstack.artifacts import Text
+from flowstack.stores import SegmentedVectorStore, VectorStoreQueryMode
+
+DIM = 8
+
+@pytest.fixture
+def store() -> SegmentedVectorStore:
+    rng = np.random.default_rng(0)
+    store = SegmentedVectorStore(merge_in_background=False, enable_sparse=True)
+    for start in (0, 10):
+        store.insert([
+            Text(f'artifact {i}', id=f'a{i}', embedding=rng.standard_normal(DIM).astype(np.float32))
+            for i in range(start, start + 10)
+        ])
+    return store
+
+def test_default_mode_merges_segments(store):
+    result = store.retrieve(query_embedding=np.ones(DIM), similarity_top_k=20)
+    assert sorted(result.ids) == sorted(f'a{i}' for i in range(20))
+    assert result.similarities == sorted(result.similarities, reverse=True)
+
+@pytest.mark.parametrize(
+    'mode',
+    [VectorStoreQueryMode.HYBRID, VectorStoreQueryMode.TEXT_SEARCH, VectorStoreQueryMode.MMR, VectorStoreQueryMode.SVM]
+)
+def test_modes_with_per_segment_scores_are_rejected(store, mode):
+    with pytest.raises(ValueError):
+        store.retrieve(query_value='artifact', query_embedding=np.ones(DIM), mode=mode)
+    with pytest.raises(ValueError):
+        store.retrieve_many([np.ones(DIM)], query_value='artifact', mode=mode)
\ No newline at end of file
@@ -0,0 +1,61 @@
+from collections.abc import Iterator
+
+import numpy as np
+import pytest
+
+from flowstack.artifacts import Text
+from flowstack.stores import ShardedVectorStore, SimpleVectorStore, VectorStoreQueryMode
+from flowstack.typing import FilterOperator, MetadataFilter, MetadataFilters
+
+DIM = 16
+K = 10
+
+@pytest.fixture
+def stores() -> Iterator[tuple[ShardedVectorStore, SimpleVectorStore]]:
+    rng = np.random.default_rng(0)
+    artifacts = [
+        Text(str(row), id=str(row), embedding=embedding, metadata={'bucket': row % 10})
+        for row, embedding in enumerate(rng.standard_normal((500, DIM)).astype(np.float32))
+    ]
+    token_embeddings = [rng.standard_normal((4, DIM)).astype(np.float32) for _ in artifacts]
+    sharded = ShardedVectorStore(num_shards=3, enable_late_interaction=True)
+    single = SimpleVectorStore(enable_late_interaction=True)
+    for store in [sharded, single]:
+        store.insert(artifacts, token_embeddings=token_embeddings)
+    yield sharded, single
+    sharded.close()
+
+def _assert_same(sharded_result, single_result) -> None:
+    assert sharded_result.ids == single_result.ids
+    np.testing.assert_allclose(sharded_result.similarities, single_result.similarities, rtol=1e-5)
+
+def test_sharded_results_equal_a_single_store(stores):
+    sharded, single = stores
+    rng = np.random.default_rng(1)
+    queries = list(rng.standard_normal((5, DIM)).astype(np.float32))
+    filters = MetadataFilters([MetadataFilter('bucket', 3, FilterOperator.LT)])
+
+    def check():
+        for query in queries:
+            for store_query in [
+                {'query_embedding': query, 'similarity_top_k': K},
+                {'query_embedding': query, 'similarity_top_k': K, 'filters': filters},
+                {'query_embedding': query[None], 'similarity_top_k': K, 'mode': VectorStoreQueryMode.LATE_INTERACTION}
+            ]:
+                _assert_same(sharded.retrieve(**store_query), single.retrieve(**store_query))
+        for sharded_result, single_result in zip(
+            sharded.retrieve_many(queries, similarity_top_k=K),
+            single.retrieve_many(queries, similarity_top_k=K)
+        ):
+            _assert_same(sharded_result, single_result)
+
+    check()
+    for store in [sharded, single]:
+        store.delete(artifact_ids=[str(row) for row in range(0, 500, 3)])
+        store.delete(filters=MetadataFilters([MetadataFilter('bucket', 1)]))
+    check()
+
+def test_sharded_rejects_modes_it_cannot_merge(stores):
+    sharded, _ = stores
+    with pytest.raises(ValueError, match='not comparable across partitions'):
+        sharded.retrieve(mode=VectorStoreQueryMode.MMR, query_embedding=np.ones(DIM, dtype=np.float32))
\ No newline at end of file
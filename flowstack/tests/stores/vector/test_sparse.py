@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from flowstack.stores.vector import BM25Index, sparse
+
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta', 'theta']
+
+def _rebuilt(texts: dict[int, str]) -> BM25Index:
+    index = BM25Index()
+    rows = sorted(texts)
+    index.add(np.array(rows), [texts[row] for row in rows])
+    return index
+
+@pytest.mark.parametrize('min_delta_size', [4, 100_000])
+def test_interleaved_writes_and_queries_match_a_rebuilt_index(monkeypatch, min_delta_size):
+    monkeypatch.setattr(sparse, 'MIN_DELTA_SIZE', min_delta_size)
+    rng = np.random.default_rng(0)
+    index = BM25Index()
+    texts: dict[int, str] = {}
+    for step in range(200):
+        rows = rng.choice(50, size=3, replace=False)
+        if step % 4 == 3:
+            index.remove(rows)
+            for row in rows.tolist():
+                texts.pop(row, None)
+        else:
+            batch = [' '.join(rng.choice(WORDS, size=rng.integers(1, 6))) for _ in rows]
+            index.add(rows, batch)
+            texts.update(zip(rows.tolist(), batch))
+        query = ' '.join(rng.choice(WORDS, size=2))
+        np.testing.assert_allclose(index.scores(query, 50), _rebuilt(texts).scores(query, 50), rtol=1e-5)
+
+def test_save_and_compact_fold_the_delta(tmp_path):
+    import fsspec
+
+    fs = fsspec.filesystem('file')
+    index = BM25Index()
+    index.add(np.arange(3), ['alpha beta', 'beta gamma', 'gamma alpha'])
+    index.remove(np.array([1]))
+    index.add(np.array([3]), ['beta beta'])
+    index.save(str(tmp_path), fs)
+    assert index._delta_rows == [] and index._num_dead == 0
+
+    index.compact(np.array([0, 2, 3]))
+    rows, _ = index.search('beta', k=5, size=3)
+    assert rows.tolist() == [2, 0]
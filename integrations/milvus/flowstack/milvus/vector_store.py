@@ -1,8 +1,9 @@
 from copy import deepcopy
 from enum import StrEnum
 import logging
-from typing import Any, Optional, Unpack
+from typing import Any, Iterator, Optional, Unpack
 
+import numpy as np
 from pymilvus import AnnSearchRequest, Collection, DataType, MilvusClient, RRFRanker, WeightedRanker
 
 from flowstack.artifacts import Artifact, TextLike, Text, artifact_registry
@@ -12,9 +13,23 @@ from flowstack.milvus.utils import (
     get_default_sparse_embedding_function,
     to_milvus_filter
 )
-from flowstack.stores import VectorStore, VectorStoreQuery, VectorStoreQueryMode, VectorStoreQueryResult
+from flowstack.stores import (
+    LazyArtifacts,
+    VectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+    maximal_marginal_relevance
+)
 from flowstack.typing import Embedding, FilterOperator, MetadataFilter, MetadataFilters
-from flowstack.core.utils.constants import DEFAULT_DOC_ID_KEY, DEFAULT_EMBEDDING_KEY
+from flowstack.core.utils.constants import (
+    DEFAULT_DOC_ID_KEY,
+    DEFAULT_EMBEDDING_KEY,
+    DEFAULT_MMR_PREFETCH_FACTOR,
+    DEFAULT_MMR_THRESHOLD,
+    DEFAULT_PAGE_SIZE,
+    DEFAULT_SIMILARITY_TOP_K
+)
 from flowstack.core.utils.func import iter_batch
 
 MILVUS_ID_FIELD = 'id'
@@ -138,10 +153,11 @@ class MilvusVectorStore(VectorStore):
         filters: Optional[MetadataFilters] = None,
         output_fields: Optional[list[str]] = None,
         similarity_top_k: Optional[int] = None,
+        mmr_threshold: Optional[float] = None,
         additional_kwargs: dict[str, Any] = {},
         **query: Unpack[VectorStoreQuery]
     ) -> VectorStoreQueryResult:
-        if mode not in [VectorStoreQueryMode.DEFAULT, VectorStoreQueryMode.HYBRID]:
+        if mode not in [VectorStoreQueryMode.DEFAULT, VectorStoreQueryMode.HYBRID, VectorStoreQueryMode.MMR]:
             raise ValueError(f'Query mode {mode} is not supported in Milvus.')
         if mode == VectorStoreQueryMode.HYBRID and not self.enable_sparse:
             raise ValueError('Query mode is hybrid, but enable_sparse is False.')
@@ -150,67 +166,30 @@ class MilvusVectorStore(VectorStore):
         if query_embedding is None:
             raise ValueError(f'Query embedding is not set.')
 
-        expressions = []
-        output_fields = ['*']
-        additional_kwargs = additional_kwargs or {}
-        scalar_filters: Optional[ScalarMetadataFilters] = additional_kwargs.get('scalar_filters')
-
-        # Parse the filter
-        if filters is not None or scalar_filters is not None:
-            expressions.append(to_milvus_filter(filters, scalar_filters))
-
-        # Parse any ref artifacts we are filtering on
-        if ref_artifact_ids is not None and len(ref_artifact_ids) != 0:
-            expr_list = [f'"{artifact_id}"' for artifact_id in ref_artifact_ids]
-            expressions.append(f'{self.doc_id_field} in [{','.join(expr_list)}]')
-
-        # Parse any artifacts we are filtering on
-        if artifact_ids is not None and len(artifact_ids) != 0:
-            expr_list = [f'"{artifact_id}"' for artifact_id in artifact_ids]
-            expressions.append(f'{MILVUS_ID_FIELD} in [{','.join(expr_list)}]')
-
-        # Limit output fields
-        outputs_limited = False
-        if output_fields is not None:
-            outputs_limited = True
-        elif len(self.output_fields) > 0:
-            output_fields = self.output_fields
-            outputs_limited = True
-
-        # Add the text key to output_fields if necessary
-        if output_fields is not None and self.text_key not in output_fields and outputs_limited:
-            output_fields.append(self.text_key)
-
-        # Convert to string expression
-        expression_str = ''
-        if len(expressions) > 0:
-            expression_str = ' and '.join(expressions)
+        expression_str, output_fields = self._search_options(
+            ref_artifact_ids,
+            artifact_ids,
+            filters,
+            output_fields,
+            additional_kwargs
+        )
 
         # Perform the search
-        artifacts: list[Artifact] = []
-        ids: list[str] = []
-        similarities: list[float] = []
         if mode == VectorStoreQueryMode.DEFAULT:
-            results = self.client.search(
-                self.collection_name,
-                data=[query_embedding.tolist()],
-                filter=expression_str,
-                output_fields=output_fields,
-                limit=similarity_top_k,
-                search_params=self.search_config,
-                anns_field=self.embedding_field
-            )[0]
-            logger.debug(
-                f'Successfully searched embedding in collection: {self.collection_name}.'
-                f'Num results: {len(results)}.'
+            return self._search([query_embedding], expression_str, output_fields, similarity_top_k)[0]
+        elif mode == VectorStoreQueryMode.MMR:
+            return self._search_mmr(
+                query_embedding,
+                expression_str,
+                output_fields,
+                similarity_top_k,
+                mmr_threshold,
+                additional_kwargs
             )
-            for result in results:
-                entity = result.pop('entity') or {}
-                artifact = artifact_registry.deserialize({**result, **entity})
-                artifacts.append(artifact)
-                ids.append(result['id'])
-                similarities.append(result['distance'])
         else:
+            entries: list[dict[str, Any]] = []
+            ids: list[str] = []
+            similarities: list[float] = []
             dense_request = AnnSearchRequest(
                 data=[query_embedding],
                 anns_field=self.embedding_field,
@@ -252,17 +231,125 @@ class MilvusVectorStore(VectorStore):
             )[0]
             for result in results:
                 entity = result.pop('entity') or {}
-                artifact = artifact_registry.deserialize({**result, **entity})
-                artifacts.append(artifact)
+                entries.append({**result, **entity})
                 ids.append(result.id)
                 similarities.append(result.distance)
 
         return VectorStoreQueryResult(
-            artifacts=artifacts,
+            artifacts=LazyArtifacts(entries, artifact_registry.deserialize),
             ids=ids,
             similarities=similarities
         )
 
+    def iter_retrieve(
+        self,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        mode: str = VectorStoreQueryMode.DEFAULT,
+        query_embedding: Optional[Embedding] = None,
+        ref_artifact_ids: Optional[list[str]] = None,
+        artifact_ids: Optional[list[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        output_fields: Optional[list[str]] = None,
+        similarity_top_k: Optional[int] = None,
+        additional_kwargs: dict[str, Any] = {},
+        **query: Unpack[VectorStoreQuery]
+    ) -> Iterator[VectorStoreQueryResult]:
+        """
+        Default mode queries page through the collection with a search iterator, fetching page_size hits per request,
+        so similarity_top_k is not bound by the search limit. Other modes slice a single result.
+        """
+        if mode != VectorStoreQueryMode.DEFAULT:
+            yield from super().iter_retrieve(
+                page_size,
+                mode=mode,
+                query_embedding=query_embedding,
+                ref_artifact_ids=ref_artifact_ids,
+                artifact_ids=artifact_ids,
+                filters=filters,
+                output_fields=output_fields,
+                similarity_top_k=similarity_top_k,
+                additional_kwargs=additional_kwargs,
+                **query
+            )
+            return
+        if query_embedding is None:
+            raise ValueError(f'Query embedding is not set.')
+        if page_size <= 0:
+            raise ValueError(f'page_size must be positive, got {page_size}.')
+
+        expression_str, output_fields = self._search_options(
+            ref_artifact_ids,
+            artifact_ids,
+            filters,
+            output_fields,
+            additional_kwargs
+        )
+        iterator = self.collection.search_iterator(
+            data=[query_embedding.tolist()],
+            anns_field=self.embedding_field,
+            param={
+                'metric_type': self.similarity_metric,
+                'params': self.search_config
+            },
+            batch_size=page_size,
+            limit=similarity_top_k or DEFAULT_SIMILARITY_TOP_K,
+            expr=expression_str or None,
+            output_fields=output_fields
+        )
+        try:
+            while len(page := iterator.next()) > 0:
+                entries: list[dict[str, Any]] = []
+                for hit in page:
+                    result = hit.to_dict()
+                    entity = result.pop('entity') or {}
+                    entries.append({**result, **entity})
+                yield VectorStoreQueryResult(
+                    artifacts=LazyArtifacts(entries, artifact_registry.deserialize),
+                    ids=[entry['id'] for entry in entries],
+                    similarities=[entry['distance'] for entry in entries]
+                )
+        finally:
+            iterator.close()
+
+    def retrieve_many(
+        self,
+        query_embeddings: list[Embedding],
+        mode: str = VectorStoreQueryMode.DEFAULT,
+        ref_artifact_ids: Optional[list[str]] = None,
+        artifact_ids: Optional[list[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        output_fields: Optional[list[str]] = None,
+        similarity_top_k: Optional[int] = None,
+        additional_kwargs: dict[str, Any] = {},
+        **query: Unpack[VectorStoreQuery]
+    ) -> list[VectorStoreQueryResult]:
+        """
+        Sends every embedding in a single search request. Hybrid queries are run one at a time.
+        """
+        if mode != VectorStoreQueryMode.DEFAULT:
+            return super().retrieve_many(
+                query_embeddings,
+                mode=mode,
+                ref_artifact_ids=ref_artifact_ids,
+                artifact_ids=artifact_ids,
+                filters=filters,
+                output_fields=output_fields,
+                similarity_top_k=similarity_top_k,
+                additional_kwargs=additional_kwargs,
+                **query
+            )
+        if len(query_embeddings) == 0:
+            return []
+
+        expression_str, output_fields = self._search_options(
+            ref_artifact_ids,
+            artifact_ids,
+            filters,
+            output_fields,
+            additional_kwargs
+        )
+        return self._search(query_embeddings, expression_str, output_fields, similarity_top_k)
+
     def insert(
         self,
         artifacts: list[Artifact],
@@ -329,6 +416,144 @@ class MilvusVectorStore(VectorStore):
     def clear(self, **kwargs) -> None:
         self._client.drop_collection(self.collection_name, **kwargs)
 
+    def _search_options(
+        self,
+        ref_artifact_ids: Optional[list[str]],
+        artifact_ids: Optional[list[str]],
+        filters: Optional[MetadataFilters],
+        output_fields: Optional[list[str]],
+        additional_kwargs: Optional[dict[str, Any]]
+    ) -> tuple[str, list[str]]:
+        expressions = []
+        output_fields = ['*']
+        additional_kwargs = additional_kwargs or {}
+        scalar_filters: Optional[ScalarMetadataFilters] = additional_kwargs.get('scalar_filters')
+
+        # Parse the filter
+        if filters is not None or scalar_filters is not None:
+            expressions.append(to_milvus_filter(filters, scalar_filters))
+
+        # Parse any ref artifacts we are filtering on
+        if ref_artifact_ids is not None and len(ref_artifact_ids) != 0:
+            expr_list = [f'"{artifact_id}"' for artifact_id in ref_artifact_ids]
+            expressions.append(f'{self.doc_id_field} in [{','.join(expr_list)}]')
+
+        # Parse any artifacts we are filtering on
+        if artifact_ids is not None and len(artifact_ids) != 0:
+            expr_list = [f'"{artifact_id}"' for artifact_id in artifact_ids]
+            expressions.append(f'{MILVUS_ID_FIELD} in [{','.join(expr_list)}]')
+
+        # Limit output fields
+        outputs_limited = False
+        if output_fields is not None:
+            outputs_limited = True
+        elif len(self.output_fields) > 0:
+            output_fields = self.output_fields
+            outputs_limited = True
+
+        # Add the text key to output_fields if necessary
+        if output_fields is not None and self.text_key not in output_fields and outputs_limited:
+            output_fields.append(self.text_key)
+
+        # Convert to string expression
+        expression_str = ''
+        if len(expressions) > 0:
+            expression_str = ' and '.join(expressions)
+
+        return expression_str, output_fields
+
+    def _search(
+        self,
+        query_embeddings: list[Embedding],
+        expression_str: str,
+        output_fields: list[str],
+        similarity_top_k: Optional[int]
+    ) -> list[VectorStoreQueryResult]:
+        return [
+            self._to_result(entries)
+            for entries in self._search_entries(query_embeddings, expression_str, output_fields, similarity_top_k)
+        ]
+
+    def _search_entries(
+        self,
+        query_embeddings: list[Embedding],
+        expression_str: str,
+        output_fields: list[str],
+        similarity_top_k: Optional[int]
+    ) -> list[list[dict[str, Any]]]:
+        """
+        Raw hits of every embedding, each the entity fields merged with its id and distance.
+        """
+        batch_results = self.client.search(
+            self.collection_name,
+            data=[query_embedding.tolist() for query_embedding in query_embeddings],
+            filter=expression_str,
+            output_fields=output_fields,
+            limit=similarity_top_k,
+            search_params=self.search_config,
+            anns_field=self.embedding_field
+        )
+        logger.debug(
+            f'Successfully searched {len(query_embeddings)} embeddings in collection: {self.collection_name}.'
+        )
+
+        batch_entries: list[list[dict[str, Any]]] = []
+        for results in batch_results:
+            entries: list[dict[str, Any]] = []
+            for result in results:
+                entity = result.pop('entity') or {}
+                entries.append({**result, **entity})
+            batch_entries.append(entries)
+        return batch_entries
+
+    def _to_result(self, entries: list[dict[str, Any]]) -> VectorStoreQueryResult:
+        return VectorStoreQueryResult(
+            artifacts=LazyArtifacts(entries, artifact_registry.deserialize),
+            ids=[entry['id'] for entry in entries],
+            similarities=[entry['distance'] for entry in entries]
+        )
+
+    def _search_mmr(
+        self,
+        query_embedding: Embedding,
+        expression_str: str,
+        output_fields: list[str],
+        similarity_top_k: Optional[int],
+        mmr_threshold: Optional[float],
+        additional_kwargs: dict[str, Any]
+    ) -> VectorStoreQueryResult:
+        """
+        Over-fetches candidates with their embeddings, then re-selects similarity_top_k of them client-side with MMR.
+        The embeddings are read from the raw hits, so no candidate is deserialized.
+        """
+        similarity_top_k = similarity_top_k or DEFAULT_SIMILARITY_TOP_K
+        prefetch_k = additional_kwargs.get('mmr_prefetch_k') or similarity_top_k * additional_kwargs.get(
+            'mmr_prefetch_factor',
+            DEFAULT_MMR_PREFETCH_FACTOR
+        )
+        if '*' not in output_fields and self.embedding_field not in output_fields:
+            output_fields = [*output_fields, self.embedding_field]
+        entries = self._search_entries([query_embedding], expression_str, output_fields, prefetch_k)[0]
+        if len(entries) == 0:
+            return self._to_result(entries)
+
+        embeddings = [entry.get(self.embedding_field) for entry in entries]
+        if any(embedding is None for embedding in embeddings):
+            raise ValueError(f'MMR needs the {self.embedding_field} field of every candidate.')
+        picked, scores = maximal_marginal_relevance(
+            query_embedding,
+            np.asarray(embeddings, dtype=np.float32),
+            similarity_top_k,
+            mmr_threshold=mmr_threshold if mmr_threshold is not None else DEFAULT_MMR_THRESHOLD,
+            metric=self.similarity_metric
+        )
+        picked_entries = [entries[i] for i in picked]
+        return VectorStoreQueryResult(
+            artifacts=LazyArtifacts(picked_entries, artifact_registry.deserialize),
+            ids=[entry['id'] for entry in picked_entries],
+            similarities=scores.tolist()
+        )
+
     def _create_index_if_required(self) -> None:
         if self.index_management == IndexManagement.NO_VALIDATION:
             return